@@ -11,19 +11,44 @@ import (
 )
 
 // ListDocuments retorna lista de todos los documentos
+//
+// El script escribe un documento por línea (NDJSON) a medida que lee la
+// tabla: se decodifica en streaming, sin bufferizar toda la salida ni
+// parsear un único JSON gigante.
 func (c *Client) ListDocuments() ([]Document, error) {
 	scriptsDir := getScriptsDir()
-	cmd := exec.Command("python", filepath.Join(scriptsDir, "lancedb_list.py"))
+	cmd := exec.Command("python", filepath.Join(scriptsDir, "lancedb_list.py"), "--format", "ndjson")
 	cmd.Stderr = nil
 
-	output, err := cmd.Output()
+	stdout, err := cmd.StdoutPipe()
 	if err != nil {
 		return nil, fmt.Errorf("error listing documents: %w", err)
 	}
+	if err := cmd.Start(); err != nil {
+		return nil, fmt.Errorf("error listing documents: %w", err)
+	}
 
-	var docs []Document
-	if err := json.Unmarshal(output, &docs); err != nil {
-		return nil, fmt.Errorf("error parsing list: %w", err)
+	docs := []Document{}
+	decoder := json.NewDecoder(stdout)
+	for decoder.More() {
+		var line struct {
+			Document
+			Error string `json:"error"`
+		}
+		if err := decoder.Decode(&line); err != nil {
+			cmd.Process.Kill()
+			cmd.Wait()
+			return nil, fmt.Errorf("error parsing list: %w", err)
+		}
+		if line.Error != "" {
+			cmd.Wait()
+			return nil, fmt.Errorf("error listing documents: %s", line.Error)
+		}
+		docs = append(docs, line.Document)
+	}
+
+	if err := cmd.Wait(); err != nil {
+		return nil, fmt.Errorf("error listing documents: %w", err)
 	}
 
 	return docs, nil
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Benchmark de los backends de embeddings contra PyTorch a dimensión completa.
+#
+# Uso: python bench_embeddings.py [--backends torch,onnx,onnx-int8] [--dims 384,256,128]
+#                                 [--docs N] [--queries N] [--k N] [--batch-size N]
+#                                 [--output archivo.json]
+#
+# Codifica el corpus sintético de bench_pipeline.py (cada documento cortado a
+# un chunk de CHUNK_WORDS palabras) y sus consultas con cada backend, y mide:
+#   - docs_per_s: throughput de encode tras un calentamiento (sin caché)
+#   - recall_at_k: de los k documentos más cercanos a cada consulta según
+#     torch completo, cuántos recupera la variante
+#   - mean_cosine: similitud media de cada vector con el de torch (solo a
+#     dimensión completa)
+# Las dimensiones truncadas (Matryoshka) se calculan truncando y
+# renormalizando los vectores completos de cada backend: es lo mismo que
+# hace SentenceTransformer con truncate_dim, y cuesta lo mismo codificar.
+# Necesita el modelo en la caché de Hugging Face para ir offline; un backend
+# que no se puede cargar (p.ej. sin ONNX Runtime) sale con su error.
+
+import sys
+import json
+import time
+
+from lancedb_common import setup_stdio, silence_warnings, cli_option, MODEL_NAME
+from embedding_backends import BACKENDS, load_backend, model_dim
+
+setup_stdio()
+silence_warnings()
+
+from bench_pipeline import synthetic_corpus, synthetic_queries, environment
+
+DEFAULT_DOCS = 2000
+DEFAULT_QUERIES = 200
+DEFAULT_K = 10
+CHUNK_WORDS = 200
+WARMUP_TEXTS = 64
+
+
+def encode(model, texts, batch_size):
+    """Vectores normalizados (float32) y segundos de encode"""
+    import numpy as np
+
+    model.encode(texts[:WARMUP_TEXTS], batch_size=batch_size, normalize_embeddings=True,
+                 show_progress_bar=False)
+    started = time.perf_counter()
+    vectors = model.encode(texts, batch_size=batch_size, normalize_embeddings=True, show_progress_bar=False)
+    return np.asarray(vectors, dtype=np.float32), time.perf_counter() - started
+
+
+def truncate(vectors, dim):
+    """Primeras dim componentes, renormalizadas (Matryoshka)"""
+    import numpy as np
+
+    cut = vectors[:, :dim]
+    norms = np.linalg.norm(cut, axis=1, keepdims=True)
+    return cut / np.where(norms == 0, 1, norms)
+
+
+def neighbors(queries, docs, k):
+    """Índices de los k documentos más cercanos a cada consulta (coseno)"""
+    import numpy as np
+
+    scores = queries @ docs.T
+    top = np.argpartition(-scores, min(k, scores.shape[1] - 1), axis=1)[:, :k]
+    return [set(row) for row in top]
+
+
+def recall(reference, candidate):
+    return sum(len(r & c) / len(r) for r, c in zip(reference, candidate)) / len(reference)
+
+
+def run(backends, dims, docs, queries, k, batch_size):
+    texts = [" ".join(d["text"].split()[:CHUNK_WORDS]) for d in synthetic_corpus(docs)]
+    query_texts = synthetic_queries(queries)
+
+    encoded = {}
+    results = []
+    for backend in backends:
+        entry = {"backend": backend}
+        try:
+            started = time.perf_counter()
+            model = load_backend(backend, MODEL_NAME)
+            entry["load_s"] = round(time.perf_counter() - started, 2)
+            doc_vectors, seconds = encode(model, texts, batch_size)
+            query_vectors, _ = encode(model, query_texts, batch_size)
+        except Exception as e:
+            results.append(dict(entry, error=str(e)))
+            continue
+        encoded[backend] = (doc_vectors, query_vectors)
+        entry["docs_per_s"] = round(len(texts) / seconds, 1)
+        results.append(entry)
+
+    if "torch" not in encoded:
+        return {"error": "The torch baseline could not be encoded", "results": results}
+    base_docs, base_queries = encoded["torch"]
+    reference = neighbors(base_queries, base_docs, k)
+    base_rate = results[0]["docs_per_s"]
+
+    for entry in results:
+        if "error" in entry:
+            continue
+        doc_vectors, query_vectors = encoded[entry["backend"]]
+        variants = []
+        for dim in dims:
+            variant = {"dim": dim, "bytes_per_vector": dim * 4}
+            if dim == model_dim(MODEL_NAME):
+                variant["mean_cosine"] = round(float((doc_vectors * base_docs).sum(axis=1).mean()), 5)
+                found = neighbors(query_vectors, doc_vectors, k)
+            else:
+                found = neighbors(truncate(query_vectors, dim), truncate(doc_vectors, dim), k)
+            variant[f"recall_at_{k}"] = round(recall(reference, found), 4)
+            variants.append(variant)
+        entry["dims"] = variants
+        entry["speedup_vs_torch"] = round(entry["docs_per_s"] / base_rate, 2)
+
+    return {"results": results}
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    full = model_dim(MODEL_NAME)
+    backends = cli_option(args, "--backends", ",".join(BACKENDS), str).split(",")
+    dims = [int(d) for d in cli_option(args, "--dims", f"{full},{full * 2 // 3},{full // 3}", str).split(",")]
+    docs = cli_option(args, "--docs", DEFAULT_DOCS)
+    queries = cli_option(args, "--queries", DEFAULT_QUERIES)
+    k = cli_option(args, "--k", DEFAULT_K)
+    batch_size = cli_option(args, "--batch-size", 32)
+    output = cli_option(args, "--output", None, str)
+
+    # torch primero: es la referencia de recall y de speedup
+    backends = ["torch"] + [b for b in backends if b != "torch"]
+    if any(not 0 < d <= full for d in dims):
+        print(json.dumps({"error": f"--dims must be between 1 and {full}"}))
+        sys.exit(1)
+
+    report = {"environment": environment(MODEL_NAME), "docs": docs, "queries": queries, "k": k,
+              "batch_size": batch_size, **run(backends, dims, docs, queries, k, batch_size)}
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+    sys.exit(1 if "error" in report else 0)
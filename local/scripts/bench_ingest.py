@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Benchmark de ingesta: add_document (un documento por llamada) contra
+# add_documents (encode por batches y un commit por batch).
+#
+# Uso: python bench_ingest.py [num_docs] [--batch-size N] [--write-batch N]
+#
+# Cada modo escribe en una base de datos temporal distinta. El modo por
+# documento corre dentro de un solo proceso con el modelo ya cargado, así que
+# subestima el coste real de lanzar lancedb_add.py una vez por archivo.
+
+import os
+import sys
+import json
+import random
+import shutil
+import tempfile
+import time
+
+import lancedb_common
+from lancedb_common import setup_stdio, silence_warnings, get_model, open_table, cli_option
+from lancedb_chunks import open_chunks_table
+import embedding_cache
+import text_store
+
+setup_stdio()
+silence_warnings()
+
+from lancedb_add import add_document, add_documents, BULK_ENCODE_BATCH, BULK_WRITE_BATCH
+
+WORDS = ("factura cliente proyecto reunión presupuesto contrato informe análisis "
+         "entrega pago pedido producto servicio equipo datos resultado revisión "
+         "invoice meeting budget report delivery order customer review").split()
+
+
+def synthetic_docs(count, seed=42):
+    """Genera documentos sintéticos de longitud variable"""
+    rng = random.Random(seed)
+    return [{
+        "id": f"bench_{i}",
+        "text": " ".join(rng.choice(WORDS) for _ in range(rng.randint(80, 1500))),
+        "metadata": {"filename": f"bench_{i}.txt"}
+    } for i in range(count)]
+
+
+# Datos reales de los scripts: un benchmark no debe tocarlos
+DATA_DIRS = (lancedb_common.DB_PATH, text_store.TEXT_STORE_DIR, embedding_cache.CACHE_DIR)
+
+
+def use_db(path):
+    """Apunta los scripts a un directorio temporal dentro del mismo proceso.
+
+    La base LanceDB, el almacén de textos y la caché de embeddings van en
+    subdirectorios de path, así nada del benchmark llega a ./data.
+    """
+    lancedb_common.DB_PATH = os.path.join(path, "lancedb")
+    lancedb_common._db = None
+    text_store._store = text_store.TextStore(os.path.join(path, "text_store"))
+    embedding_cache._cache = (embedding_cache.EmbeddingCache(os.path.join(path, "embedding_cache"))
+                              if embedding_cache.CACHE_ENABLED else None)
+
+
+def data_state():
+    """Archivos (tamaño, mtime) de los directorios de datos reales"""
+    state = {}
+    for root in DATA_DIRS:
+        for folder, _, names in os.walk(root):
+            for name in names:
+                st = os.stat(os.path.join(folder, name))
+                state[os.path.join(folder, name)] = (st.st_size, st.st_mtime_ns)
+    return state
+
+
+def check_data_untouched(before):
+    """Falla si el benchmark escribió en los directorios de datos reales"""
+    changed = sorted(set(before.items()) ^ set(data_state().items()))
+    if changed:
+        raise RuntimeError(f"Benchmark wrote to the real data directories: {changed[0][0]}")
+
+
+def fragment_count(table):
+    """Número de fragmentos Lance de una tabla"""
+    try:
+        return table.stats()["fragment_stats"]["num_fragments"]
+    except Exception:
+        return None
+
+
+def run(mode, docs, batch_size, write_batch):
+    """Ingresa los documentos en una base temporal y mide el tiempo"""
+    tmp = tempfile.mkdtemp(prefix=f"bench_{mode}_")
+    try:
+        use_db(tmp)
+        started = time.perf_counter()
+        if mode == "per_document":
+            for doc in docs:
+                result = add_document(doc["id"], doc["text"], doc["metadata"])
+                if not result["success"]:
+                    raise RuntimeError(result["error"])
+        else:
+            result = add_documents(docs, batch_size, write_batch)
+            if not result["success"]:
+                raise RuntimeError(result["error"])
+        elapsed = time.perf_counter() - started
+
+        return {
+            "mode": mode,
+            "documents": len(docs),
+            "elapsed_s": round(elapsed, 3),
+            "docs_per_s": round(len(docs) / elapsed, 1),
+            "fragments": fragment_count(open_table()),
+            "chunk_fragments": fragment_count(open_chunks_table())
+        }
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    count = int(args[0]) if args and not args[0].startswith("--") else 500
+    batch_size = cli_option(args, "--batch-size", BULK_ENCODE_BATCH)
+    write_batch = cli_option(args, "--write-batch", BULK_WRITE_BATCH)
+
+    docs = synthetic_docs(count)
+    get_model()  # cargar el modelo fuera de la medición
+
+    before = data_state()
+    results = [run("per_document", docs, batch_size, write_batch),
+               run("bulk", docs, batch_size, write_batch)]
+    check_data_untouched(before)
+    print(json.dumps({
+        "batch_size": batch_size,
+        "write_batch": write_batch,
+        "results": results,
+        "speedup": round(results[0]["elapsed_s"] / results[1]["elapsed_s"], 2)
+    }, indent=2))
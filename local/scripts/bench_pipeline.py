@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Benchmark reproducible del pipeline local: ingesta, búsqueda, listado,
+# actualización de metadata, borrado y estadísticas sobre corpus sintéticos
+# en español e inglés.
+#
+# Uso: python bench_pipeline.py [--sizes 1000,10000,100000] [--queries N]
+#                               [--ops N] [--model hashing|real] [--seed N]
+#                               [--optimize] [--output archivo.json]
+#
+# Cada tamaño se mide en una base de datos y una caché de embeddings
+# temporales. Con --model hashing (por defecto) los vectores salen de un
+# hashing de palabras determinista: corre sin red ni modelo descargado y mide
+# el coste de LanceDB y de los scripts, no el del encoder. --model real usa
+# all-MiniLM-L6-v2 (debe estar ya en la caché de Hugging Face para ir offline).
+# El resultado es un JSON pensado para comparar entre commits.
+
+import sys
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+import zlib
+
+import lancedb_common
+from lancedb_common import setup_stdio, silence_warnings, get_model, open_table, cli_option, VECTOR_DIM
+from bench_ingest import use_db, fragment_count, data_state, check_data_untouched
+
+setup_stdio()
+silence_warnings()
+
+import embedding_cache
+import search_cache
+from lancedb_add import add_documents
+from lancedb_search import search_documents, search_hybrid
+from lancedb_list import list_documents, iter_documents
+from lancedb_update_metadata import update_metadata, update_metadata_bulk
+from lancedb_delete import delete_document
+from lancedb_stats import get_stats
+from lancedb_maintenance import optimize, INDEX_MIN_ROWS
+
+DEFAULT_SIZES = (1000,)
+DEFAULT_QUERIES = 50
+DEFAULT_OPS = 20
+
+WORDS = {
+    "es": ("factura cliente proyecto reunión presupuesto contrato informe análisis entrega pago "
+           "pedido producto servicio equipo datos resultado revisión empresa acuerdo plazo "
+           "proveedor calidad riesgo objetivo ventas trimestre región inversión coste mejora "
+           "el la los las de del en con para por que una un su sus se es como más sobre").split(),
+    "en": ("invoice customer project meeting budget contract report analysis delivery payment "
+           "order product service team data result review company agreement deadline supplier "
+           "quality risk goal sales quarter region investment cost improvement "
+           "the of and to in for with on that this is as by from at more about").split()
+}
+CATEGORIES = ("Finanzas", "Legal", "Ventas", "Técnico", "RRHH")
+TAGS = ("urgente", "factura", "cliente", "interno", "revisado", "borrador")
+
+
+class HashingModel:
+    """Encoder determinista sin red: bolsa de palabras con hashing a VECTOR_DIM"""
+
+    tokenizer = None  # chunking por palabras
+
+    def encode(self, texts, batch_size=32, normalize_embeddings=True, show_progress_bar=False, **kwargs):
+        import numpy as np
+
+        single = isinstance(texts, str)
+        texts = [texts] if single else texts
+        out = np.zeros((len(texts), VECTOR_DIM), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                out[row, zlib.crc32(word.encode("utf-8")) % VECTOR_DIM] += 1.0
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        out /= np.where(norms == 0, 1, norms)
+        return out[0] if single else out
+
+
+def synthetic_corpus(count, seed=42):
+    """Documentos ES/EN con longitudes log-normales (mediana ~400 palabras)"""
+    rng = random.Random(seed)
+    docs = []
+    for i in range(count):
+        lang = "es" if i % 2 == 0 else "en"
+        length = int(min(6000, max(30, rng.lognormvariate(6.0, 0.8))))
+        docs.append({
+            "id": f"bench_{i}",
+            "text": " ".join(rng.choice(WORDS[lang]) for _ in range(length)),
+            "metadata": {
+                "filename": f"bench_{i}.{rng.choice(('pdf', 'docx', 'txt', 'md'))}",
+                "category": rng.choice(CATEGORIES),
+                "tags": rng.sample(TAGS, rng.randint(0, 2)),
+                "language": lang
+            }
+        })
+    return docs
+
+
+def synthetic_queries(count, seed=7):
+    """Consultas distintas entre sí (sin hits de la caché de resultados)"""
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS["es" if i % 2 == 0 else "en"]) for _ in range(rng.randint(2, 6)))
+            for i in range(count)]
+
+
+def percentiles(samples):
+    """Resumen de latencias en ms"""
+    import numpy as np
+
+    if not samples:
+        return None
+    values = np.asarray(samples)
+    return {
+        "count": len(samples),
+        "p50_ms": round(float(np.percentile(values, 50)), 2),
+        "p95_ms": round(float(np.percentile(values, 95)), 2),
+        "p99_ms": round(float(np.percentile(values, 99)), 2),
+        "mean_ms": round(float(values.mean()), 2),
+        "max_ms": round(float(values.max()), 2)
+    }
+
+
+def timed(samples, func, *args, **kwargs):
+    """Ejecuta func, guarda su duración en ms y falla si el resultado es un error"""
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    samples.append((time.perf_counter() - started) * 1000)
+    error = _error_of(result)
+    if error:
+        raise RuntimeError(f"{func.__name__}: {error}")
+    return result
+
+
+def _error_of(result):
+    if isinstance(result, dict):
+        return result.get("error")
+    if isinstance(result, list) and result and isinstance(result[0], dict):
+        return result[0].get("error")
+    return None
+
+
+def peak_rss_mb():
+    """Pico de memoria residente del proceso (None si no se puede medir)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa KB y macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_size(count, queries, ops, seed, run_optimize):
+    """Mide todas las operaciones sobre un corpus de count documentos"""
+    tmp = tempfile.mkdtemp(prefix=f"bench_pipeline_{count}_")
+    try:
+        use_db(tmp)
+        embedding_cache._cache = embedding_cache.EmbeddingCache(
+            path=os.path.join(tmp, "embedding_cache"), model_name=f"bench:{type(get_model()).__name__}")
+        search_cache.query_vectors.clear()
+        search_cache.results.clear()
+
+        docs = synthetic_corpus(count, seed)
+        words = sum(len(d["text"].split()) for d in docs)
+        report = {"documents": count, "words": words}
+
+        started = time.perf_counter()
+        result = add_documents(docs)
+        if not result["success"]:
+            raise RuntimeError(result["error"])
+        elapsed = time.perf_counter() - started
+        report["ingest"] = {
+            "elapsed_s": round(elapsed, 3),
+            "docs_per_s": round(count / elapsed, 1),
+            "words_per_s": round(words / elapsed, 1),
+            "chunks": result["chunks"],
+            "fragments": fragment_count(open_table())
+        }
+
+        if run_optimize:
+            started = time.perf_counter()
+            # PQ necesita al menos 256 filas para entrenar
+            result = optimize(min_rows=max(256, min(count, INDEX_MIN_ROWS)))
+            if not result["success"]:
+                raise RuntimeError(result["error"])
+            report["optimize_s"] = round(time.perf_counter() - started, 3)
+
+        rng = random.Random(seed)
+        texts = synthetic_queries(queries, seed)
+
+        samples = []
+        for query in texts:
+            timed(samples, search_documents, query, 5)
+        report["search"] = percentiles(samples)
+
+        # Mismas consultas otra vez: caché de resultados (tablas sin cambios)
+        samples = []
+        for query in texts[:ops]:
+            timed(samples, search_documents, query, 5)
+        report["search_repeated"] = percentiles(samples)
+
+        samples = []
+        for query in texts:
+            timed(samples, search_documents, query, 5, where="category = 'Finanzas'")
+        report["search_filtered"] = percentiles(samples)
+
+        samples = []
+        for query in texts:
+            timed(samples, search_hybrid, query, 5)
+        report["search_hybrid"] = percentiles(samples)
+
+        samples = []
+        for _ in range(ops):
+            timed(samples, list_documents, offset=rng.randrange(count), limit=50, fields=["id", "metadata"])
+        report["list_page"] = percentiles(samples)
+
+        samples = []
+        started = time.perf_counter()
+        listed = sum(1 for _ in iter_documents(fields=["id", "metadata"]))
+        samples.append((time.perf_counter() - started) * 1000)
+        report["list_all"] = dict(percentiles(samples), rows=listed)
+
+        ids = [d["id"] for d in rng.sample(docs, min(ops * 2, count))]
+        samples = []
+        for doc_id in ids[:ops]:
+            timed(samples, update_metadata, doc_id, {"category": "Legal", "reviewed": True})
+        report["update"] = percentiles(samples)
+
+        samples = []
+        patches = [{"id": d["id"], "metadata": {"tags": ["revisado"]}} for d in docs[:min(1000, count)]]
+        timed(samples, update_metadata_bulk, patches)
+        report["update_bulk"] = dict(percentiles(samples), documents=len(patches))
+
+        samples = []
+        for _ in range(max(3, ops // 4)):
+            timed(samples, get_stats)
+        report["stats"] = percentiles(samples)
+
+        samples = []
+        for doc_id in ids[ops:]:
+            timed(samples, delete_document, doc_id)
+        report["delete"] = percentiles(samples)
+
+        report["peak_rss_mb"] = peak_rss_mb()
+        return report
+    finally:
+        lancedb_common.close_db()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def environment(model_kind):
+    """Datos para comparar resultados entre máquinas y commits"""
+    import lancedb
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "lancedb": lancedb.__version__,
+        "model": model_kind
+    }
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    sizes = [int(s) for s in cli_option(args, "--sizes", ",".join(map(str, DEFAULT_SIZES)), str).split(",")]
+    queries = cli_option(args, "--queries", DEFAULT_QUERIES)
+    ops = cli_option(args, "--ops", DEFAULT_OPS)
+    seed = cli_option(args, "--seed", 42)
+    model_kind = cli_option(args, "--model", "hashing", str)
+    output = cli_option(args, "--output", None, str)
+
+    if model_kind == "hashing":
+        lancedb_common._model = HashingModel()
+    else:
+        get_model()  # cargar el modelo fuera de la medición
+
+    report = {"environment": environment(model_kind), "seed": seed, "results": []}
+    before = data_state()
+    for size in sizes:
+        print(json.dumps({"progress": {"size": size}}), file=sys.stderr, flush=True)
+        report["results"].append(run_size(size, queries, ops, seed, "--optimize" in args))
+    check_data_untouched(before)
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
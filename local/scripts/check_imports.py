@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Presupuesto de tiempo de importación de los scripts (arranque en frío).
+#
+# Uso: python check_imports.py [--scale N]
+#
+# Con `python -X importtime` comprueba dos cosas en procesos nuevos:
+#   1. Importar cada punto de entrada cuesta menos que su presupuesto (ms).
+#      Las librerías pesadas (lancedb, torch, PyPDF2...) deben importarse
+#      dentro de las funciones que las usan, no al cargar el módulo.
+#   2. Los caminos rápidos (listar, estadísticas, borrar, actualizar metadata,
+#      extraer un TXT) se ejecutan de verdad sin cargar las librerías que no
+#      necesitan: nunca torch/sentence_transformers, y un TXT tampoco PyPDF2,
+#      python-docx ni markdown.
+#
+# --scale (o IMPORT_BUDGET_SCALE) multiplica los presupuestos en máquinas
+# lentas. Sale con código 1 si algo no cumple.
+
+import sys
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Presupuesto en ms de `import <módulo>` (solo biblioteca estándar y scripts)
+DEFAULT_BUDGET_MS = 150
+IMPORT_BUDGETS_MS = {
+    "process_document": DEFAULT_BUDGET_MS,
+    "lancedb_add": DEFAULT_BUDGET_MS,
+    "lancedb_search": DEFAULT_BUDGET_MS,
+    "lancedb_list": DEFAULT_BUDGET_MS,
+    "lancedb_delete": DEFAULT_BUDGET_MS,
+    "lancedb_stats": DEFAULT_BUDGET_MS,
+    "lancedb_update_metadata": DEFAULT_BUDGET_MS,
+    "lancedb_chunks": DEFAULT_BUDGET_MS,
+    "lancedb_sync": DEFAULT_BUDGET_MS,
+    "lancedb_maintenance": DEFAULT_BUDGET_MS,
+    "lancedb_migrate": DEFAULT_BUDGET_MS,
+    "lancedb_client": 50,
+    "lancedb_worker": 250,
+}
+
+# Ninguna de estas librerías puede aparecer al importar un punto de entrada
+HEAVY_MODULES = ("lancedb", "pyarrow", "pandas", "numpy", "torch", "transformers",
+                 "sentence_transformers", "PyPDF2", "docx", "markdown")
+MODEL_MODULES = ("torch", "transformers", "sentence_transformers")
+EXTRACTOR_MODULES = ("PyPDF2", "docx", "markdown")
+
+
+def parse_importtime(stderr):
+    """Retorna ({módulo de primer nivel: ms acumulados}, módulos importados)"""
+    top, names = {}, set()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        if not cumulative.strip().isdigit():
+            continue  # cabecera
+        module = name.strip()
+        names.add(module)
+        if not name[1:].startswith(" "):
+            top[module] = int(cumulative) / 1000
+    return top, names
+
+
+def importtime(args, cwd, env):
+    """Ejecuta python -X importtime con args y retorna (stdout, top, nombres)"""
+    proc = subprocess.run([sys.executable, "-X", "importtime"] + args, cwd=cwd, env=env,
+                          capture_output=True, text=True, timeout=300)
+    top, names = parse_importtime(proc.stderr)
+    return proc.stdout, top, names
+
+
+def heavy_loaded(names, modules):
+    """Librerías de la lista que se llegaron a importar (paquete o submódulo)"""
+    return sorted(m for m in modules if any(n == m or n.startswith(m + ".") for n in names))
+
+
+def check_entry_points(env, scale):
+    """Coste de importar cada punto de entrada sin ejecutarlo"""
+    results = []
+    for module, budget in IMPORT_BUDGETS_MS.items():
+        _, top, names = importtime(["-c", f"import {module}"], SCRIPTS_DIR, env)
+        elapsed = top.get(module)
+        heavy = heavy_loaded(names, HEAVY_MODULES)
+        budget = budget * scale
+        results.append({
+            "entry": module,
+            "import_ms": round(elapsed, 1) if elapsed is not None else None,
+            "budget_ms": budget,
+            "heavy": heavy,
+            "ok": elapsed is not None and elapsed <= budget and not heavy
+        })
+    return results
+
+
+def check_fast_paths(env, tmp):
+    """Ejecuta los caminos rápidos de verdad y revisa qué librerías cargaron"""
+    sample = os.path.join(tmp, "sample.txt")
+    with open(sample, "w", encoding="utf-8") as f:
+        f.write("Documento de prueba para medir el arranque.\n")
+
+    # Tabla vacía para que los scripts lleguen a leer/escribir en LanceDB
+    setup = subprocess.run([sys.executable, "-c", "from lancedb_common import open_table; open_table(create=True)"],
+                           cwd=SCRIPTS_DIR, env=env, capture_output=True, text=True, timeout=300)
+    if setup.returncode != 0:
+        raise RuntimeError(f"Could not create the test table: {setup.stderr.strip()[-500:]}")
+
+    commands = [
+        (["lancedb_list.py", "--limit", "1"], MODEL_MODULES),
+        (["lancedb_stats.py"], MODEL_MODULES),
+        (["lancedb_delete.py", "check_imports_missing"], MODEL_MODULES),
+        (["lancedb_update_metadata.py", "check_imports_missing", '{"category": "Legal"}'], MODEL_MODULES),
+        (["process_document.py", sample], MODEL_MODULES + EXTRACTOR_MODULES + ("lancedb",)),
+    ]
+    results = []
+    for args, forbidden in commands:
+        stdout, top, names = importtime([os.path.join(SCRIPTS_DIR, args[0])] + args[1:], tmp, env)
+        heavy = heavy_loaded(names, forbidden)
+        results.append({
+            "command": " ".join(os.path.basename(a) if a == sample else a for a in args),
+            "import_ms": round(sum(top.values()), 1),
+            "forbidden_loaded": heavy,
+            "ok": bool(stdout.strip()) and not heavy
+        })
+    return results
+
+
+def main(scale):
+    tmp = tempfile.mkdtemp(prefix="check_imports_")
+    env = dict(os.environ,
+               LANCEDB_PATH=os.path.join(tmp, "lancedb"),
+               EMBEDDING_CACHE_DIR=os.path.join(tmp, "embedding_cache"),
+               LANCEDB_WORKER_ADDR="",  # medir el proceso local, no el worker
+               LOCAL_PROFILE="0")
+    env["PYTHONPATH"] = SCRIPTS_DIR + os.pathsep + env.get("PYTHONPATH", "")
+    try:
+        entries = check_entry_points(env, scale)
+        fast_paths = check_fast_paths(env, tmp)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    success = all(r["ok"] for r in entries + fast_paths)
+    return {"success": success, "budget_scale": scale, "entry_points": entries, "fast_paths": fast_paths}
+
+
+if __name__ == "__main__":
+    scale = float(os.environ.get("IMPORT_BUDGET_SCALE", "1"))
+    if "--scale" in sys.argv:
+        scale = float(sys.argv[sys.argv.index("--scale") + 1])
+
+    try:
+        result = main(scale)
+    except Exception as e:
+        result = {"success": False, "error": str(e)}
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result["success"] else 1)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Registro de backends de embeddings.
+#
+# Todos cargan el mismo modelo (MODEL_NAME) y devuelven un objeto con la
+# interfaz de SentenceTransformer que usan los scripts (encode() y
+# tokenizer), así que elegir backend no cambia nada más:
+#   torch      PyTorch en CPU (el de siempre)
+#   onnx       el export ONNX del modelo con ONNX Runtime
+#   onnx-int8  el export ONNX cuantizado a int8, el más rápido en CPU
+# ONNX necesita `pip install sentence-transformers[onnx]`.
+#
+# EMBEDDING_DIM menor que la dimensión del modelo trunca los vectores
+# (Matryoshka: se quedan las primeras EMBEDDING_DIM componentes y se vuelven
+# a normalizar). Menos dimensiones = tablas e índices más pequeños, a cambio
+# de recall; bench_embeddings.py mide ambos contra torch completo.
+#
+# El modelo y la dimensión quedan en la metadata de la columna vector de
+# cada tabla (ver lancedb_common.check_embeddings): una tabla no se puede
+# abrir con un modelo o una dimensión distintos de los que la crearon.
+
+import os
+import platform
+
+# Dimensión completa de cada modelo soportado
+MODEL_DIMS = {"all-MiniLM-L6-v2": 384}
+
+# Export int8 del repo del modelo en Hugging Face según la CPU
+# (EMBEDDING_ONNX_FILE elige otro archivo)
+ONNX_INT8_FILES = {
+    "x86_64": "onnx/model_qint8_avx512.onnx",
+    "amd64": "onnx/model_qint8_avx512.onnx",
+    "arm64": "onnx/model_qint8_arm64.onnx",
+    "aarch64": "onnx/model_qint8_arm64.onnx"
+}
+ONNX_FILE = os.environ.get("EMBEDDING_ONNX_FILE", "")
+
+BACKENDS = {}
+
+
+def register(name):
+    """Registra un cargador: función(model_name, truncate_dim) -> modelo"""
+    def decorator(loader):
+        BACKENDS[name] = loader
+        return loader
+    return decorator
+
+
+def _sentence_transformer(model_name, truncate_dim, **kwargs):
+    from sentence_transformers import SentenceTransformer
+    try:
+        return SentenceTransformer(model_name, device='cpu', truncate_dim=truncate_dim, **kwargs)
+    except ImportError as e:
+        raise RuntimeError(f"Missing dependency: {e} (pip install sentence-transformers[onnx])")
+
+
+@register("torch")
+def _torch(model_name, truncate_dim):
+    return _sentence_transformer(model_name, truncate_dim)
+
+
+@register("onnx")
+def _onnx(model_name, truncate_dim):
+    kwargs = {"file_name": ONNX_FILE} if ONNX_FILE else {}
+    return _sentence_transformer(model_name, truncate_dim, backend="onnx", model_kwargs=kwargs)
+
+
+@register("onnx-int8")
+def _onnx_int8(model_name, truncate_dim):
+    file_name = ONNX_FILE or ONNX_INT8_FILES.get(platform.machine().lower(), "onnx/model_quint8_avx2.onnx")
+    return _sentence_transformer(model_name, truncate_dim, backend="onnx",
+                                 model_kwargs={"file_name": file_name})
+
+
+def model_dim(model_name):
+    if model_name not in MODEL_DIMS:
+        raise ValueError(f"Unknown embedding model {model_name}, use one of {list(MODEL_DIMS)}")
+    return MODEL_DIMS[model_name]
+
+
+def vector_dim(model_name, dim=0):
+    """Dimensión de los vectores: la del modelo o una truncada (Matryoshka)"""
+    full = model_dim(model_name)
+    if not dim:
+        return full
+    if not 0 < dim <= full:
+        raise ValueError(f"EMBEDDING_DIM must be between 1 and {full} for {model_name}")
+    return dim
+
+
+def model_id(model_name, backend="torch", dim=0):
+    """Identificador de los vectores que produce una configuración.
+
+    torch a dimensión completa conserva el nombre del modelo a secas, así las
+    claves de la caché de embeddings anteriores siguen valiendo.
+    """
+    dim = vector_dim(model_name, dim)
+    suffix = "" if backend == "torch" else f":{backend}"
+    if dim != model_dim(model_name):
+        suffix += f"@{dim}"
+    return model_name + suffix
+
+
+def load_backend(backend, model_name, dim=0):
+    """Carga el modelo con el backend pedido (sin cachear: ver get_model)"""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend}, use one of {list(BACKENDS)}")
+    dim = vector_dim(model_name, dim)
+    return BACKENDS[backend](model_name, dim if dim != model_dim(model_name) else None)
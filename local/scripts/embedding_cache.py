@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Caché persistente de embeddings direccionada por contenido.
+#
+# La clave es sha256(modelo + texto normalizado) y los vectores float32 se
+# guardan en un archivo plano que se lee con np.memmap (un slot por vector).
+# El índice clave -> slot vive en SQLite, que además serializa los accesos de
+# varios procesos y guarda los contadores de hits/misses. Al llegar a
+# CACHE_MAX_ENTRIES se reutiliza el slot usado hace más tiempo (LRU).
+#
+# Lecturas y escrituras toman el lock de escritura de SQLite (BEGIN
+# IMMEDIATE): el archivo de vectores no tiene snapshots, así que leer un slot
+# fuera de esa transacción podría devolver el vector de otro texto si otro
+# proceso lo reutiliza entre el SELECT y la lectura.
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from lancedb_common import MODEL_ID, VECTOR_DIM, get_model
+from profiling import stage
+
+CACHE_DIR = os.environ.get("EMBEDDING_CACHE_DIR", "./data/embedding_cache")
+CACHE_MAX_ENTRIES = int(os.environ.get("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+CACHE_ENABLED = os.environ.get("EMBEDDING_CACHE", "1") != "0"
+
+# El archivo de vectores crece de a este número de slots
+GROW_SLOTS = 4096
+
+_cache = None
+
+
+def normalize_text(text):
+    """Normaliza el texto para que variaciones de espacios no cambien la clave"""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+def cache_key(text, model_name=MODEL_ID):
+    """Clave de caché para un texto codificado con un modelo"""
+    data = model_name.encode("utf-8") + b"\0" + normalize_text(text).encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+class EmbeddingCache:
+    """Caché en disco de vectores float32 con expulsión LRU"""
+
+    def __init__(self, path=CACHE_DIR, model_name=MODEL_ID, dim=VECTOR_DIM,
+                 max_entries=CACHE_MAX_ENTRIES):
+        os.makedirs(path, exist_ok=True)
+        self.model_name = model_name
+        self.dim = dim
+        self.max_entries = max_entries
+        self.vectors_path = os.path.join(path, f"vectors_{dim}.f32")
+        self._map = None
+        # Una conexión por proceso: los hilos del worker no pueden mezclar transacciones
+        self._db_lock = threading.RLock()
+
+        self.db = sqlite3.connect(os.path.join(path, "index.sqlite"), timeout=30,
+                                  isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS entries ("
+                        "key TEXT PRIMARY KEY, slot INTEGER UNIQUE, last_used REAL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS entries_lru ON entries(last_used)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER)")
+        self.db.execute("INSERT OR IGNORE INTO counters VALUES ('hits', 0), ('misses', 0)")
+
+        if not os.path.exists(self.vectors_path):
+            open(self.vectors_path, "wb").close()
+
+    def _slots_on_disk(self):
+        return os.path.getsize(self.vectors_path) // (self.dim * 4)
+
+    def _vectors(self, min_slots=0):
+        """Memmap del archivo de vectores, ampliándolo si hace falta"""
+        import numpy as np
+
+        on_disk = self._slots_on_disk()
+        if on_disk < min_slots:
+            on_disk = min(self.max_entries, max(min_slots, on_disk + GROW_SLOTS))
+            with open(self.vectors_path, "r+b") as f:
+                f.truncate(on_disk * self.dim * 4)
+        if self._map is None or self._map.shape[0] != on_disk:
+            # Otro proceso pudo ampliar el archivo: volver a mapearlo
+            self._map = np.memmap(self.vectors_path, dtype=np.float32, mode="r+",
+                                  shape=(on_disk, self.dim)) if on_disk else None
+        return self._map
+
+    def get_many(self, texts):
+        """Retorna una lista con el vector de cada texto o None si no está en caché"""
+        keys = [cache_key(t, self.model_name) for t in texts]
+        with self._db_lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                results = self._read(keys)
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+        return results
+
+    def _read(self, keys):
+        """Slots y vectores de las claves, en la misma transacción que put_many"""
+        found = {}
+        for first in range(0, len(keys), 500):
+            batch = list(set(keys[first:first + 500]))
+            marks = ",".join("?" * len(batch))
+            found.update(self.db.execute(
+                f"SELECT key, slot FROM entries WHERE key IN ({marks})", batch).fetchall())
+
+        results = [None] * len(keys)
+        if found:
+            vectors = self._vectors()
+            for i, key in enumerate(keys):
+                slot = found.get(key)
+                if slot is not None and vectors is not None and slot < vectors.shape[0]:
+                    results[i] = vectors[slot].copy()
+            now = time.time()
+            self.db.executemany("UPDATE entries SET last_used = ? WHERE key = ?",
+                                [(now, k) for k in found])
+
+        hits = sum(1 for r in results if r is not None)
+        self.db.execute("UPDATE counters SET value = value + ? WHERE name = 'hits'", (hits,))
+        self.db.execute("UPDATE counters SET value = value + ? WHERE name = 'misses'",
+                        (len(keys) - hits,))
+        return results
+
+    def put_many(self, texts, vectors):
+        """Guarda los vectores de los textos (expulsando los menos usados si está lleno)"""
+        entries = {}
+        for text, vector in zip(texts, vectors):
+            entries[cache_key(text, self.model_name)] = vector
+        if not entries:
+            return
+
+        now = time.time()
+        with self._db_lock:
+            self._write(entries, now)
+
+    def _write(self, entries, now):
+        """Asigna slots (expulsando por LRU) y escribe los vectores antes de confirmar el índice"""
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            known = set()
+            keys = list(entries)
+            for first in range(0, len(keys), 500):
+                batch = keys[first:first + 500]
+                marks = ",".join("?" * len(batch))
+                known.update(k for (k,) in self.db.execute(
+                    f"SELECT key FROM entries WHERE key IN ({marks})", batch))
+            new_keys = [k for k in keys if k not in known][:self.max_entries]
+            if not new_keys:
+                self.db.execute("COMMIT")
+                return
+
+            count = self.db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            free = max(0, self.max_entries - count)
+            slots = list(range(count, count + min(free, len(new_keys))))
+            if len(slots) < len(new_keys):
+                # Caché llena: reutilizar los slots usados hace más tiempo
+                evicted = self.db.execute(
+                    "SELECT key, slot FROM entries ORDER BY last_used LIMIT ?",
+                    (len(new_keys) - len(slots),)).fetchall()
+                self.db.executemany("DELETE FROM entries WHERE key = ?", [(k,) for k, _ in evicted])
+                slots.extend(slot for _, slot in evicted)
+
+            store = self._vectors(min_slots=max(slots) + 1)
+            for key, slot in zip(new_keys, slots):
+                store[slot] = entries[key]
+            store.flush()
+
+            self.db.executemany("INSERT INTO entries VALUES (?, ?, ?)",
+                                [(k, s, now) for k, s in zip(new_keys, slots)])
+            self.db.execute("COMMIT")
+        except Exception:
+            self.db.execute("ROLLBACK")
+            raise
+
+    def stats(self):
+        """Entradas, tamaño en disco y contadores de hits/misses"""
+        with self._db_lock:
+            counters = dict(self.db.execute("SELECT name, value FROM counters").fetchall())
+            entries = self.db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        hits, misses = counters.get("hits", 0), counters.get("misses", 0)
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "size_bytes": os.path.getsize(self.vectors_path),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None
+        }
+
+
+def get_cache():
+    """Retorna la caché del proceso (None si está deshabilitada o no se puede abrir)"""
+    global _cache
+    if _cache is None and CACHE_ENABLED:
+        try:
+            _cache = EmbeddingCache()
+        except (OSError, sqlite3.Error):
+            return None
+    return _cache
+
+
+def encode_cached(texts, model=None, batch_size=32):
+    """Codifica textos (normalizados) consultando antes la caché.
+
+    Solo se llama a SentenceTransformer.encode para los textos que no están
+    en caché; si todos lo están, ni siquiera se carga el modelo.
+    Retorna una matriz numpy (len(texts), VECTOR_DIM).
+    """
+    import numpy as np
+
+    cache = get_cache()
+    cached = [None] * len(texts)
+    if cache:
+        try:
+            with stage("embedding_cache"):
+                cached = cache.get_many(texts)
+        except (OSError, sqlite3.Error):
+            cache = None  # la caché nunca debe impedir codificar
+
+    # Textos sin vector, sin repetir (p.ej. chunks idénticos)
+    missing = {}
+    for i, vector in enumerate(cached):
+        if vector is None:
+            missing.setdefault(texts[i], []).append(i)
+
+    if missing:
+        model = model or get_model()
+        unique = list(missing)
+        with stage("encode"):
+            encoded = model.encode(unique, batch_size=batch_size,
+                                   normalize_embeddings=True, show_progress_bar=False)
+        encoded = np.asarray(encoded, dtype=np.float32).reshape(len(unique), -1)
+        for text, vector in zip(unique, encoded):
+            for i in missing[text]:
+                cached[i] = vector
+        if cache:
+            try:
+                with stage("embedding_cache"):
+                    cache.put_many(unique, encoded)
+            except (OSError, sqlite3.Error):
+                pass
+
+    if not cached:
+        return np.zeros((0, VECTOR_DIM), dtype=np.float32)
+    return np.stack(cached).astype(np.float32, copy=False)
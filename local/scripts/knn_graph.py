@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Grafo kNN precalculado: los KNN_K documentos más parecidos a cada uno.
+#
+# build_graph() lee todos los vectores de documento y calcula los vecinos con
+# productos de matrices NumPy por bloques de filas, con la misma métrica que
+# table.search (L2 al cuadrado). El resultado va a la tabla
+# NEIGHBORS_TABLE_NAME (id, neighbors, distances) con índice por id: el panel
+# de documentos relacionados es una lectura por clave, no una búsqueda.
+#
+# Una vez construido, lancedb_add y lancedb_delete lo mantienen:
+#   - un documento nuevo busca sus vecinos con table.search y entra en la
+#     lista de cada vecino al que mejora (aristas inversas);
+#   - al borrar (o reemplazar) uno, se quita su fila y se recalculan las
+#     listas que lo contenían.
+# Sin grafo construido no se hace nada. Reconstruirlo de vez en cuando
+# corrige lo que las búsquedas ANN incrementales aproximan.
+#
+# Uso: python knn_graph.py --build [--k N]
+
+import os
+
+from lancedb_common import (NEIGHBORS_TABLE_NAME, VECTOR_DIM, get_db, open_table, scan, sql_quote,
+                            ensure_scalar_index)
+from profiling import stage
+
+KNN_K = int(os.environ.get("KNN_GRAPH_K", "10"))
+# Elementos de la matriz de distancias por bloque (float32: 32 MB)
+KNN_BLOCK_ELEMENTS = 8 * 1024 * 1024
+
+
+def neighbors_schema():
+    """Schema Arrow de la tabla del grafo (vecinos ordenados por distancia)"""
+    import pyarrow as pa
+    return pa.schema([
+        pa.field("id", pa.string()),
+        pa.field("neighbors", pa.list_(pa.string())),
+        pa.field("distances", pa.list_(pa.float32()))
+    ])
+
+
+def open_neighbors_table():
+    """Abre la tabla del grafo, o None si todavía no se construyó"""
+    try:
+        return open_table(name=NEIGHBORS_TABLE_NAME)
+    except Exception:
+        return None
+
+
+def _where_ids(ids, column="id"):
+    return f"{column} IN (" + ", ".join(sql_quote(i) for i in ids) + ")"
+
+
+def _vectors(table, ids=None):
+    """(ids, matriz float32) de los documentos; con ids repetidos gana la última fila"""
+    import numpy as np
+
+    rows = scan(table, ["id", "vector"], where=_where_ids(ids) if ids else None)
+    found = rows.column("id").to_pylist()
+    last = {doc_id: row for row, doc_id in enumerate(found)}
+    matrix = rows.column("vector").combine_chunks().flatten().to_numpy(zero_copy_only=False)
+    matrix = matrix.reshape(len(found), VECTOR_DIM)[list(last.values())].astype(np.float32, copy=False)
+    return list(last), matrix
+
+
+def _graph_batches(ids, vectors, k):
+    """Record batches del grafo completo, un bloque de filas por batch"""
+    import numpy as np
+    import pyarrow as pa
+
+    schema = neighbors_schema()
+    squared = (vectors * vectors).sum(axis=1)
+    block = max(1, KNN_BLOCK_ELEMENTS // max(1, len(ids)))
+    names = np.asarray(ids, dtype=object)
+    for first in range(0, len(ids), block):
+        part = vectors[first:first + block]
+        rows = np.arange(len(part))
+        distances = squared[first:first + block, None] + squared[None, :] - 2 * (part @ vectors.T)
+        distances[rows, rows + first] = np.inf  # el propio documento
+        top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        top_distances = np.take_along_axis(distances, top, axis=1)
+        order = np.argsort(top_distances, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_distances = np.maximum(np.take_along_axis(top_distances, order, axis=1), 0)
+        yield pa.record_batch([
+            pa.array(ids[first:first + block], type=pa.string()),
+            pa.array(names[top].tolist(), type=pa.list_(pa.string())),
+            pa.array(top_distances.tolist(), type=pa.list_(pa.float32()))
+        ], schema=schema)
+
+
+def build_graph(k=KNN_K):
+    """Calcula el grafo completo y reemplaza la tabla en un solo commit"""
+    import time
+
+    started = time.perf_counter()
+    try:
+        table = open_table()
+        with stage("read_vectors"):
+            ids, vectors = _vectors(table)
+        k = min(k, len(ids) - 1)
+        if k < 1:
+            return {"success": False, "error": "Need at least two documents"}
+        with stage("knn"):
+            graph = get_db().create_table(NEIGHBORS_TABLE_NAME, data=_graph_batches(ids, vectors, k),
+                                          schema=neighbors_schema(), mode="overwrite")
+        ensure_scalar_index(graph, "id")
+        ensure_scalar_index(graph, "neighbors", "LABEL_LIST")
+        return {"success": True, "documents": len(ids), "k": k,
+                "elapsed_s": round(time.perf_counter() - started, 3)}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+
+def _search(table, vector, k, exclude):
+    """[(id, distancia)] de los k más cercanos al vector según table.search"""
+    hits = table.search(vector).select(["id", "_distance"]).limit(k + len(exclude)).to_arrow()
+    found = {}
+    for doc_id, distance in zip(hits.column("id").to_pylist(), hits.column("_distance").to_pylist()):
+        if doc_id not in exclude and doc_id not in found:
+            found[doc_id] = max(float(distance), 0.0)
+    return list(found.items())[:k]
+
+
+def _read(graph, ids):
+    """{id: [(vecino, distancia)]} de las filas del grafo indicadas"""
+    if not ids:
+        return {}
+    rows = scan(graph, ["id", "neighbors", "distances"], where=_where_ids(ids)).to_pylist()
+    return {r["id"]: list(zip(r["neighbors"], r["distances"])) for r in rows}
+
+
+def _write(graph, rows):
+    """Upsert por id de {id: [(vecino, distancia)]}"""
+    import pyarrow as pa
+
+    if not rows:
+        return
+    data = pa.table({
+        "id": list(rows),
+        "neighbors": [[n for n, _ in found] for found in rows.values()],
+        "distances": [[d for _, d in found] for found in rows.values()]
+    }, schema=neighbors_schema())
+    (graph.merge_insert("id")
+     .when_matched_update_all()
+     .when_not_matched_insert_all()
+     .execute(data))
+
+
+def _k(graph):
+    """k con el que se construyó el grafo (el largo de sus listas)"""
+    rows = graph.search().select(["neighbors"]).limit(1).to_list()
+    return len(rows[0]["neighbors"]) if rows else KNN_K
+
+
+def update_neighbors(table, doc_ids):
+    """Agrega al grafo documentos recién escritos (o reemplazados) en la tabla"""
+    graph = open_neighbors_table()
+    doc_ids = list(dict.fromkeys(doc_ids))
+    if graph is None or not doc_ids:
+        return
+    with stage("knn_graph"):
+        k = _k(graph)
+        # Un documento reemplazado cambió de vector: sus aristas viejas no valen
+        replaced = list(_read(graph, doc_ids))
+        if replaced:
+            _detach(table, graph, replaced, k)
+
+        ids, vectors = _vectors(table, doc_ids)
+        rows = {doc_id: _search(table, vector, k, {doc_id}) for doc_id, vector in zip(ids, vectors)}
+
+        # Aristas inversas: el nuevo entra en las listas a las que mejora
+        incoming = {}
+        for doc_id, found in rows.items():
+            for other, distance in found:
+                if other not in rows:
+                    incoming.setdefault(other, []).append((doc_id, distance))
+        for other, found in _read(graph, list(incoming)).items():
+            merged = dict(found)
+            merged.update(incoming[other])
+            rows[other] = sorted(merged.items(), key=lambda item: item[1])[:k]
+        _write(graph, rows)
+
+
+def remove_neighbors(table, doc_ids):
+    """Quita del grafo documentos ya borrados de la tabla"""
+    graph = open_neighbors_table()
+    doc_ids = list(dict.fromkeys(doc_ids))
+    if graph is None or not doc_ids:
+        return
+    with stage("knn_graph"):
+        graph.delete(_where_ids(doc_ids))
+        _detach(table, graph, doc_ids, _k(graph))
+
+
+def _detach(table, graph, doc_ids, k):
+    """Recalcula las listas que contenían esos documentos (con sus vectores actuales)"""
+    where = f"array_has_any(neighbors, [{', '.join(sql_quote(i) for i in doc_ids)}])"
+    affected = [i for i in scan(graph, ["id"], where=where).column("id").to_pylist() if i not in doc_ids]
+    if not affected:
+        return
+    ids, vectors = _vectors(table, affected)
+    _write(graph, {doc_id: _search(table, vector, k, {doc_id}) for doc_id, vector in zip(ids, vectors)})
+
+
+def related(doc_id, limit=KNN_K):
+    """[(id, distancia)] precalculados del documento, o None si no está en el grafo"""
+    graph = open_neighbors_table()
+    if graph is None:
+        return None
+    found = _read(graph, [doc_id]).get(doc_id)
+    return None if found is None else found[:limit]
+
+
+def graph_stats():
+    """Documentos en el grafo y su k (None si no se construyó)"""
+    graph = open_neighbors_table()
+    if graph is None:
+        return None
+    return {"documents": graph.count_rows(), "k": _k(graph), "version": graph.version}
+
+
+if __name__ == "__main__":
+    import sys
+    import json
+    from lancedb_common import setup_stdio, silence_warnings, cli_option
+    from profiling import dumps, mark_imports
+
+    mark_imports()
+
+    setup_stdio()
+    silence_warnings()
+
+    if "--build" not in sys.argv:
+        print(json.dumps({"success": False, "error": "Usage: knn_graph.py --build [--k N]"}))
+        sys.exit(1)
+
+    print(dumps(build_graph(cli_option(sys.argv, "--k", KNN_K))))
@@ -1,78 +1,414 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 import sys
-import io
-
-if sys.platform == 'win32':
-    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
-    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
-
 import json
-import os
-import warnings
+import time
+from datetime import datetime
+from pathlib import Path
+
+from lancedb_common import (setup_stdio, silence_warnings, get_model, open_table, metadata_table,
+                            typed_metadata, cli_option, scan, sql_quote, ensure_scalar_index)
+from lancedb_chunks import (embed_chunks, embed_documents, open_chunks_table, vectors_to_arrow,
+                            replace_chunks)
+from near_duplicates import DuplicateDetector, DEDUP_MODE, DEDUP_MODES
+from text_store import get_store, snippet, text_hash
+from knn_graph import update_neighbors
+import lancedb_client
+from profiling import stage, dumps, mark_imports
 
+setup_stdio()
 # Silenciar warnings
-warnings.filterwarnings('ignore')
-os.environ['TRANSFORMERS_VERBOSITY'] = 'error'
-os.environ['TOKENIZERS_PARALLELISM'] = 'false'
+silence_warnings()
+
+# Ingesta masiva: tamaño de batch de encode y documentos por commit
+BULK_ENCODE_BATCH = 64
+BULK_WRITE_BATCH = 1000
+SUPPORTED_EXTENSIONS = {'.pdf', '.docx', '.doc', '.md', '.txt'}
 
-import lancedb
-from sentence_transformers import SentenceTransformer
-from pathlib import Path
 
-# Configuración
-DB_PATH = "./data/lancedb"
-TABLE_NAME = "documents"
+def add_document(doc_id, text, metadata=None, dedup=DEDUP_MODE):
+    """Agrega (o reemplaza, si el id ya existe) un documento en LanceDB.
 
-def add_document(doc_id, text, metadata=None):
-    """Agrega un documento a LanceDB"""
+    dedup: "off", "flag" o "skip" (ver near_duplicates). Con "skip" un texto
+    casi idéntico a otro documento no se codifica ni se agrega.
+    """
     try:
-        # Cargar modelo de embeddings (silencioso)
-        model = SentenceTransformer('all-MiniLM-L6-v2', device='cpu')
-        
-        # Generar embedding
-        vector = model.encode(text).tolist()
-        
-        # Conectar a LanceDB
-        db = lancedb.connect(DB_PATH)
+        import pyarrow as pa
         
-        # Abrir o crear tabla
-        try:
-            table = db.open_table(TABLE_NAME)
-        except:
-            import pyarrow as pa
-            schema = pa.schema([
-                pa.field("id", pa.string()),
-                pa.field("text", pa.string()),
-                pa.field("vector", pa.list_(pa.float32(), 384)),
-                pa.field("metadata", pa.string())
-            ])
-            table = db.create_table(TABLE_NAME, schema=schema)
+        if dedup not in DEDUP_MODES:
+            return {"success": False, "error": f"Unknown dedup mode {dedup}, use one of {list(DEDUP_MODES)}"}
         
         # Preparar metadata
         if metadata is None:
             metadata = {}
+        
+        # Casi-duplicados: antes de gastar tiempo en embeddings
+        detector = DuplicateDetector() if dedup != "off" else None
+        duplicate = None
+        if detector:
+            with stage("near_duplicates"):
+                signature, bands, duplicate = detector.check(doc_id, text)
+            if duplicate and dedup == "skip":
+                return {"success": True, "id": doc_id, "skipped": True, "near_duplicate_of": duplicate}
+            if duplicate:
+                metadata = dict(metadata, near_duplicate_of=duplicate["id"])
+            detector.add(doc_id, signature, bands)
+        
+        # Cargar modelo de embeddings (silencioso, cacheado en el worker)
+        model = get_model()
+        
+        # Trocear y generar embeddings de todos los chunks en un solo batch
+        chunk_table, vector = embed_chunks(model, doc_id, text)
+        
+        # Abrir o crear tablas
+        table = open_table(create=True)
+        chunks = open_chunks_table(create=True)
+        
         metadata_json = json.dumps(metadata)
         
-        # Agregar documento
-        data = [{
+        # Agregar documento (las columnas tipadas solo si la tabla las tiene)
+        data = pa.Table.from_pylist([{
             "id": doc_id,
-            "text": text,
+            "text": snippet(text),
+            "text_hash": text_hash(text),
             "vector": vector,
-            "metadata": metadata_json
-        }]
+            "metadata": metadata_json,
+            **typed_metadata(metadata)
+        }], schema=table.schema)
         
-        table.add(data)
+        # Chunks primero: el documento solo aparece cuando ya es buscable
+        with stage("write"):
+            # Texto completo al almacén antes que la tabla lo referencie
+            get_store().put_many([(doc_id, text)])
+            existing = _existing_ids(table, [doc_id])
+            stale = set(existing) | _chunked_ids(chunks, [doc_id])
+            replace_chunks(chunks, chunk_table, stale)
+            _upsert(table, data, existing)
+            update_neighbors(table, [doc_id])
+            if detector:
+                detector.flush()
         
-        return {"success": True, "id": doc_id}
+        result = {"success": True, "id": doc_id, "chunks": chunk_table.num_rows, "replaced": bool(existing)}
+        if duplicate:
+            result["near_duplicate_of"] = duplicate
+        return result
     
     except Exception as e:
         return {"success": False, "error": str(e)}
 
 
+def _existing_ids(table, ids):
+    """Ids de la lista que ya están en la tabla, con su número de filas"""
+    if table.count_rows() == 0:
+        return {}
+    ensure_scalar_index(table, "id")
+    where = "id IN (" + ", ".join(sql_quote(i) for i in set(ids)) + ")"
+    counts = {}
+    for doc_id in scan(table, ["id"], where=where).column("id").to_pylist():
+        counts[doc_id] = counts.get(doc_id, 0) + 1
+    return counts
+
+
+def _chunked_ids(chunks, ids):
+    """Ids de la lista que ya tienen chunks.
+
+    Incluye los de un intento anterior que falló después de escribir los
+    chunks y antes del upsert (p.ej. un grupo de la cola de escritura que se
+    reintenta uno a uno): así reescribir es idempotente y no los duplica.
+    """
+    if chunks.count_rows() == 0:
+        return set()
+    ensure_scalar_index(chunks, "doc_id")
+    where = "doc_id IN (" + ", ".join(sql_quote(i) for i in set(ids)) + ")"
+    return set(scan(chunks, ["doc_id"], where=where).column("doc_id").to_pylist())
+
+
+def _upsert(table, data, existing):
+    """Escribe las filas reemplazando las del mismo id (merge-insert por id).
+
+    Los ids repetidos de antes del upsert se borran y se vuelven a insertar:
+    el merge-insert actualizaría cada copia en vez de dejar una sola.
+    """
+    repeated = [doc_id for doc_id, count in existing.items() if count > 1]
+    if repeated:
+        table.delete("id IN (" + ", ".join(sql_quote(i) for i in repeated) + ")")
+    if not existing or len(repeated) == len(existing):
+        table.add(data)
+        return
+    (table.merge_insert("id")
+     .when_matched_update_all()
+     .when_not_matched_insert_all()
+     .execute(data))
+
+
+def _file_entry(path, name=None, result=None):
+    """Extrae un archivo con process_document y arma su entrada de ingesta.
+
+    result: salida ya calculada de process_document (p.ej. del modo batch).
+    """
+    if result is None:
+        # Import diferido: solo la ingesta de archivos necesita PyPDF2/docx/markdown
+        from process_document import process_document
+        result = process_document(str(path))
+    # Mismo formato de id que handleUpload en el backend Go
+    name = name or path.name
+    doc_id = f"doc_{name.replace('.', '_').replace('/', '_')}_{int(time.time())}"
+    if not result.get("success"):
+        return {"id": doc_id, "error": result.get("error", "Extraction failed")}
+    metadata = {
+        "filename": path.name,
+        "word_count": result["word_count"],
+        "uploaded_at": datetime.now().astimezone().isoformat(timespec='seconds')
+    }
+    if "page_offsets" in result:
+        # Para citar la página de un pasaje (passage_start) en los resultados
+        metadata["pages"] = result["pages"]
+        metadata["page_offsets"] = result["page_offsets"]
+    return {"id": doc_id, "text": result["text"], "metadata": metadata}
+
+
+def iter_bulk_source(source):
+    """Genera entradas {id, text, metadata} desde un directorio o un manifest NDJSON.
+
+    Cada línea del manifest es {"id", "text" | "path", "metadata"}. Las
+    entradas que no se pueden leer se generan con una clave "error".
+    """
+    source = Path(source)
+
+    if source.is_dir():
+        for path in sorted(source.rglob('*')):
+            if path.is_file() and path.suffix.lower() in SUPPORTED_EXTENSIONS:
+                yield _file_entry(path, path.relative_to(source).as_posix())
+        return
+
+    with open(source, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                yield {"id": f"line {line_no}", "error": "Invalid JSON"}
+                continue
+
+            if entry.get("text") is None and entry.get("path"):
+                extracted = _file_entry(Path(entry["path"]))
+                if "error" in extracted:
+                    yield {"id": entry.get("id", extracted["id"]), "error": extracted["error"]}
+                    continue
+                entry = {
+                    "id": entry.get("id", extracted["id"]),
+                    "text": extracted["text"],
+                    "metadata": {**extracted["metadata"], **(entry.get("metadata") or {})}
+                }
+
+            if not entry.get("id") or entry.get("text") is None:
+                yield {"id": entry.get("id", f"line {line_no}"), "error": "Entry needs id and text or path"}
+                continue
+            yield entry
+
+
+def _write_batch(model, table, chunks, entries, encode_batch_size):
+    """Codifica y escribe (upsert por id) un batch de documentos con un commit por tabla.
+
+    Retorna la tabla de chunks escrita y los ids que ya existían ({id: filas}).
+    """
+    import pyarrow as pa
+
+    # Dentro del batch gana la última entrada de cada id
+    entries = list({e["id"]: e for e in entries}.values())
+    chunk_table, doc_vectors = embed_documents(
+        model, [(e["id"], e["text"]) for e in entries], batch_size=encode_batch_size)
+
+    metadatas = [e.get("metadata") or {} for e in entries]
+    columns = {
+        "id": pa.array([e["id"] for e in entries], type=pa.string()),
+        "text": pa.array([snippet(e["text"]) for e in entries], type=pa.string()),
+        "text_hash": pa.array([text_hash(e["text"]) for e in entries], type=pa.string()),
+        "vector": vectors_to_arrow(doc_vectors),
+        "metadata": pa.array([json.dumps(m) for m in metadatas], type=pa.string())
+    }
+    typed = metadata_table(metadatas, table.schema)
+    for name in typed.column_names:
+        columns[name] = typed.column(name)
+    # Tablas anteriores a text_hash: esa columna no se escribe
+    doc_table = pa.table(columns).select(table.schema.names).cast(table.schema)
+
+    with stage("write"):
+        get_store().put_many([(e["id"], e["text"]) for e in entries])
+        existing = _existing_ids(table, [e["id"] for e in entries])
+        stale = set(existing) | _chunked_ids(chunks, [e["id"] for e in entries])
+        replace_chunks(chunks, chunk_table, stale)
+        _upsert(table, doc_table, existing)
+        update_neighbors(table, [e["id"] for e in entries])
+    return chunk_table, existing
+
+
+def add_documents(entries, encode_batch_size=BULK_ENCODE_BATCH,
+                  write_batch_size=BULK_WRITE_BATCH, progress=None, dedup=DEDUP_MODE):
+    """Agrega (upsert por id) muchos documentos con encode por batches y pocos commits grandes.
+    
+    entries: iterable de dicts {id, text, metadata} (ver iter_bulk_source).
+    progress: callback opcional que recibe un dict tras cada commit.
+    dedup: "off", "flag" o "skip" (ver near_duplicates).
+    """
+    if dedup not in DEDUP_MODES:
+        return {"success": False, "error": f"Unknown dedup mode {dedup}, use one of {list(DEDUP_MODES)}"}
+    
+    started = time.perf_counter()
+    added = 0
+    replaced = 0
+    chunk_count = 0
+    failed = []
+    duplicates = []
+    
+    try:
+        model = get_model()
+        table = open_table(create=True)
+        chunks = open_chunks_table(create=True)
+        detector = DuplicateDetector() if dedup != "off" else None
+        
+        pending = []
+        
+        def flush():
+            nonlocal added, replaced, chunk_count
+            if not pending:
+                return
+            chunk_table, existing = _write_batch(model, table, chunks, pending, encode_batch_size)
+            chunk_count += chunk_table.num_rows
+            replaced += len(existing)
+            added += len(pending)
+            pending.clear()
+            if detector:
+                detector.flush()
+            if progress:
+                elapsed = time.perf_counter() - started
+                progress({"added": added, "failed": len(failed), "elapsed_s": round(elapsed, 2),
+                          "docs_per_s": round(added / elapsed, 1) if elapsed else None})
+        
+        for entry in entries:
+            if "error" in entry:
+                failed.append({"id": entry["id"], "error": entry["error"]})
+                continue
+            if detector:
+                with stage("near_duplicates"):
+                    signature, bands, duplicate = detector.check(entry["id"], entry["text"])
+                if duplicate:
+                    duplicates.append({"id": entry["id"], "near_duplicate_of": duplicate,
+                                       "skipped": dedup == "skip"})
+                    if dedup == "skip":
+                        continue
+                    entry = dict(entry, metadata=dict(entry.get("metadata") or {},
+                                                      near_duplicate_of=duplicate["id"]))
+                detector.add(entry["id"], signature, bands)
+            pending.append(entry)
+            if len(pending) >= write_batch_size:
+                flush()
+        flush()
+    
+    except Exception as e:
+        return {"success": False, "added": added, "failed": failed, "error": str(e)}
+    
+    elapsed = time.perf_counter() - started
+    return {
+        "success": True,
+        "added": added,
+        "replaced": replaced,
+        "chunks": chunk_count,
+        "failed": failed,
+        "near_duplicates": duplicates,
+        "elapsed_s": round(elapsed, 3),
+        "docs_per_s": round(added / elapsed, 1) if elapsed else None
+    }
+
+
+def add_document_group(requests):
+    """Agrega en un solo commit por tabla los add_document de varias peticiones.
+
+    requests: lista de argumentos de add_document (doc_id, text, metadata,
+    dedup). Retorna un resultado por petición con el formato de add_document.
+    Lo usa la cola de escritura del worker (write_queue) para el group commit.
+    """
+    import pyarrow.compute as pc
+
+    results = [None] * len(requests)
+    pending = []
+    detector = None
+    for index, request in enumerate(requests):
+        doc_id, text = request["doc_id"], request["text"]
+        dedup = request.get("dedup") or DEDUP_MODE
+        if dedup not in DEDUP_MODES:
+            results[index] = {"success": False, "error": f"Unknown dedup mode {dedup}, use one of {list(DEDUP_MODES)}"}
+            continue
+        metadata = request.get("metadata") or {}
+        duplicate = None
+        if dedup != "off":
+            detector = detector or DuplicateDetector()
+            with stage("near_duplicates"):
+                signature, bands, duplicate = detector.check(doc_id, text)
+            if duplicate and dedup == "skip":
+                results[index] = {"success": True, "id": doc_id, "skipped": True, "near_duplicate_of": duplicate}
+                continue
+            if duplicate:
+                metadata = dict(metadata, near_duplicate_of=duplicate["id"])
+            detector.add(doc_id, signature, bands)
+        pending.append((index, {"id": doc_id, "text": text, "metadata": metadata}, duplicate))
+
+    if pending:
+        table = open_table(create=True)
+        chunks = open_chunks_table(create=True)
+        chunk_table, existing = _write_batch(get_model(), table, chunks, [e for _, e, _ in pending],
+                                             BULK_ENCODE_BATCH)
+        if detector:
+            detector.flush()
+        counts = pc.value_counts(chunk_table.column("doc_id")).to_pylist()
+        chunk_counts = {c["values"]: c["counts"] for c in counts}
+        seen = set()
+        for index, entry, duplicate in pending:
+            doc_id = entry["id"]
+            # Un id repetido en el mismo grupo reemplaza a la petición anterior
+            result = {"success": True, "id": doc_id, "chunks": chunk_counts.get(doc_id, 0),
+                      "replaced": doc_id in existing or doc_id in seen}
+            seen.add(doc_id)
+            if duplicate:
+                result["near_duplicate_of"] = duplicate
+            results[index] = result
+    return results
+
+
+def add_bulk(source, batch_size=BULK_ENCODE_BATCH, write_batch_size=BULK_WRITE_BATCH, progress=None,
+             dedup=DEDUP_MODE):
+    """Ingesta masiva desde un directorio o manifest NDJSON"""
+    if not Path(source).exists():
+        return {"success": False, "error": f"Source not found: {source}"}
+    return add_documents(iter_bulk_source(source), batch_size, write_batch_size, progress, dedup)
+
+
+def _print_progress(info):
+    """Progreso como NDJSON en stderr (stdout queda solo para el resultado)"""
+    print(json.dumps({"progress": info}), file=sys.stderr, flush=True)
+
+
 if __name__ == "__main__":
+    mark_imports()
+    # --dedup off|flag|skip vale para ambos modos
+    dedup = cli_option(sys.argv, "--dedup", DEDUP_MODE, str)
+    if "--dedup" in sys.argv:
+        i = sys.argv.index("--dedup")
+        del sys.argv[i:i + 2]
+
+    if len(sys.argv) >= 3 and sys.argv[1] == "--bulk":
+        # lancedb_add.py --bulk <dir|manifest.ndjson> [--batch-size N] [--write-batch N]
+        source = sys.argv[2]
+        batch_size = cli_option(sys.argv, "--batch-size", BULK_ENCODE_BATCH)
+        write_batch = cli_option(sys.argv, "--write-batch", BULK_WRITE_BATCH)
+
+        result = add_bulk(source, batch_size, write_batch, progress=_print_progress, dedup=dedup)
+        print(dumps(result, ensure_ascii=False))
+        sys.exit(0)
+
     if len(sys.argv) < 3:
-        print(json.dumps({"error": "Usage: lancedb_add.py <doc_id> <text|--file path> [metadata_json]"}))
+        print(json.dumps({"error": "Usage: lancedb_add.py <doc_id> <text|--file path> [metadata_json] | --bulk <dir|manifest.ndjson> [--batch-size N] [--write-batch N] [--dedup off|flag|skip]"}))
         sys.exit(1)
     
     doc_id = sys.argv[1]
@@ -85,7 +421,10 @@ if __name__ == "__main__":
         text = sys.argv[2]
         metadata = json.loads(sys.argv[3]) if len(sys.argv) > 3 else {}
     
-    result = add_document(doc_id, text, metadata)
+    # Usar el worker residente si está corriendo; si no, procesar aquí
+    result = lancedb_client.try_call("add", doc_id=doc_id, text=text, metadata=metadata, dedup=dedup)
+    if result is None:
+        result = add_document(doc_id, text, metadata, dedup)
     
     # Imprimir SOLO el JSON
-    print(json.dumps(result))
\ No newline at end of file
+    print(dumps(result))
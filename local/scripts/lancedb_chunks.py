@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Troceado de documentos en chunks por tokens y agregación de resultados.
+#
+# all-MiniLM-L6-v2 trunca la entrada a 256 tokens, así que un documento largo
+# se divide en ventanas solapadas que se codifican en una sola llamada batch y
+# se guardan en la tabla de chunks (CHUNKS_TABLE_NAME) enlazadas al id padre.
+#
+# Para bases de datos creadas antes del troceado:
+#   python lancedb_chunks.py --backfill
+
+from lancedb_common import (VECTOR_DIM, CHUNKS_TABLE_NAME, get_model, open_table, scan, sql_quote,
+                            ensure_scalar_index, vector_field)
+from embedding_cache import encode_cached
+from text_store import hydrate
+from profiling import stage
+
+# Tokens por chunk (deja margen para [CLS]/[SEP] dentro de los 256 del modelo)
+CHUNK_TOKENS = 200
+CHUNK_OVERLAP = 40
+ENCODE_BATCH_SIZE = 32
+
+# Cuántos chunks pedir por cada documento solicitado antes de agregar; si
+# no alcanzan para `limit` documentos distintos se pide SEARCH_OVERFETCH veces más
+SEARCH_OVERFETCH = 4
+AGGREGATE_MODES = ("max", "sum")
+
+
+def chunks_schema():
+    """Schema Arrow de la tabla de chunks"""
+    import pyarrow as pa
+    return pa.schema([
+        pa.field("doc_id", pa.string()),
+        pa.field("chunk_index", pa.int32()),
+        pa.field("start", pa.int64()),
+        pa.field("end", pa.int64()),
+        pa.field("text", pa.string()),
+        vector_field()
+    ])
+
+
+def open_chunks_table(create=False):
+    """Abre (o crea) la tabla de chunks"""
+    return open_table(create=create, name=CHUNKS_TABLE_NAME, schema=chunks_schema())
+
+
+def token_spans(text, tokenizer=None):
+    """Retorna los offsets (inicio, fin) en caracteres de cada token del texto"""
+    if tokenizer is not None:
+        try:
+            encoding = tokenizer(text, add_special_tokens=False,
+                                 return_offsets_mapping=True, verbose=False)
+            return [tuple(span) for span in encoding["offset_mapping"]]
+        except Exception:
+            # Tokenizer lento sin offsets: usar palabras como aproximación
+            pass
+
+    import re
+    return [m.span() for m in re.finditer(r"\S+", text)]
+
+
+def chunk_text(text, tokenizer=None, max_tokens=CHUNK_TOKENS, overlap=CHUNK_OVERLAP):
+    """Divide el texto en chunks solapados de como máximo max_tokens tokens.
+
+    Retorna una lista de dicts {"start", "end", "text"} con offsets en caracteres.
+    """
+    spans = token_spans(text, tokenizer)
+    if not spans:
+        return [{"start": 0, "end": len(text), "text": text}] if text.strip() else []
+
+    step = max(1, max_tokens - overlap)
+    chunks = []
+    for first in range(0, len(spans), step):
+        window = spans[first:first + max_tokens]
+        start, end = window[0][0], window[-1][1]
+        chunks.append({"start": start, "end": end, "text": text[start:end]})
+        if first + max_tokens >= len(spans):
+            break
+    return chunks
+
+
+def vectors_to_arrow(vectors):
+    """Convierte una matriz numpy (n, VECTOR_DIM) en una columna Arrow de vectores"""
+    import numpy as np
+    import pyarrow as pa
+    flat = pa.array(np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1))
+    return pa.FixedSizeListArray.from_arrays(flat, VECTOR_DIM)
+
+
+def embed_documents(model, docs, batch_size=ENCODE_BATCH_SIZE):
+    """Trocea y codifica varios documentos con una sola llamada a encode.
+
+    docs: lista de (doc_id, text).
+    Retorna (tabla Arrow de chunks, matriz numpy de vectores de documento).
+    Cada vector de documento es la media normalizada de sus chunks, así la
+    tabla principal sigue siendo buscable sin codificar el texto dos veces.
+    """
+    import numpy as np
+    import pyarrow as pa
+
+    tokenizer = getattr(model, "tokenizer", None)
+    columns = {"doc_id": [], "chunk_index": [], "start": [], "end": [], "text": []}
+    owners = []
+    with stage("chunk"):
+        for doc_index, (doc_id, text) in enumerate(docs):
+            chunks = chunk_text(text, tokenizer) or [{"start": 0, "end": 0, "text": ""}]
+            for i, c in enumerate(chunks):
+                columns["doc_id"].append(doc_id)
+                columns["chunk_index"].append(i)
+                columns["start"].append(c["start"])
+                columns["end"].append(c["end"])
+                columns["text"].append(c["text"])
+                owners.append(doc_index)
+
+    # Solo se codifican los chunks que no están en la caché de embeddings
+    vectors = encode_cached(columns["text"], model, batch_size=batch_size)
+
+    # Media por documento
+    owners = np.asarray(owners)
+    doc_vectors = np.zeros((len(docs), VECTOR_DIM), dtype=np.float32)
+    np.add.at(doc_vectors, owners, vectors)
+    norms = np.linalg.norm(doc_vectors, axis=1, keepdims=True)
+    doc_vectors = doc_vectors / np.where(norms > 0, norms, 1.0)
+
+    schema = chunks_schema()
+    arrays = [pa.array(columns[f.name], type=f.type) for f in schema if f.name != "vector"]
+    arrays.append(vectors_to_arrow(vectors))
+    return pa.Table.from_arrays(arrays, schema=schema), doc_vectors
+
+
+def embed_chunks(model, doc_id, text):
+    """Trocea y codifica un documento.
+
+    Retorna (tabla Arrow de chunks, vector del documento como lista).
+    """
+    chunk_table, doc_vectors = embed_documents(model, [(doc_id, text)])
+    return chunk_table, doc_vectors[0].tolist()
+
+
+def ensure_fts_index(table):
+    """Crea el índice full-text (BM25) sobre el texto de los chunks si falta.
+
+    Sin stemming ni stop words para que códigos, números de factura o emails
+    coincidan tal cual; las filas añadidas después del índice se buscan sin
+    indexar hasta el siguiente optimize, que las incorpora de forma incremental.
+    """
+    if any(idx.index_type == "FTS" and "text" in idx.columns for idx in table.list_indices()):
+        return False
+    if table.count_rows() == 0:
+        return False
+    table.create_fts_index("text", use_tantivy=False, stem=False,
+                           remove_stop_words=False, ascii_folding=True)
+    return True
+
+
+def delete_chunks(doc_id):
+    """Elimina los chunks de un documento o de una lista de documentos (si existe la tabla de chunks)"""
+    try:
+        table = open_chunks_table()
+    except Exception:
+        return
+    ensure_scalar_index(table, "doc_id")
+    if isinstance(doc_id, str):
+        table.delete(f"doc_id = {sql_quote(doc_id)}")
+    elif doc_id:
+        table.delete("doc_id IN (" + ", ".join(sql_quote(i) for i in doc_id) + ")")
+
+
+def replace_chunks(table, chunk_table, doc_ids):
+    """Escribe chunks nuevos reemplazando los que ya tengan esos documentos.
+
+    Un solo merge-insert por (doc_id, chunk_index): los índices que siguen
+    existiendo se actualizan, los nuevos se insertan y los sobrantes de
+    doc_ids se borran en el mismo commit. Una búsqueda concurrente ve los
+    chunks viejos o los nuevos, nunca el documento sin chunks.
+    """
+    if not doc_ids:
+        table.add(chunk_table)
+        return
+    ensure_scalar_index(table, "doc_id")
+    (table.merge_insert(["doc_id", "chunk_index"])
+     .when_matched_update_all()
+     .when_not_matched_insert_all()
+     .when_not_matched_by_source_delete("doc_id IN (" + ", ".join(sql_quote(i) for i in doc_ids) + ")")
+     .execute(chunk_table))
+
+
+def distance_to_score(distance):
+    """Convierte distancia L2² entre vectores normalizados en similitud coseno"""
+    return 1.0 - float(distance) / 2.0
+
+
+def aggregate_hits(hits, limit, mode="max"):
+    """Agrupa hits de chunks por documento.
+
+    hits: filas con doc_id, text, start, end y _distance.
+    mode: "max" (mejor chunk) o "sum" (suma de scores de los chunks encontrados).
+    Retorna hasta `limit` dicts ordenados por score descendente, cada uno con
+    el mejor pasaje del documento.
+    """
+    if mode not in AGGREGATE_MODES:
+        raise ValueError(f"Unknown mode {mode}, use one of {list(AGGREGATE_MODES)}")
+    docs = {}
+    for hit in hits:
+        score = distance_to_score(hit["_distance"])
+        doc = docs.get(hit["doc_id"])
+        if doc is None:
+            doc = docs[hit["doc_id"]] = {"id": hit["doc_id"], "score": 0.0, "best": None}
+        if mode == "sum":
+            doc["score"] += score
+        else:
+            doc["score"] = max(doc["score"], score)
+        if doc["best"] is None or score > doc["best"][0]:
+            doc["best"] = (score, hit)
+
+    ranked = sorted(docs.values(), key=lambda d: d["score"], reverse=True)[:limit]
+    return [{
+        "id": d["id"],
+        "score": d["score"],
+        "distance": float(d["best"][1]["_distance"]),
+        "passage": d["best"][1]["text"],
+        "passage_start": int(d["best"][1]["start"]),
+        "passage_end": int(d["best"][1]["end"])
+    } for d in ranked]
+
+
+def backfill_chunks(batch_docs=64):
+    """Genera chunks para documentos añadidos antes del troceado"""
+    table = open_table()
+    chunks = open_chunks_table(create=True)
+    chunked = set(scan(chunks, ["doc_id"]).column("doc_id").to_pylist())
+    ids = [i for i in scan(table, ["id"]).column("id").to_pylist() if i not in chunked]
+
+    model = get_model()
+    done = 0
+    for first in range(0, len(ids), batch_docs):
+        batch = ids[first:first + batch_docs]
+        where = "id IN (" + ", ".join(sql_quote(i) for i in batch) + ")"
+        rows = scan(table, ["id", "text"], where=where)
+        # Texto completo: la columna text solo tiene el snippet (salvo documentos sin migrar)
+        found = rows.column("id").to_pylist()
+        texts = hydrate(found, dict(zip(found, rows.column("text").to_pylist())))
+        docs = [(doc_id, texts[doc_id]) for doc_id in found]
+        if docs:
+            chunks.add(embed_documents(model, docs)[0])
+        done += len(batch)
+
+    return {"success": True, "documents": done}
+
+
+if __name__ == "__main__":
+    import sys
+    import json
+    from lancedb_common import setup_stdio, silence_warnings
+    from profiling import dumps, mark_imports
+
+    mark_imports()
+
+    setup_stdio()
+    silence_warnings()
+
+    if sys.argv[1:] != ["--backfill"]:
+        print(json.dumps({"success": False, "error": "Usage: lancedb_chunks.py --backfill"}))
+        sys.exit(1)
+
+    try:
+        result = backfill_chunks()
+    except Exception as e:
+        result = {"success": False, "error": str(e)}
+    print(dumps(result))
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Cliente ligero del worker residente de LanceDB (lancedb_worker.py).
+# Solo usa la librería estándar: los scripts CLI lo consultan primero y, si no
+# hay worker escuchando, ejecutan la operación en su propio proceso.
+
+import json
+import os
+import socket
+
+import profiling
+
+# Dirección del worker, p.ej. "127.0.0.1:8765". Vacía = sin worker.
+WORKER_ADDR = os.environ.get("LANCEDB_WORKER_ADDR", "")
+CONNECT_TIMEOUT = 0.2
+REQUEST_TIMEOUT = float(os.environ.get("LANCEDB_WORKER_TIMEOUT", "300"))
+
+
+def parse_addr(addr):
+    """Convierte "host:puerto" en una tupla (host, puerto)"""
+    host, _, port = addr.rpartition(":")
+    return (host or "127.0.0.1", int(port))
+
+
+def call(op, addr=None, **args):
+    """Envía una operación al worker y retorna su resultado.
+
+    Lanza ConnectionError si no hay worker disponible.
+    """
+    addr = addr or WORKER_ADDR
+    if not addr:
+        raise ConnectionError("LANCEDB_WORKER_ADDR not set")
+
+    try:
+        sock = socket.create_connection(parse_addr(addr), timeout=CONNECT_TIMEOUT)
+    except (OSError, ValueError) as e:
+        raise ConnectionError(str(e))
+
+    # A partir de aquí el worker pudo haber ejecutado la operación, así que
+    # los fallos ya no son ConnectionError (el CLI no debe reintentarla)
+    try:
+        with sock, profiling.stage(f"worker_{op}"):
+            sock.settimeout(REQUEST_TIMEOUT)
+            request = json.dumps({"id": 1, "op": op, "args": args}, ensure_ascii=False)
+            sock.sendall(request.encode('utf-8') + b"\n")
+            with sock.makefile('r', encoding='utf-8') as f:
+                line = f.readline()
+    except OSError as e:
+        raise RuntimeError(f"Worker request failed: {e}")
+
+    if not line:
+        raise RuntimeError("Worker closed the connection")
+
+    try:
+        response = json.loads(line)
+    except ValueError:
+        raise RuntimeError("Invalid worker response")
+    if "result" not in response:
+        # Error de protocolo (op desconocida, args inválidos...)
+        raise RuntimeError(response.get("error", "Invalid worker response"))
+    # Etapas medidas dentro del worker (si él también perfila)
+    profiling.merge("worker.", response.get("timings"))
+    return response["result"]
+
+
+def try_call(op, on_error=None, **args):
+    """Como call(), pero retorna None si no hay worker disponible.
+
+    Si el worker falla después de recibir la petición (error, timeout,
+    conexión cortada) retorna on_error(mensaje), por defecto
+    {"success": False, "error": mensaje}: el CLI imprime su JSON de error de
+    siempre y no repite la operación en su proceso.
+    """
+    try:
+        return call(op, **args)
+    except ConnectionError:
+        return None
+    except RuntimeError as e:
+        return on_error(str(e)) if on_error else {"success": False, "error": str(e)}
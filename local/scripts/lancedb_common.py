@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Configuración y recursos compartidos por los scripts de LanceDB.
+# Las librerías pesadas (lancedb, sentence_transformers/torch) se importan
+# solo cuando se necesitan y se cachean a nivel de proceso, de modo que el
+# worker residente (lancedb_worker.py) las carga una única vez.
+
+import atexit
+import io
+import os
+import sys
+import warnings
+
+from embedding_backends import load_backend, model_dim, model_id, vector_dim
+from profiling import stage
+
+# Configuración
+DB_PATH = os.environ.get("LANCEDB_PATH", "./data/lancedb")
+TABLE_NAME = os.environ.get("LANCEDB_TABLE", "documents")
+CHUNKS_TABLE_NAME = TABLE_NAME + "_chunks"
+SIGNATURES_TABLE_NAME = TABLE_NAME + "_signatures"
+NEIGHBORS_TABLE_NAME = TABLE_NAME + "_neighbors"
+MODEL_NAME = "all-MiniLM-L6-v2"
+# Backend de embeddings (torch, onnx, onnx-int8) y dimensión truncada
+# (Matryoshka, 0 = la del modelo); ver embedding_backends.py
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+
+
+def _configured_dim():
+    """(dimensión, error) según EMBEDDING_DIM.
+
+    Un valor inválido no rompe el import (los scripts no podrían responder
+    con su JSON de error): se usa la dimensión del modelo y el error sale en
+    la primera llamada a get_model() o get_db() (ver check_config).
+    """
+    raw = os.environ.get("EMBEDDING_DIM", "0").strip() or "0"
+    try:
+        return vector_dim(MODEL_NAME, int(raw)), None
+    except ValueError as e:
+        message = str(e) if "EMBEDDING_DIM" in str(e) else f"EMBEDDING_DIM must be an integer, got {raw!r}"
+        return model_dim(MODEL_NAME), message
+
+
+VECTOR_DIM, CONFIG_ERROR = _configured_dim()
+# Clave de los vectores en la caché de embeddings
+MODEL_ID = model_id(MODEL_NAME, EMBEDDING_BACKEND, VECTOR_DIM)
+OUTPUT_FORMATS = ("json", "ndjson", "arrow")
+
+_model = None
+_db = None
+
+
+def setup_stdio():
+    """Fuerza UTF-8 en stdout/stderr para Windows"""
+    if sys.platform == 'win32':
+        sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+        sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+
+
+def silence_warnings():
+    """Silencia warnings de transformers/tokenizers"""
+    warnings.filterwarnings('ignore')
+    os.environ['TRANSFORMERS_VERBOSITY'] = 'error'
+    os.environ['TOKENIZERS_PARALLELISM'] = 'false'
+
+
+def check_config():
+    """Falla con el error de configuración de embeddings, si lo hay"""
+    if CONFIG_ERROR:
+        raise ValueError(CONFIG_ERROR)
+
+
+def get_model():
+    """Retorna el modelo de embeddings (se carga una sola vez por proceso)"""
+    global _model
+    check_config()
+    if _model is None:
+        # Incluye importar sentence_transformers/torch (o ONNX Runtime)
+        with stage("load_model"):
+            _model = load_backend(EMBEDDING_BACKEND, MODEL_NAME, VECTOR_DIM)
+    return _model
+
+
+def get_db():
+    """Retorna la conexión a LanceDB (se abre una sola vez por proceso)"""
+    global _db
+    check_config()
+    if _db is None:
+        from datetime import timedelta
+        with stage("import_lancedb"):
+            import lancedb
+        # Consistencia inmediata: un worker residente debe ver las escrituras
+        # hechas por otros procesos (scripts sin worker, n8n, etc.)
+        with stage("connect"):
+            _db = lancedb.connect(DB_PATH, read_consistency_interval=timedelta(0))
+        atexit.register(close_db)
+    return _db
+
+
+def close_db():
+    """Libera la conexión antes de que termine el intérprete.
+
+    Una consulta con limit/where puede dejar lecturas de LanceDB en curso en
+    segundo plano; si el proceso termina con la conexión viva, Python aborta
+    al finalizar (PyGILState_Release).
+    """
+    global _db
+    if _db is not None:
+        import gc
+        _db = None
+        gc.collect()
+
+
+def metadata_fields():
+    """Columnas tipadas derivadas de la metadata JSON, con su índice escalar.
+
+    La columna metadata conserva el JSON completo; estas columnas permiten
+    filtrar dentro de LanceDB (prefiltro) sin parsear JSON fila a fila.
+    """
+    import pyarrow as pa
+    timestamp = pa.timestamp("us", tz="UTC")
+    return [
+        (pa.field("category", pa.string()), "BITMAP"),
+        (pa.field("tags", pa.list_(pa.string())), "LABEL_LIST"),
+        (pa.field("filename", pa.string()), "BTREE"),
+        (pa.field("extension", pa.string()), "BITMAP"),
+        (pa.field("uploaded_at", timestamp), "BTREE"),
+        (pa.field("updated_at", timestamp), "BTREE")
+    ]
+
+
+def embedding_metadata():
+    """Metadata de la columna vector: con qué modelo y dimensión se generó"""
+    return {"embedding_model": MODEL_NAME, "embedding_backend": EMBEDDING_BACKEND,
+            "embedding_dim": str(VECTOR_DIM)}
+
+
+def vector_field():
+    """Columna vector con la dimensión y la metadata del backend configurado"""
+    import pyarrow as pa
+    return pa.field("vector", pa.list_(pa.float32(), VECTOR_DIM), metadata=embedding_metadata())
+
+
+def check_embeddings(table):
+    """Falla si los vectores de la tabla no son del modelo/dimensión configurados.
+
+    Las tablas creadas antes de guardar la metadata se comparan solo por
+    dimensión (eran todas de MODEL_NAME). El backend puede cambiar: torch,
+    onnx y onnx-int8 producen vectores del mismo espacio.
+    """
+    if "vector" not in table.schema.names:
+        return
+    field = table.schema.field("vector")
+    metadata = {k.decode(): v.decode() for k, v in (field.metadata or {}).items()}
+    model = metadata.get("embedding_model", MODEL_NAME)
+    dim = field.type.list_size
+    if model != MODEL_NAME or dim != VECTOR_DIM:
+        raise ValueError(f"Table {table.name} has {dim}-dim vectors from {model}, but the configured "
+                         f"embeddings are {VECTOR_DIM}-dim from {MODEL_NAME} (check EMBEDDING_DIM)")
+
+
+def documents_schema():
+    """Schema Arrow de la tabla de documentos"""
+    import pyarrow as pa
+    return pa.schema([
+        pa.field("id", pa.string()),
+        pa.field("text", pa.string()),  # snippet; el texto completo está en text_store
+        pa.field("text_hash", pa.string()),
+        vector_field(),
+        pa.field("metadata", pa.string())
+    ] + [field for field, _ in metadata_fields()])
+
+
+def _parse_timestamp(value):
+    """Convierte un timestamp ISO 8601/RFC 3339 en datetime UTC (o None)"""
+    from datetime import datetime, timezone
+    if not isinstance(value, str) or not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def typed_metadata(metadata):
+    """Valores de las columnas tipadas para un dict de metadata"""
+    metadata = metadata or {}
+    tags = metadata.get("tags")
+    if isinstance(tags, str):
+        tags = [t.strip() for t in tags.split(",") if t.strip()]
+    elif isinstance(tags, list):
+        tags = [str(t) for t in tags if t is not None and str(t) != ""]
+    else:
+        tags = None
+
+    filename = metadata.get("filename")
+    filename = str(filename) if filename else None
+    extension = metadata.get("extension")
+    if not extension and filename and "." in filename:
+        extension = "." + filename.rsplit(".", 1)[1]
+
+    return {
+        "category": str(metadata["category"]) if metadata.get("category") else None,
+        "tags": tags,
+        "filename": filename,
+        "extension": extension.lower() if extension else None,
+        "uploaded_at": _parse_timestamp(metadata.get("uploaded_at")),
+        "updated_at": _parse_timestamp(metadata.get("updated_at"))
+    }
+
+
+def metadata_table(metadatas, schema):
+    """Tabla Arrow con las columnas tipadas que existen en el schema de la tabla.
+
+    Las tablas creadas antes de las columnas tipadas (sin migrar) no las
+    tienen, y en ese caso la tabla resultante no tiene columnas.
+    """
+    import pyarrow as pa
+    fields = [field for field, _ in metadata_fields() if field.name in schema.names]
+    return pa.Table.from_pylist([typed_metadata(m) for m in metadatas], schema=pa.schema(fields))
+
+
+def open_table(create=False, name=TABLE_NAME, schema=None):
+    """Abre una tabla (por defecto la de documentos), opcionalmente la crea si no existe.
+
+    Las tablas con vectores se comprueban contra el backend configurado
+    (check_embeddings).
+    """
+    db = get_db()
+    with stage("open_table"):
+        try:
+            table = db.open_table(name)
+        except Exception:
+            if not create:
+                raise
+            return db.create_table(name, schema=schema or documents_schema())
+        check_embeddings(table)
+        return table
+
+
+def sql_quote(value):
+    """Escapa un literal de texto para expresiones SQL de LanceDB"""
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def scan(table, columns, where=None):
+    """Lee solo las columnas indicadas (y opcionalmente filtradas) como tabla Arrow.
+
+    Evita to_pandas(), que materializa todos los textos y vectores.
+    """
+    with stage("scan"):
+        query = table.search().select(columns)
+        if where:
+            query = query.where(where)
+        # Sin límite explícito las consultas devuelven 10 filas
+        return query.limit(max(1, table.count_rows())).to_arrow()
+
+
+def ensure_scalar_index(table, column, index_type="BTREE"):
+    """Crea un índice escalar sobre la columna si todavía no existe.
+
+    Con el índice, los filtros "id = ..." se resuelven sin recorrer la tabla.
+    Las filas añadidas después quedan sin indexar hasta el siguiente optimize,
+    pero se siguen consultando correctamente.
+    """
+    try:
+        if any(column in idx.columns for idx in table.list_indices()):
+            return False
+        if table.count_rows() == 0:
+            return False
+        table.create_scalar_index(column, index_type=index_type)
+        return True
+    except Exception:
+        # Un índice que falta solo afecta al rendimiento
+        return False
+
+
+def cli_option(args, name, default, cast=int):
+    """Lee una opción "--nombre valor" de la línea de comandos"""
+    if name in args:
+        return cast(args[args.index(name) + 1])
+    return default
+
+
+def output_format(args):
+    """Formato de salida pedido con --format (--ndjson equivale a --format ndjson).
+
+    json (por defecto) es lo que lee el backend Go; ndjson es un objeto por
+    línea en streaming; arrow es un stream Arrow IPC de record batches.
+    """
+    fmt = cli_option(args, "--format", "ndjson" if "--ndjson" in args else "json", str)
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown format {fmt}, use one of {list(OUTPUT_FORMATS)}")
+    return fmt
+
+
+def write_arrow_stream(batches, schema, out=None):
+    """Escribe record batches como un stream Arrow IPC (por defecto en stdout)"""
+    import pyarrow as pa
+    out = out or sys.stdout.buffer
+    with pa.ipc.new_stream(out, schema) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+    out.flush()
+
+
+def index_coverage(table, idx):
+    """Filas indexadas/sin indexar de un índice (de las estadísticas de Lance)"""
+    stats = table.index_stats(idx.name)
+    indexed, unindexed = stats.num_indexed_rows, stats.num_unindexed_rows
+    return {
+        "name": idx.name,
+        "type": stats.index_type,
+        "columns": list(idx.columns),
+        "indexed_rows": indexed,
+        "unindexed_rows": unindexed,
+        "coverage": round(indexed / (indexed + unindexed), 4) if indexed + unindexed else 1.0
+    }
@@ -1,32 +1,33 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 import sys
-import io
-
-if sys.platform == 'win32':
-    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
-    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
-
 import json
-import os
-import warnings
 
-warnings.filterwarnings('ignore')
-os.environ['TRANSFORMERS_VERBOSITY'] = 'error'
+from lancedb_common import setup_stdio, silence_warnings, open_table, sql_quote, ensure_scalar_index
+from lancedb_chunks import delete_chunks
+from near_duplicates import delete_signatures
+from text_store import get_store
+from knn_graph import remove_neighbors
+import lancedb_client
+from profiling import stage, dumps, mark_imports
 
-import lancedb
+setup_stdio()
+silence_warnings()
 
-DB_PATH = "./data/lancedb"
-TABLE_NAME = "documents"
 
 def delete_document(doc_id):
     """Elimina un documento por ID"""
     try:
-        db = lancedb.connect(DB_PATH)
-        table = db.open_table(TABLE_NAME)
+        table = open_table()
+        ensure_scalar_index(table, "id")
         
         # LanceDB usa delete con expresión SQL
-        table.delete(f"id = '{doc_id}'")
+        with stage("delete"):
+            table.delete(f"id = {sql_quote(doc_id)}")
+            delete_chunks(doc_id)
+            delete_signatures(doc_id)
+            get_store().delete_many([doc_id])
+            remove_neighbors(table, [doc_id])
         
         return {"success": True, "id": doc_id}
     
@@ -34,11 +35,43 @@ def delete_document(doc_id):
         return {"success": False, "error": str(e)}
 
 
+def delete_documents(doc_ids):
+    """Elimina varios documentos con un solo commit por tabla"""
+    try:
+        doc_ids = list(dict.fromkeys(doc_ids))
+        if doc_ids:
+            table = open_table()
+            ensure_scalar_index(table, "id")
+            table.delete("id IN (" + ", ".join(sql_quote(i) for i in doc_ids) + ")")
+            delete_chunks(doc_ids)
+            delete_signatures(doc_ids)
+            get_store().delete_many(doc_ids)
+            remove_neighbors(table, doc_ids)
+        
+        return {"success": True, "deleted": len(doc_ids)}
+    
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+
+
+def delete_document_group(requests):
+    """delete_document de varias peticiones con un solo commit por tabla (group commit del worker)"""
+    doc_ids = [request["doc_id"] for request in requests]
+    result = delete_documents(doc_ids)
+    if not result["success"]:
+        raise RuntimeError(result["error"])
+    return [{"success": True, "id": doc_id} for doc_id in doc_ids]
+
+
 if __name__ == "__main__":
+    mark_imports()
     if len(sys.argv) < 2:
         print(json.dumps({"success": False, "error": "Usage: lancedb_delete.py <doc_id>"}))
         sys.exit(1)
     
     doc_id = sys.argv[1]
-    result = delete_document(doc_id)
-    print(json.dumps(result))
\ No newline at end of file
+    result = lancedb_client.try_call("delete", doc_id=doc_id)
+    if result is None:
+        result = delete_document(doc_id)
+    print(dumps(result))
@@ -1,27 +1,28 @@
 #!/usr/bin/env python3
 # Inicializa la base de datos LanceDB
 
-import lancedb
-from sentence_transformers import SentenceTransformer
+import sys
 
-# Inicializar modelo de embeddings
-model = SentenceTransformer('all-MiniLM-L6-v2')
+from lancedb_common import get_model, get_db, documents_schema, check_config, TABLE_NAME
+
+# EMBEDDING_DIM inválido: mensaje en vez de traceback
+try:
+    check_config()
+except ValueError as e:
+    print(f"Error: {e}")
+    sys.exit(1)
+
+# Inicializar modelo de embeddings (descarga el modelo si no está en caché)
+model = get_model()
 
 # Conectar a LanceDB
-db = lancedb.connect('./data/lancedb')
+db = get_db()
 
 # Crear tabla si no existe
 try:
-    table = db.open_table('documents')
+    table = db.open_table(TABLE_NAME)
     print("Tabla ya existe")
 except:
     # Crear tabla vacía
-    import pyarrow as pa
-    schema = pa.schema([
-        pa.field("id", pa.string()),
-        pa.field("text", pa.string()),
-        pa.field("vector", pa.list_(pa.float32(), 384)),
-        pa.field("metadata", pa.string())
-    ])
-    table = db.create_table('documents', schema=schema)
-    print("Tabla creada")
\ No newline at end of file
+    table = db.create_table(TABLE_NAME, schema=documents_schema())
+    print("Tabla creada")
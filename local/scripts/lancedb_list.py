@@ -1,48 +1,186 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 import sys
-import io
+import json
+
+from lancedb_common import (setup_stdio, silence_warnings, open_table, cli_option, output_format,
+                            write_arrow_stream)
+from text_store import hydrate, TEXT_SNIPPET_CHARS
+import lancedb_client
+from profiling import stage, dumps, finish, mark_imports
 
 # Forzar UTF-8
-if sys.platform == 'win32':
-    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
-    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+setup_stdio()
+silence_warnings()
 
-import json
-import os
-import warnings
+LIST_FIELDS = ("id", "text", "metadata")
+STREAM_BATCH_SIZE = 1024
+
+
+def _list_fields(fields):
+    return [f for f in LIST_FIELDS if f in fields] or ["id"]
+
+
+def check_page(offset=0, limit=None):
+    """Valida offset y limit (None = sin límite; 0 no significa "todos")"""
+    if limit is not None and int(limit) <= 0:
+        raise ValueError(f"Invalid limit {limit}: must be a positive integer")
+    if offset and int(offset) < 0:
+        raise ValueError(f"Invalid offset {offset}: must be zero or positive")
 
-warnings.filterwarnings('ignore')
-os.environ['TRANSFORMERS_VERBOSITY'] = 'error'
 
-import lancedb
+def iter_batches(offset=0, limit=None, fields=LIST_FIELDS, snippet_length=None, where=None,
+                 batch_size=STREAM_BATCH_SIZE):
+    """Genera los record batches Arrow de la tabla tal como los lee LanceDB.
 
-DB_PATH = "./data/lancedb"
-TABLE_NAME = "documents"
+    Solo se leen las columnas pedidas en fields (sin "text" no se toca el
+    texto), el filtro where se evalúa dentro de LanceDB y la memoria usada no
+    depende del tamaño de la tabla. La columna text de la tabla es un
+    snippet: el texto completo se lee de text_store solo para los ids de cada
+    batch, y no se lee si snippet_length cabe en el snippet.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
 
-def list_documents():
-    """Lista todos los documentos CON TEXTO COMPLETO"""
+    check_page(offset, limit)
+    fields = _list_fields(fields)
+    hydrate_text = "text" in fields and not (snippet_length and int(snippet_length) <= TEXT_SNIPPET_CHARS)
+    columns = fields if not hydrate_text or "id" in fields else ["id"] + fields
+    table = open_table()
+
+    query = table.search().select(columns)
+    if where:
+        query = query.where(where)
+    if offset:
+        query = query.offset(int(offset))
+    query = query.limit(int(limit) if limit is not None else None)
+
+    # Cerrar el reader aunque no se consuma entero (si no, LanceDB aborta al salir)
+    reader = query.to_batches(batch_size)
     try:
-        db = lancedb.connect(DB_PATH)
-        table = db.open_table(TABLE_NAME)
-        
-        df = table.to_pandas()
-        
-        docs = []
-        for _, row in df.iterrows():
-            metadata = json.loads(row['metadata']) if row['metadata'] else {}
-            docs.append({
-                "id": row['id'],
-                "text": row['text'],  # TEXTO COMPLETO, sin truncar
-                "metadata": metadata
-            })
-        
-        return docs
-    
+        for batch in reader:
+            if "text" in fields:
+                i = batch.schema.get_field_index("text")
+                text = batch.column(i)
+                if hydrate_text:
+                    ids = batch.column("id").to_pylist()
+                    full = hydrate(ids, dict(zip(ids, text.to_pylist())))
+                    text = pa.array([full[doc_id] for doc_id in ids], type=pa.string())
+                if snippet_length:
+                    text = pc.utf8_slice_codeunits(text, 0, int(snippet_length))
+                batch = batch.set_column(i, "text", text)
+            if columns is not fields:
+                batch = batch.select(fields)
+            yield batch
+    finally:
+        reader.close()
+
+
+def list_schema(fields=LIST_FIELDS):
+    """Schema Arrow de la salida de iter_batches"""
+    import pyarrow as pa
+    schema = open_table().schema
+    return pa.schema([schema.field(f) for f in _list_fields(fields)])
+
+
+def iter_documents(offset=0, limit=None, fields=LIST_FIELDS, snippet_length=None, where=None,
+                   batch_size=STREAM_BATCH_SIZE):
+    """Genera los documentos uno a uno como dicts (metadata ya parseada)"""
+    for batch in iter_batches(offset, limit, fields, snippet_length, where, batch_size):
+        for row in batch.to_pylist():
+            doc = {"id": row["id"]} if "id" in row else {}
+            if "text" in row:
+                doc["text"] = row["text"] or ""
+            if "metadata" in row:
+                doc["metadata"] = json.loads(row["metadata"]) if row["metadata"] else {}
+            yield doc
+
+
+def write_json(batches, out, array=True):
+    """Escribe los documentos como array JSON (o NDJSON) directo desde Arrow.
+
+    Sin dicts por fila ni un string gigante: cada batch se serializa por
+    columnas y se escribe enseguida, y la metadata (que ya es JSON en la
+    tabla) se copia tal cual en vez de parsearla y volver a serializarla.
+    Un error al abrir la tabla sale antes de escribir nada.
+    """
+    encode = json.JSONEncoder(ensure_ascii=False).encode
+    separator = ",\n" if array else "\n"
+    started = False
+    for batch in batches:
+        columns = [(name, batch.column(name).to_pylist()) for name in batch.schema.names]
+        lines = []
+        for i in range(batch.num_rows):
+            parts = []
+            for name, values in columns:
+                if name == "metadata":
+                    parts.append('"metadata": ' + (values[i] or "{}"))
+                elif name == "text":
+                    parts.append('"text": ' + encode(values[i] or ""))
+                else:
+                    parts.append(f'"{name}": ' + encode(values[i]))
+            lines.append("{" + ", ".join(parts) + "}")
+        if not lines:
+            continue
+        if not started:
+            out.write("[" if array else "")
+        else:
+            out.write(separator)
+        out.write(separator.join(lines))
+        started = True
+    if array:
+        out.write("]\n" if started else "[]\n")
+    elif started:
+        out.write("\n")
+    out.flush()
+
+
+def list_documents(offset=0, limit=None, fields=LIST_FIELDS, snippet_length=None, where=None):
+    """Lista los documentos (por defecto todos, CON TEXTO COMPLETO)"""
+    try:
+        with stage("list"):
+            return list(iter_documents(offset, limit, fields, snippet_length, where))
+
     except Exception as e:
         return [{"error": str(e)}]
 
 
 if __name__ == "__main__":
-    docs = list_documents()
-    print(json.dumps(docs, ensure_ascii=False))
\ No newline at end of file
+    mark_imports()
+    # lancedb_list.py [--offset N] [--limit N] [--fields id,metadata] [--snippet N]
+    #                 [--where SQL] [--format json|ndjson|arrow] [--ndjson]
+    options = {
+        "offset": cli_option(sys.argv, "--offset", 0),
+        "limit": cli_option(sys.argv, "--limit", None),
+        "fields": cli_option(sys.argv, "--fields", ",".join(LIST_FIELDS), str).split(","),
+        "snippet_length": cli_option(sys.argv, "--snippet", None),
+        "where": cli_option(sys.argv, "--where", None, str)
+    }
+    try:
+        fmt = output_format(sys.argv)
+        check_page(options["offset"], options["limit"])
+    except ValueError as e:
+        print(json.dumps([{"error": str(e)}]))
+        sys.exit(1)
+
+    if fmt == "json":
+        docs = lancedb_client.try_call("list", lambda e: [{"error": e}], **options)
+        if docs is not None:
+            print(dumps(docs, ensure_ascii=False))
+            sys.exit(0)
+
+    # Sin worker (o en streaming): se escribe directo desde los batches Arrow,
+    # a medida que se leen y con memoria constante
+    try:
+        with stage("list"):
+            if fmt == "arrow":
+                write_arrow_stream(iter_batches(**options), list_schema(options["fields"]))
+            else:
+                write_json(iter_batches(**options), sys.stdout, array=(fmt == "json"))
+    except Exception as e:
+        error = {"error": str(e)}
+        print(json.dumps([error] if fmt == "json" else error))
+        # JSON y NDJSON llevan el error en la salida (código 0, como siempre);
+        # en Arrow solo queda el código de salida
+        sys.exit(1 if fmt == "arrow" else 0)
+    finish()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Mantenimiento de las tablas de LanceDB: índice vectorial ANN, compactación
+# de fragmentos y limpieza de versiones antiguas.
+#
+# Uso:
+#   python lancedb_maintenance.py [--rebuild] [--index-type IVF_PQ|IVF_HNSW_SQ]
+#                                 [--min-rows N] [--keep-days N]
+#   python lancedb_maintenance.py --status
+#
+# Sin índice, table.search(vector) es un recorrido completo de la tabla. El
+# índice se crea cuando la tabla supera INDEX_MIN_ROWS filas; después,
+# optimize() compacta los fragmentos pequeños, añade las filas nuevas al
+# índice existente y borra las versiones más viejas que --keep-days. Las
+# tablas auxiliares (firmas de casi-duplicados y grafo kNN), que reciben un
+# merge-insert por cada documento agregado, también se compactan y podan.
+# También compacta los segmentos de text_store cuando la mitad ya es basura.
+
+import sys
+import math
+from datetime import timedelta
+
+from lancedb_common import (setup_stdio, silence_warnings, open_table, cli_option, ensure_scalar_index,
+                            index_coverage, VECTOR_DIM)
+from lancedb_chunks import open_chunks_table, ensure_fts_index
+from near_duplicates import open_signatures_table
+from knn_graph import open_neighbors_table
+from lancedb_migrate import ensure_metadata_indexes
+from text_store import get_store
+import lancedb_client
+from profiling import dumps, mark_imports
+
+setup_stdio()
+silence_warnings()
+
+INDEX_MIN_ROWS = 5000
+INDEX_TYPES = ("IVF_PQ", "IVF_HNSW_SQ")
+DEFAULT_INDEX_TYPE = "IVF_PQ"
+KEEP_VERSIONS_DAYS = 7
+
+# Reconstruir el índice si más de esta fracción de filas quedó sin indexar
+# (optimize las añade a las particiones existentes, que se van degradando)
+REBUILD_UNINDEXED_RATIO = 0.5
+
+
+def _tables():
+    """Documentos y, si existen, chunks, firmas y grafo kNN"""
+    tables = {"documents": open_table()}
+    for name, opener in (("chunks", open_chunks_table), ("signatures", open_signatures_table),
+                         ("neighbors", open_neighbors_table)):
+        try:
+            table = opener()
+        except Exception:
+            continue
+        if table is not None:
+            tables[name] = table
+    return tables
+
+
+def vector_index(table):
+    """Retorna el índice vectorial de la tabla (o None)"""
+    for idx in table.list_indices():
+        if "vector" in idx.columns:
+            return idx
+    return None
+
+
+def index_status(table):
+    """Estado del índice vectorial y de los fragmentos de una tabla"""
+    stats = table.stats()
+    status = {
+        "rows": stats["num_rows"],
+        "fragments": stats["fragment_stats"]["num_fragments"],
+        "small_fragments": stats["fragment_stats"]["num_small_fragments"],
+        "version": table.version,
+        "vector_index": None
+    }
+
+    idx = vector_index(table)
+    if idx is not None:
+        status["vector_index"] = index_coverage(table, idx)
+    return status
+
+
+def build_vector_index(table, index_type=DEFAULT_INDEX_TYPE):
+    """(Re)construye el índice vectorial dimensionado según el número de filas"""
+    rows = table.count_rows()
+    params = {
+        "metric": "l2",
+        "index_type": index_type,
+        # ~sqrt(n) particiones: equilibrio habitual entre entrenamiento y nprobes
+        "num_partitions": max(1, min(4096, int(math.sqrt(rows)))),
+        "replace": True
+    }
+    if index_type == "IVF_PQ":
+        # ~16 dimensiones por subvector (PQ necesita un divisor de la dimensión)
+        params["num_sub_vectors"] = next(n for n in range(max(1, VECTOR_DIM // 16), 0, -1)
+                                         if VECTOR_DIM % n == 0)
+    table.create_index(**params)
+
+
+def optimize(rebuild=False, index_type=DEFAULT_INDEX_TYPE, min_rows=INDEX_MIN_ROWS,
+             keep_days=KEEP_VERSIONS_DAYS):
+    """Crea/actualiza índices, compacta fragmentos y limpia versiones viejas"""
+    if index_type not in INDEX_TYPES:
+        return {"success": False, "error": f"Unknown index type {index_type}, use one of {list(INDEX_TYPES)}"}
+
+    try:
+        report = {}
+        for name, table in _tables().items():
+            before = index_status(table)
+            actions = []
+
+            idx = before["vector_index"]
+            # Firmas y grafo no tienen columna vector: solo se compactan
+            indexable = "vector" in table.schema.names and before["rows"] >= min_rows
+            stale = (idx is not None and
+                     idx["unindexed_rows"] > REBUILD_UNINDEXED_RATIO * max(1, idx["indexed_rows"]))
+            if indexable and (idx is None or rebuild or stale):
+                build_vector_index(table, index_type)
+                actions.append("build_index")
+
+            if name == "chunks" and ensure_fts_index(table):
+                actions.append("build_fts_index")
+            if name == "documents":
+                # Índices escalares de id y de la metadata tipada
+                ensure_scalar_index(table, "id")
+                if ensure_metadata_indexes(table):
+                    actions.append("build_metadata_indexes")
+
+            # Compacta fragmentos, indexa filas nuevas y poda versiones antiguas
+            table.optimize(cleanup_older_than=timedelta(days=keep_days))
+            actions.append("optimize")
+
+            report[name] = {"actions": actions, "before": before, "after": index_status(table)}
+
+        return {"success": True, "tables": report, "text_store": get_store().compact()}
+
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+
+def status():
+    """Estado de índices y fragmentos sin modificar nada"""
+    try:
+        return {"success": True, "tables": {name: index_status(t) for name, t in _tables().items()},
+                "text_store": get_store().stats()}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+
+if __name__ == "__main__":
+    mark_imports()
+    args = sys.argv[1:]
+
+    if "--status" in args:
+        result = status()
+    else:
+        options = {
+            "rebuild": "--rebuild" in args,
+            "index_type": cli_option(args, "--index-type", DEFAULT_INDEX_TYPE, str),
+            "min_rows": cli_option(args, "--min-rows", INDEX_MIN_ROWS),
+            "keep_days": cli_option(args, "--keep-days", KEEP_VERSIONS_DAYS)
+        }
+        result = lancedb_client.try_call("optimize", **options)
+        if result is None:
+            result = optimize(**options)
+
+    print(dumps(result))
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Migra la tabla de documentos al schema con metadata tipada.
+#
+# Añade las columnas category, tags, filename, extension, uploaded_at y
+# updated_at (ver lancedb_common.metadata_fields), las rellena a partir del
+# JSON de la columna metadata y crea sus índices escalares. También mueve el
+# texto completo de los documentos anteriores a text_store al almacén y deja
+# en la tabla solo el snippet y su text_hash, y anota en la columna vector de
+# las tablas anteriores el modelo y la dimensión de sus embeddings. Se puede
+# ejecutar varias veces: solo añade lo que falta.
+#
+# Uso: python lancedb_migrate.py
+
+import json
+
+from lancedb_common import (setup_stdio, silence_warnings, open_table, scan, sql_quote,
+                            ensure_scalar_index, metadata_fields, metadata_table, embedding_metadata)
+from lancedb_chunks import open_chunks_table
+from profiling import dumps, mark_imports
+from text_store import get_store, snippet, text_hash
+
+setup_stdio()
+silence_warnings()
+
+MIGRATE_BATCH = 5000
+# Los textos completos pesan más que la metadata: batches más pequeños
+TEXT_MIGRATE_BATCH = 500
+
+
+def ensure_metadata_indexes(table):
+    """Crea los índices escalares de las columnas tipadas que falten"""
+    created = []
+    for field, index_type in metadata_fields():
+        if field.name in table.schema.names and ensure_scalar_index(table, field.name, index_type):
+            created.append(field.name)
+    return created
+
+
+def migrate_texts(table):
+    """Mueve los textos completos de la tabla a text_store.
+
+    Retorna cuántos documentos se movieron. Las filas sin text_hash son
+    anteriores al almacén: su columna text tiene el documento completo.
+    """
+    import pyarrow as pa
+
+    ids = scan(table, ["id"], where="text_hash IS NULL").column("id").to_pylist()
+    moved = 0
+    for first in range(0, len(ids), TEXT_MIGRATE_BATCH):
+        batch = list(dict.fromkeys(ids[first:first + TEXT_MIGRATE_BATCH]))
+        where = "id IN (" + ", ".join(sql_quote(i) for i in batch) + ")"
+        rows = scan(table, ["id", "text"], where=where).to_pylist()
+        texts = {r["id"]: r["text"] or "" for r in rows}
+
+        # Los agregados después de actualizar (tabla aún sin text_hash) ya
+        # están en el almacén y la tabla solo tiene su snippet
+        stored = get_store().get_many(list(texts))
+        # Primero el almacén: si el merge-insert falla, la fila sigue completa
+        get_store().put_many((i, t) for i, t in texts.items() if i not in stored)
+        texts.update(stored)
+        source = pa.table({
+            "id": pa.array(list(texts), type=pa.string()),
+            "text": pa.array([snippet(t) for t in texts.values()], type=pa.string()),
+            "text_hash": pa.array([text_hash(t) for t in texts.values()], type=pa.string())
+        })
+        table.merge_insert("id").when_matched_update_all().execute(source)
+        moved += len(texts)
+    return moved
+
+
+def stamp_embeddings(table):
+    """Anota modelo y dimensión en la columna vector si la tabla no los tiene.
+
+    open_table ya comprobó que la dimensión coincide; las tablas sin
+    metadata se generaron todas con torch.
+    """
+    field = table.schema.field("vector")
+    if field.metadata and b"embedding_model" in field.metadata:
+        return False
+    table.replace_field_metadata("vector", dict(embedding_metadata(), embedding_backend="torch"))
+    return True
+
+
+def migrate():
+    """Añade y rellena las columnas tipadas de metadata"""
+    try:
+        import pyarrow as pa
+
+        table = open_table()
+        missing = [field for field, _ in metadata_fields() if field.name not in table.schema.names]
+        if "text_hash" not in table.schema.names:
+            missing.append(pa.field("text_hash", pa.string()))
+        if missing:
+            # Columnas nuevas a null: solo se escribe metadata del schema
+            table.add_columns(pa.schema(missing))
+
+        # Rellenar desde el JSON, por batches y con un merge-insert por batch
+        typed_missing = [f for f in missing if f.name != "text_hash"]
+        ids = scan(table, ["id"]).column("id").to_pylist() if typed_missing else []
+        filled = 0
+        for first in range(0, len(ids), MIGRATE_BATCH):
+            batch = list(dict.fromkeys(ids[first:first + MIGRATE_BATCH]))
+            where = "id IN (" + ", ".join(sql_quote(i) for i in batch) + ")"
+            rows = scan(table, ["id", "metadata"], where=where).to_pylist()
+            rows = list({r["id"]: r for r in rows}.values())
+            metadatas = [json.loads(r["metadata"]) if r["metadata"] else {} for r in rows]
+
+            typed = metadata_table(metadatas, table.schema)
+            source = typed.add_column(0, "id", pa.array([r["id"] for r in rows], type=pa.string()))
+            table.merge_insert("id").when_matched_update_all().execute(source)
+            filled += len(rows)
+
+        texts = migrate_texts(table)
+
+        stamped = [table.name] if stamp_embeddings(table) else []
+        try:
+            chunks = open_chunks_table()
+        except Exception:
+            chunks = None  # base de datos anterior al troceado
+        if chunks is not None and stamp_embeddings(chunks):
+            stamped.append(chunks.name)
+
+        ensure_scalar_index(table, "id")
+        indexes = ensure_metadata_indexes(table)
+
+        return {
+            "success": True,
+            "added_columns": [f.name for f in missing],
+            "filled_rows": filled,
+            "moved_texts": texts,
+            "stamped_embeddings": stamped,
+            "created_indexes": indexes
+        }
+
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+
+if __name__ == "__main__":
+    mark_imports()
+    print(dumps(migrate()))
@@ -1,69 +1,466 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 import sys
-import io
-
-if sys.platform == 'win32':
-    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
-    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
-
 import json
-import os
-import warnings
+import time
+
+from lancedb_common import (setup_stdio, silence_warnings, open_table, scan, sql_quote, cli_option,
+                            output_format, write_arrow_stream)
+import search_cache
+from text_store import hydrate
+from profiling import stage, dumps, finish, mark_imports
+from lancedb_chunks import (open_chunks_table, aggregate_hits, ensure_fts_index, SEARCH_OVERFETCH,
+                            AGGREGATE_MODES)
+from knn_graph import related
+import lancedb_client
 
+setup_stdio()
 # Silenciar warnings
-warnings.filterwarnings('ignore')
-os.environ['TRANSFORMERS_VERBOSITY'] = 'error'
-os.environ['TOKENIZERS_PARALLELISM'] = 'false'
+silence_warnings()
+
+# Con filtros que cumplen más documentos que esto, se busca sobre los
+# vectores de documento en vez de pasar la lista de ids a la tabla de chunks
+PREFILTER_MAX_IDS = 5000
+NO_MATCHES = object()
+WIDE_FILTER = object()
+
+# Constante k de reciprocal-rank fusion
+RRF_K = 60
 
-import lancedb
-from sentence_transformers import SentenceTransformer
 
-DB_PATH = "./data/lancedb"
-TABLE_NAME = "documents"
+def search_documents(query, limit=5, mode="max", nprobes=None, refine_factor=None, where=None,
+                     full_text=False):
+    """Busca documentos similares por vector.
 
-def search_documents(query, limit=5):
-    """Busca documentos similares por vector"""
+    Busca sobre los chunks y agrega los hits por documento (mode "max" o
+    "sum"); "text" es el pasaje que mejor coincide con la consulta.
+    nprobes/refine_factor ajustan el índice ANN (más = mejor recall, más lento).
+    where: filtro SQL sobre las columnas de la tabla de documentos, p.ej.
+    "category = 'Finanzas' AND array_has_any(tags, ['factura'])". Se aplica
+    como prefiltro dentro de LanceDB (usa los índices escalares).
+    full_text: agrega "full_text" con el documento completo (de text_store),
+    leído solo para los resultados devueltos.
+    """
+    if mode not in AGGREGATE_MODES:
+        return [{"error": f"Unknown mode {mode}, use one of {list(AGGREGATE_MODES)}"}]
     try:
-        # Cargar modelo (silencioso)
-        model = SentenceTransformer('all-MiniLM-L6-v2', device='cpu')
+        # Generar embedding del query (consultas repetidas salen de la LRU o
+        # de la caché en disco sin cargar el modelo)
+        query_vector = search_cache.query_vector(query)
         
-        # Generar embedding del query
-        query_vector = model.encode(query).tolist()
+        table = open_table()
         
-        # Conectar a LanceDB
-        db = lancedb.connect(DB_PATH)
-        table = db.open_table(TABLE_NAME)
+        try:
+            chunks = open_chunks_table()
+        except Exception:
+            # Base de datos anterior al troceado: búsqueda por documento
+            output = _search_whole_documents(table, query_vector, limit, nprobes, refine_factor, where)
+            return attach_full_text(table, output) if full_text else output
+        
+        # Resultados cacheados para esta versión de las tablas (sin textos completos)
+        search_cache.results.check_versions((table.version, chunks.version))
+        key = search_cache.result_key(query_vector, limit, mode, where, nprobes, refine_factor)
+        cached = search_cache.results.get(key)
+        if cached is not None:
+            output = [dict(doc) for doc in cached]
+        else:
+            output = _search_chunks(table, chunks, query_vector, limit, mode, nprobes, refine_factor, where)
+            search_cache.results.put(key, [dict(doc) for doc in output])
+        return attach_full_text(table, output) if full_text else output
+    
+    except Exception as e:
+        return [{"error": str(e)}]
+
+
+def _search_chunks(table, chunks, query_vector, limit, mode, nprobes, refine_factor, where):
+    """Búsqueda sobre los chunks agregada por documento (sin caché)"""
+    # El filtro es sobre documentos: se traduce a los ids que lo cumplen
+    chunk_filter = _chunk_prefilter(table, where)
+    if chunk_filter is NO_MATCHES:
+        return []
+    if chunk_filter is WIDE_FILTER:
+        # Filtro poco selectivo: prefiltro directo sobre los vectores de documento
+        return _search_whole_documents(table, query_vector, limit, nprobes, refine_factor, where)
+    
+    # Buscar chunks similares y agregarlos por documento
+    hits = _document_hits(chunks, query_vector, limit, chunk_filter, nprobes, refine_factor)
+    ranked = aggregate_hits(hits, limit, mode)
+    
+    # Formatear resultados
+    metadata_by_id = _metadata_for(table, [d["id"] for d in ranked])
+    output = []
+    for doc in ranked:
+        if doc["id"] not in metadata_by_id:
+            continue  # chunks huérfanos de un documento borrado
+        output.append({
+            "id": doc["id"],
+            "text": doc["passage"],  # Pasaje más relevante
+            "distance": doc["distance"],
+            "score": doc["score"],
+            "passage_start": doc["passage_start"],
+            "passage_end": doc["passage_end"],
+            "metadata": metadata_by_id[doc["id"]]
+        })
+    
+    return output
+
+
+def search_hybrid(query, limit=5, vector_weight=1.0, text_weight=1.0, where=None,
+                  nprobes=None, refine_factor=None, full_text=False):
+    """Búsqueda híbrida: BM25 (índice full-text) + vectores, fusionados con RRF.
+
+    Ambas búsquedas se lanzan en paralelo sobre la tabla de chunks, se
+    agregan por documento y se combinan con reciprocal-rank fusion:
+    score = vector_weight / (k + rango_vector) + text_weight / (k + rango_bm25).
+    Retorna {"results": [...], "weights": {...}, "timings_ms": {...}}.
+    full_text: como en search_documents.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    
+    timings = {}
+    started = time.perf_counter()
+    try:
+        table = open_table()
+        chunks = open_chunks_table()
+        ensure_fts_index(chunks)
         
-        # Buscar por similitud
-        results = table.search(query_vector).limit(limit).to_pandas()
+        chunk_filter = _chunk_prefilter(table, where)
+        timings["prepare"] = _elapsed_ms(started)
+        weights = {"vector": vector_weight, "text": text_weight, "rrf_k": RRF_K}
+        if chunk_filter is NO_MATCHES:
+            return {"results": [], "weights": weights, "timings_ms": timings}
+        if chunk_filter is WIDE_FILTER:
+            # Con filtros amplios el prefiltro se hace con la lista de ids
+            # igualmente: BM25 solo existe sobre los chunks
+            chunk_filter = where_ids(scan(table, ["id"], where=where).column("id").to_pylist())
         
-        # Formatear resultados
-        output = []
-        for _, row in results.iterrows():
-            metadata = json.loads(row['metadata']) if row['metadata'] else {}
-            output.append({
-                "id": row['id'],
-                "text": row['text'][:500],  # Primeros 500 chars
-                "distance": float(row['_distance']),
-                "metadata": metadata
-            })
+        fetch = limit * SEARCH_OVERFETCH
         
-        return output
+        def vector_stage():
+            t0 = time.perf_counter()
+            query_vector = search_cache.query_vector(query)
+            timings["encode"] = _elapsed_ms(t0)
+            t1 = time.perf_counter()
+            hits = _document_hits(chunks, query_vector, limit, chunk_filter, nprobes, refine_factor)
+            timings["vector"] = _elapsed_ms(t1)
+            return aggregate_hits(hits, fetch)
+        
+        def text_stage():
+            t0 = time.perf_counter()
+            search = chunks.search(query, query_type="fts")
+            if chunk_filter:
+                search = search.where(chunk_filter, prefilter=True)
+            hits = search.select(["doc_id", "text", "start", "end"]).limit(fetch).to_list()
+            timings["bm25"] = _elapsed_ms(t0)
+            # Mejor chunk por documento, en orden de score BM25
+            best = {}
+            for hit in hits:
+                best.setdefault(hit["doc_id"], hit)
+            return list(best.values())
+        
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            vector_future = pool.submit(vector_stage)
+            text_future = pool.submit(text_stage)
+            vector_docs, text_docs = vector_future.result(), text_future.result()
+        
+        # Reciprocal-rank fusion
+        t0 = time.perf_counter()
+        fused = {}
+        for rank, doc in enumerate(vector_docs, 1):
+            entry = fused.setdefault(doc["id"], {"id": doc["id"], "rrf_score": 0.0})
+            entry["rrf_score"] += vector_weight / (RRF_K + rank)
+            entry.update(vector_rank=rank, distance=doc["distance"], text=doc["passage"],
+                         passage_start=doc["passage_start"], passage_end=doc["passage_end"])
+        for rank, hit in enumerate(text_docs, 1):
+            entry = fused.setdefault(hit["doc_id"], {"id": hit["doc_id"], "rrf_score": 0.0})
+            entry["rrf_score"] += text_weight / (RRF_K + rank)
+            entry.update(text_rank=rank, bm25_score=float(hit["_score"]))
+            if "text" not in entry:
+                # Solo lo encontró BM25: su pasaje es el del término exacto
+                entry.update(text=hit["text"], passage_start=int(hit["start"]),
+                             passage_end=int(hit["end"]))
+        ranked = sorted(fused.values(), key=lambda d: d["rrf_score"], reverse=True)[:limit]
+        timings["fusion"] = _elapsed_ms(t0)
+        
+        metadata_by_id = _metadata_for(table, [d["id"] for d in ranked])
+        results = [dict(d, metadata=metadata_by_id[d["id"]]) for d in ranked if d["id"] in metadata_by_id]
+        if full_text:
+            t0 = time.perf_counter()
+            results = attach_full_text(table, results)
+            timings["full_text"] = _elapsed_ms(t0)
+        timings["total"] = _elapsed_ms(started)
+        
+        return {"results": results, "weights": weights, "timings_ms": timings}
     
+    except Exception as e:
+        return {"results": [], "error": str(e), "timings_ms": timings}
+
+
+def similar_documents(doc_id, limit=5, where=None, nprobes=None, refine_factor=None, full_text=False):
+    """Documentos más parecidos a uno ya guardado ("more like this").
+
+    Usa el vector guardado del documento: no se carga el modelo ni se
+    recodifica nada. Sin filtro, si el grafo kNN está construido (ver
+    knn_graph.py) y cubre el límite, los vecinos salen precalculados con una
+    lectura por clave; si no, es una búsqueda por vector de documento que
+    excluye al propio documento.
+    """
+    try:
+        table = open_table()
+        found = None if where else related(doc_id, limit)
+        if found is not None and len(found) >= limit:
+            with stage("knn_graph"):
+                output = _graph_results(table, found)
+        else:
+            rows = scan(table, ["vector"], where=f"id = {sql_quote(doc_id)}")
+            if rows.num_rows == 0:
+                return [{"error": "Document not found"}]
+            query_vector = rows.column("vector")[rows.num_rows - 1].as_py()
+            exclude = f"id != {sql_quote(doc_id)}"
+            output = _search_whole_documents(table, query_vector, limit, nprobes, refine_factor,
+                                             f"{exclude} AND ({where})" if where else exclude)
+        return attach_full_text(table, output) if full_text else output
+
     except Exception as e:
         return [{"error": str(e)}]
 
 
+def _graph_results(table, found):
+    """Vecinos del grafo con el formato de _search_whole_documents"""
+    import pyarrow.compute as pc
+
+    rows = scan(table, ["id", "text", "metadata"],
+                where="id IN (" + ", ".join(sql_quote(i) for i, _ in found) + ")")
+    texts = pc.utf8_slice_codeunits(rows.column("text"), 0, 500).to_pylist()
+    docs = {doc_id: (text, metadata) for doc_id, text, metadata in zip(rows.column("id").to_pylist(), texts,
+                                                                      rows.column("metadata").to_pylist())}
+    # Un vecino ya borrado (grafo desactualizado) no se devuelve
+    return [{
+        "id": other,
+        "text": docs[other][0] or "",
+        "distance": float(distance),
+        "metadata": json.loads(docs[other][1]) if docs[other][1] else {}
+    } for other, distance in found if other in docs]
+
+
+def attach_full_text(table, results):
+    """Agrega "full_text" a cada resultado leyendo solo esos ids del almacén de textos"""
+    ids = [r["id"] for r in results if "id" in r]
+
+    def inline(missing):
+        # Documentos anteriores a text_store: el texto completo sigue en la tabla
+        rows = scan(table, ["id", "text"], where="id IN (" + ", ".join(sql_quote(i) for i in missing) + ")")
+        return dict(zip(rows.column("id").to_pylist(), rows.column("text").to_pylist()))
+
+    texts = hydrate(ids, inline)
+    return [dict(r, full_text=texts[r["id"]]) if "id" in r else r for r in results]
+
+
+def _elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 2)
+
+
+def where_ids(ids):
+    """Filtro SQL de chunks para una lista de ids de documento"""
+    return "doc_id IN (" + ", ".join(sql_quote(i) for i in set(ids)) + ")"
+
+
+def _chunk_prefilter(table, where):
+    """Traduce un filtro sobre documentos a un prefiltro sobre chunks.
+
+    Retorna None (sin filtro), NO_MATCHES, WIDE_FILTER (demasiados ids) o
+    la expresión "doc_id IN (...)".
+    """
+    if not where:
+        return None
+    matching = scan(table, ["id"], where=where).column("id").to_pylist()
+    if not matching:
+        return NO_MATCHES
+    if len(matching) > PREFILTER_MAX_IDS:
+        return WIDE_FILTER
+    return where_ids(matching)
+
+
+def _vector_hits(chunks, query_vector, limit, chunk_filter=None, nprobes=None, refine_factor=None):
+    """Chunks más cercanos al vector de la consulta"""
+    search = ann_options(chunks.search(query_vector), nprobes, refine_factor)
+    if chunk_filter:
+        search = search.where(chunk_filter, prefilter=True)
+    with stage("vector_search"):
+        return (search
+                .select(["doc_id", "text", "start", "end", "_distance"])
+                .limit(limit)
+                .to_list())
+
+
+def _document_hits(chunks, query_vector, limit, chunk_filter=None, nprobes=None, refine_factor=None):
+    """Chunks más cercanos que cubran al menos `limit` documentos distintos.
+
+    Se piden limit * SEARCH_OVERFETCH chunks y, si un documento largo acapara
+    los resultados, se vuelve a pedir SEARCH_OVERFETCH veces más hasta tener
+    `limit` doc_ids o agotar los chunks.
+    """
+    fetch = max(1, limit) * SEARCH_OVERFETCH
+    while True:
+        hits = _vector_hits(chunks, query_vector, fetch, chunk_filter, nprobes, refine_factor)
+        if len(hits) < fetch or len({hit["doc_id"] for hit in hits}) >= limit:
+            return hits
+        fetch *= SEARCH_OVERFETCH
+
+
+def _metadata_for(table, ids):
+    """Metadata (ya parseada) solo de los documentos indicados"""
+    if not ids:
+        return {}
+    rows = scan(table, ["id", "metadata"], where="id IN (" + ", ".join(sql_quote(i) for i in ids) + ")")
+    return {r["id"]: json.loads(r["metadata"]) if r["metadata"] else {} for r in rows.to_pylist()}
+
+
+def ann_options(query, nprobes=None, refine_factor=None):
+    """Aplica los parámetros del índice ANN (se ignoran si la tabla no tiene índice)"""
+    if nprobes:
+        query = query.nprobes(int(nprobes))
+    if refine_factor:
+        query = query.refine_factor(int(refine_factor))
+    return query
+
+
+def _search_whole_documents(table, query_vector, limit, nprobes=None, refine_factor=None, where=None):
+    """Búsqueda por vector de documento completo (tablas sin chunks o filtros amplios)"""
+    search = ann_options(table.search(query_vector), nprobes, refine_factor)
+    if where:
+        search = search.where(where, prefilter=True)
+    import pyarrow.compute as pc
+    results = search.select(["id", "text", "metadata", "_distance"]).limit(limit).to_arrow()
+    
+    # Por columnas desde Arrow (sin pandas ni iterrows); el texto se recorta
+    # a los primeros 500 chars antes de pasarlo a Python
+    texts = pc.utf8_slice_codeunits(results.column("text"), 0, 500).to_pylist()
+    output = []
+    for doc_id, text, metadata, distance in zip(results.column("id").to_pylist(), texts,
+                                                results.column("metadata").to_pylist(),
+                                                results.column("_distance").to_pylist()):
+        output.append({
+            "id": doc_id,
+            "text": text or "",
+            "distance": float(distance),
+            "metadata": json.loads(metadata) if metadata else {}
+        })
+    
+    return output
+
+
+
+# Columnas posibles de un resultado, en el orden de salida Arrow: unas son de
+# la búsqueda por chunks, otras solo de la híbrida y full_text es opcional
+RESULT_FIELDS = (
+    ("id", "string"), ("text", "string"), ("distance", "float64"), ("score", "float64"),
+    ("rrf_score", "float64"), ("vector_rank", "int64"), ("text_rank", "int64"),
+    ("bm25_score", "float64"), ("passage_start", "int64"), ("passage_end", "int64"),
+    ("metadata", "string"), ("full_text", "string")
+)
+ARROW_BATCH_ROWS = 256
+
+
+def result_schema(rows):
+    """Schema explícito con las columnas que aparecen en cualquiera de las filas.
+
+    No se infiere de la primera fila: en la híbrida un documento que solo
+    encontró BM25 no trae distance y uno que solo encontró el vector no trae
+    text_rank. Una clave desconocida toma el tipo inferido de todas las filas.
+    """
+    import pyarrow as pa
+    keys = dict.fromkeys(key for row in rows for key in row) or dict.fromkeys(("id", "text", "distance", "metadata"))
+    known = dict(RESULT_FIELDS)
+    fields = [pa.field(name, pa.type_for_alias(kind)) for name, kind in RESULT_FIELDS if name in keys]
+    fields += [pa.field(key, pa.array([row.get(key) for row in rows]).type) for key in keys if key not in known]
+    return pa.schema(fields)
+
+
+def iter_result_batches(rows, schema, batch_rows=ARROW_BATCH_ROWS):
+    """Record batches de los resultados (metadata como JSON, igual que en la tabla)"""
+    import pyarrow as pa
+    for first in range(0, len(rows), batch_rows):
+        batch = [dict(r, metadata=json.dumps(r.get("metadata", {}), ensure_ascii=False))
+                 for r in rows[first:first + batch_rows]]
+        yield pa.RecordBatch.from_pylist(batch, schema=schema)
+
+
+def write_rows(rows, fmt):
+    """Escribe resultados como NDJSON o Arrow IPC, un batch a la vez"""
+    if fmt == "ndjson":
+        for row in rows:
+            sys.stdout.write(json.dumps(row, ensure_ascii=False) + "\n")
+        sys.stdout.flush()
+        return
+    schema = result_schema(rows)
+    write_arrow_stream(iter_result_batches(rows, schema), schema)
+
+
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print(json.dumps([{"error": "Usage: lancedb_search.py <query> [limit]"}]))
+    mark_imports()
+    usage = ("Usage: lancedb_search.py <query> [limit] [max|sum] [--where SQL] [--nprobes N] [--refine-factor N] "
+             "[--hybrid [--vector-weight W] [--text-weight W]] [--similar] [--full-text] "
+             "[--format json|ndjson|arrow]")
+    
+    try:
+        fmt = output_format(sys.argv)
+    except ValueError as e:
+        print(json.dumps([{"error": str(e)}]))
         sys.exit(1)
     
-    query = sys.argv[1]
-    limit = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    # Opciones del índice ANN, filtro y modo híbrido
+    nprobes = cli_option(sys.argv, "--nprobes", None)
+    refine_factor = cli_option(sys.argv, "--refine-factor", None)
+    where = cli_option(sys.argv, "--where", None, str)
+    full_text = "--full-text" in sys.argv
+    value_options = ("--nprobes", "--refine-factor", "--where", "--vector-weight", "--text-weight", "--format")
+    args = [a for i, a in enumerate(sys.argv)
+            if not a.startswith("--") and (i == 0 or sys.argv[i - 1] not in value_options)]
+    
+    # Solo flags (p.ej. "--hybrid" sin consulta) o un límite que no es un número
+    if len(args) < 2 or (len(args) > 2 and not args[2].isdigit()):
+        print(json.dumps([{"error": usage}]))
+        sys.exit(1)
+    
+    query = args[1]
+    limit = int(args[2]) if len(args) > 2 else 5
+    mode = args[3] if len(args) > 3 else "max"
+    
+    if "--similar" in sys.argv:
+        # El primer argumento es el id del documento, no una consulta
+        options = {"where": where, "nprobes": nprobes, "refine_factor": refine_factor, "full_text": full_text}
+        results = lancedb_client.try_call("similar", lambda e: [{"error": e}], doc_id=query, limit=limit,
+                                          **options)
+        if results is None:
+            results = similar_documents(query, limit, **options)
+    elif "--hybrid" in sys.argv:
+        options = {
+            "vector_weight": cli_option(sys.argv, "--vector-weight", 1.0, float),
+            "text_weight": cli_option(sys.argv, "--text-weight", 1.0, float),
+            "where": where, "nprobes": nprobes, "refine_factor": refine_factor, "full_text": full_text
+        }
+        results = lancedb_client.try_call("search_hybrid", lambda e: {"results": [], "error": e},
+                                          query=query, limit=limit, **options)
+        if results is None:
+            results = search_hybrid(query, limit, **options)
+    else:
+        results = lancedb_client.try_call("search", lambda e: [{"error": e}], query=query, limit=limit,
+                                          mode=mode, nprobes=nprobes, refine_factor=refine_factor,
+                                          where=where, full_text=full_text)
+        if results is None:
+            results = search_documents(query, limit, mode, nprobes, refine_factor, where, full_text)
     
-    results = search_documents(query, limit)
+    if fmt != "json":
+        # Solo las filas de resultados (en híbrida se pierden pesos y tiempos)
+        rows = results.get("results", []) if isinstance(results, dict) else results
+        error = results.get("error") if isinstance(results, dict) else (rows[0].get("error") if rows else None)
+        if error:
+            print(json.dumps({"error": error}))
+            sys.exit(1 if fmt == "arrow" else 0)
+        write_rows(rows, fmt)
+        finish()
+        sys.exit(0)
     
     # Imprimir SOLO el JSON, nada más
-    print(json.dumps(results, ensure_ascii=False))
\ No newline at end of file
+    print(dumps(results, ensure_ascii=False))
@@ -1,48 +1,111 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-import sys
-import io
-
-if sys.platform == 'win32':
-    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
-    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
-
 import json
-import os
-import warnings
+from collections import Counter
 
-warnings.filterwarnings('ignore')
-os.environ['TRANSFORMERS_VERBOSITY'] = 'error'
+from lancedb_common import (setup_stdio, silence_warnings, open_table, scan, index_coverage,
+                            embedding_metadata, DB_PATH, TABLE_NAME)
+from embedding_cache import get_cache
+import search_cache
+from text_store import get_store
+from knn_graph import graph_stats
+import lancedb_client
+from profiling import dumps, mark_imports
 
-import lancedb
+setup_stdio()
+silence_warnings()
 
-DB_PATH = "./data/lancedb"
-TABLE_NAME = "documents"
 
 def get_stats():
-    """Obtiene estadísticas de la base de datos"""
+    """Obtiene estadísticas de la base de datos.
+
+    Solo usa metadata de Lance (filas, fragmentos, bytes, versión, índices) y
+    lecturas de columnas sueltas (id, category, extension): nunca carga los
+    textos ni los vectores.
+    """
     try:
-        db = lancedb.connect(DB_PATH)
-        table = db.open_table(TABLE_NAME)
+        import pyarrow.compute as pc
+        
+        table = open_table()
         
-        # Contar documentos
-        df = table.to_pandas()
-        total_docs = len(df)
+        # Contar documentos (metadata del manifest, sin leer datos)
+        lance_stats = table.stats()
+        total_docs = lance_stats["num_rows"]
         
-        # IDs únicos
-        unique_ids = df['id'].nunique()
+        # IDs únicos y duplicados: solo la columna id
+        ids = scan(table, ["id"]).column("id")
+        unique_ids = len(pc.unique(ids))
+        
+        # Documentos por categoría y extensión
+        categories, extensions = _metadata_counts(table)
+        
+        # Caché de embeddings (hits/misses acumulados entre procesos)
+        cache = get_cache()
         
         return {
             "total_documents": total_docs,
             "unique_documents": unique_ids,
+            "duplicate_documents": total_docs - unique_ids,
+            "categories": categories,
+            "extensions": extensions,
+            "fragments": lance_stats["fragment_stats"]["num_fragments"],
+            "small_fragments": lance_stats["fragment_stats"]["num_small_fragments"],
+            "size_bytes": lance_stats["total_bytes"],
+            "version": table.version,
+            "indexes": [index_coverage(table, idx) for idx in table.list_indices()],
             "table_name": TABLE_NAME,
-            "db_path": DB_PATH
+            "db_path": DB_PATH,
+            "embedding_cache": cache.stats() if cache else None,
+            # Textos completos comprimidos (la tabla solo guarda snippets)
+            "text_store": get_store().stats(),
+            # Backend configurado y con qué se generaron los vectores de la tabla
+            "embeddings": {**embedding_metadata(), "table": _vector_metadata(table)},
+            # Grafo de documentos relacionados (None si no se construyó)
+            "knn_graph": graph_stats(),
+            # Cachés en memoria de este proceso (con worker, las del worker)
+            "search_cache": search_cache.stats()
         }
     
     except Exception as e:
         return {"error": str(e)}
 
 
+def _vector_metadata(table):
+    """Metadata de la columna vector (vacía en tablas sin migrar)"""
+    field = table.schema.field("vector")
+    return {k.decode(): v.decode() for k, v in (field.metadata or {}).items()}
+
+
+def _value_counts(column):
+    """Conteo de valores de una columna Arrow como dict (null -> "")"""
+    import pyarrow.compute as pc
+    counts = pc.value_counts(column.fill_null(""))
+    return {str(c["values"]): int(c["counts"]) for c in counts.to_pylist()}
+
+
+def _metadata_counts(table):
+    """Conteos por categoría y extensión.
+
+    Con columnas tipadas (ver lancedb_migrate.py) se leen solo esas dos
+    columnas; en tablas sin migrar se parsea la columna metadata.
+    """
+    names = table.schema.names
+    if "category" in names and "extension" in names:
+        columns = scan(table, ["category", "extension"])
+        return _value_counts(columns.column("category")), _value_counts(columns.column("extension"))
+    
+    categories, extensions = Counter(), Counter()
+    for metadata_json in scan(table, ["metadata"]).column("metadata").to_pylist():
+        metadata = json.loads(metadata_json) if metadata_json else {}
+        filename = metadata.get("filename") or ""
+        categories[metadata.get("category") or ""] += 1
+        extensions["." + filename.rsplit(".", 1)[1].lower() if "." in filename else ""] += 1
+    return dict(categories), dict(extensions)
+
+
 if __name__ == "__main__":
-    stats = get_stats()
-    print(json.dumps(stats))
\ No newline at end of file
+    mark_imports()
+    stats = lancedb_client.try_call("stats", lambda e: {"error": e})
+    if stats is None:
+        stats = get_stats()
+    print(dumps(stats))
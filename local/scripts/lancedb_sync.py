@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Sincronización incremental de una carpeta con LanceDB.
+#
+# Guarda un manifest ruta -> (size, mtime, sha256, doc_id) y en cada pasada
+# recorre la carpeta una vez: los archivos con el mismo tamaño y mtime no se
+# leen; del resto se calcula el hash para distinguir archivos nuevos,
+# modificados, movidos (mismo contenido en otra ruta: solo se actualiza la
+# metadata) y tocados sin cambios. Solo se extraen y codifican los nuevos y
+# los modificados; los borrados se eliminan de la tabla.
+#
+# Uso: python lancedb_sync.py <carpeta> [--manifest archivo.json] [--dry-run]
+
+import sys
+import os
+import json
+import time
+import hashlib
+from pathlib import Path
+
+from lancedb_common import setup_stdio, silence_warnings, cli_option
+
+setup_stdio()
+silence_warnings()
+
+from lancedb_add import add_documents, _file_entry, SUPPORTED_EXTENSIONS
+from lancedb_delete import delete_documents
+from lancedb_update_metadata import update_metadata_bulk
+from profiling import dumps, mark_imports
+
+MANIFEST_DIR = os.environ.get("SYNC_MANIFEST_DIR", "./data/sync")
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def default_manifest(root):
+    """Un manifest por carpeta sincronizada"""
+    digest = hashlib.sha1(str(Path(root).resolve()).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(MANIFEST_DIR, f"{digest}.json")
+
+
+def load_manifest(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f).get("files", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(path, root, files):
+    """Escribe el manifest de forma atómica"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({"root": str(Path(root).resolve()), "files": files}, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def file_hash(path):
+    """sha256 del contenido, leído por bloques"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def walk(root):
+    """Genera (ruta relativa, ruta absoluta, stat) de los archivos soportados"""
+    stack = [root]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file() and os.path.splitext(entry.name)[1].lower() in SUPPORTED_EXTENSIONS:
+                    yield Path(entry.path).relative_to(root).as_posix(), entry.path, entry.stat()
+
+
+def plan(root, files):
+    """Compara la carpeta con el manifest y clasifica los cambios"""
+    seen = set()
+    candidates = []
+    delta = {"new": [], "changed": [], "moved": [], "touched": [], "unchanged": 0}
+
+    for rel, full, st in walk(root):
+        seen.add(rel)
+        known = files.get(rel)
+        if known and known["size"] == st.st_size and known["mtime"] == st.st_mtime_ns:
+            delta["unchanged"] += 1
+            continue
+        candidates.append((rel, full, st, known))
+
+    deleted = {rel: entry for rel, entry in files.items() if rel not in seen}
+    deleted_by_hash = {}
+    for rel, entry in deleted.items():
+        deleted_by_hash.setdefault(entry["hash"], []).append(rel)
+
+    for rel, full, st, known in candidates:
+        record = {"size": st.st_size, "mtime": st.st_mtime_ns, "hash": file_hash(full)}
+        if known and known["hash"] == record["hash"]:
+            delta["touched"].append((rel, dict(known, **record)))
+        elif not known and deleted_by_hash.get(record["hash"]):
+            # Mismo contenido en otra ruta: se conserva el documento
+            old = deleted_by_hash[record["hash"]].pop()
+            delta["moved"].append((old, rel, dict(deleted.pop(old), **record)))
+        elif known:
+            delta["changed"].append((rel, full, dict(known, **record)))
+        else:
+            delta["new"].append((rel, full, record))
+
+    delta["deleted"] = list(deleted.items())
+    return delta
+
+
+def sync(root, manifest_path=None, dry_run=False):
+    """Sincroniza la carpeta con LanceDB aplicando solo el delta"""
+    started = time.perf_counter()
+    root = str(root)
+    if not os.path.isdir(root):
+        return {"success": False, "error": f"Folder not found: {root}"}
+    manifest_path = manifest_path or default_manifest(root)
+
+    try:
+        files = load_manifest(manifest_path)
+        delta = plan(root, files)
+        summary = {
+            "new": [rel for rel, _, _ in delta["new"]],
+            "changed": [rel for rel, _, _ in delta["changed"]],
+            "moved": [{"from": old, "to": new} for old, new, _ in delta["moved"]],
+            "deleted": [rel for rel, _ in delta["deleted"]],
+            "touched": len(delta["touched"]),
+            "unchanged": delta["unchanged"]
+        }
+        if dry_run:
+            return {"success": True, "dry_run": True, **summary}
+
+        # Borrados: un solo delete por tabla
+        removed = [entry["doc_id"] for _, entry in delta["deleted"] if entry.get("doc_id")]
+        result = delete_documents(removed)
+        if not result["success"]:
+            return {"success": False, "error": result["error"], **summary}
+        for rel, _ in delta["deleted"]:
+            files.pop(rel, None)
+
+        # Movidos: solo cambia la metadata de ruta
+        patches = [{"id": entry["doc_id"], "metadata": {"filename": Path(new).name, "path": new}}
+                   for _, new, entry in delta["moved"] if entry.get("doc_id")]
+        missing = set()
+        if patches:
+            result = update_metadata_bulk(patches)
+            if not result["success"]:
+                return {"success": False, "error": result["error"], **summary}
+            missing = {doc_id for doc_id, r in result["results"].items() if not r["success"]}
+        reindex = []
+        for old, new, entry in delta["moved"]:
+            files.pop(old, None)
+            if entry.get("doc_id") in missing:
+                # El documento ya no está en la tabla: se indexa como nuevo
+                record = {k: entry[k] for k in ("size", "mtime", "hash")}
+                reindex.append((new, os.path.join(root, new), record))
+                continue
+            files[new] = entry
+        for rel, entry in delta["touched"]:
+            files[rel] = entry
+
+        # Nuevos y modificados: extraer en paralelo y codificar solo esos
+        failed = _index_delta(root, files, delta["new"] + delta["changed"] + reindex)
+
+        save_manifest(manifest_path, root, files)
+        summary["failed"] = failed
+        summary["elapsed_s"] = round(time.perf_counter() - started, 3)
+        return {"success": True, "manifest": manifest_path, **summary}
+
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+
+def sync_doc_id(root, rel):
+    """Id de documento estable para un archivo de la carpeta.
+
+    Como el de handleUpload pero con un hash de carpeta y ruta en vez del
+    timestamp: si una pasada falla a mitad de add_documents, la siguiente
+    reescribe los mismos ids (upsert) en vez de duplicar documentos.
+    """
+    digest = hashlib.sha1(f"{Path(root).resolve().as_posix()}/{rel}".encode("utf-8")).hexdigest()[:12]
+    return f"doc_{rel.replace('.', '_').replace('/', '_')}_{digest}"
+
+
+def _index_delta(root, files, pending):
+    """Extrae y agrega los archivos nuevos o modificados; retorna los fallidos.
+
+    El manifest solo se actualiza cuando add_documents terminó bien.
+    """
+    if not pending:
+        return []
+    from process_document import process_documents
+
+    by_path = {str(Path(full).absolute()): (rel, record) for rel, full, record in pending}
+    entries, failed, updates = [], [], {}
+    for result in process_documents(list(by_path)):
+        rel, record = by_path[result["filepath"]]
+        entry = _file_entry(Path(result["filepath"]), rel, result)
+        if "error" in entry:
+            # Se guarda en el manifest para no reintentarlo hasta que cambie
+            failed.append({"path": rel, "error": entry["error"]})
+            updates[rel] = dict(record, doc_id=record.get("doc_id"), error=entry["error"])
+            continue
+        # Un archivo modificado conserva su id de documento (add_documents hace upsert)
+        entry["id"] = record.get("doc_id") or sync_doc_id(root, rel)
+        entry["metadata"]["path"] = rel
+        entries.append(entry)
+        updates[rel] = dict(record, doc_id=entry["id"])
+        updates[rel].pop("error", None)
+
+    result = add_documents(entries)
+    if not result["success"]:
+        raise RuntimeError(result["error"])
+    files.update(updates)
+    return failed
+
+
+if __name__ == "__main__":
+    mark_imports()
+    args = [a for i, a in enumerate(sys.argv[1:], 1)
+            if not a.startswith("--") and sys.argv[i - 1] != "--manifest"]
+    if not args:
+        print(json.dumps({"success": False, "error": "Usage: lancedb_sync.py <folder> [--manifest file.json] [--dry-run]"}))
+        sys.exit(1)
+
+    result = sync(args[0], cli_option(sys.argv, "--manifest", None, str), "--dry-run" in sys.argv)
+    print(dumps(result, ensure_ascii=False))
@@ -1,58 +1,48 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 import sys
-import io
+import json
 
-if sys.platform == 'win32':
-    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
-    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+from lancedb_common import (setup_stdio, silence_warnings, open_table, scan, sql_quote, ensure_scalar_index,
+                            metadata_table)
+import lancedb_client
+from profiling import stage, dumps, mark_imports
 
-import json
-import os
-import warnings
+setup_stdio()
+silence_warnings()
 
-warnings.filterwarnings('ignore')
-os.environ['TRANSFORMERS_VERBOSITY'] = 'error'
 
-import lancedb
+def write_metadata(table, ids, metadatas):
+    """Reescribe metadata (JSON y columnas tipadas) de varios ids en un commit.
+
+    merge-insert sobre id con solo esas columnas: filtra por el índice
+    escalar y no relee textos ni vectores, y el documento nunca desaparece
+    de las búsquedas. Retorna el número de filas actualizadas.
+    """
+    import pyarrow as pa
+    
+    columns = {
+        "id": pa.array(ids, type=pa.string()),
+        "metadata": pa.array([json.dumps(m) for m in metadatas], type=pa.string())
+    }
+    typed = metadata_table(metadatas, table.schema)
+    for name in typed.column_names:
+        columns[name] = typed.column(name)
+    
+    with stage("merge_insert"):
+        result = table.merge_insert("id").when_matched_update_all().execute(pa.table(columns))
+    return getattr(result, "num_updated_rows", len(ids))
 
-DB_PATH = "./data/lancedb"
-TABLE_NAME = "documents"
 
 def update_metadata(doc_id, metadata_dict):
     """Actualiza la metadata de un documento"""
     try:
-        db = lancedb.connect(DB_PATH)
-        table = db.open_table(TABLE_NAME)
-        
-        # Obtener documento actual
-        df = table.to_pandas()
-        doc_row = df[df['id'] == doc_id]
-        
-        if len(doc_row) == 0:
-            return {"success": False, "error": f"Document {doc_id} not found"}
+        table = open_table()
+        ensure_scalar_index(table, "id")
         
         # Actualizar metadata
-        metadata_json = json.dumps(metadata_dict)
-        
-        # LanceDB no tiene UPDATE directo, hay que:
-        # 1. Eliminar el documento viejo
-        # 2. Insertar con nueva metadata
-        
-        # Guardar datos del documento
-        old_text = doc_row.iloc[0]['text']
-        old_vector = doc_row.iloc[0]['vector']
-        
-        # Eliminar viejo
-        table.delete(f"id = '{doc_id}'")
-        
-        # Insertar con nueva metadata
-        table.add([{
-            "id": doc_id,
-            "text": old_text,
-            "vector": old_vector,
-            "metadata": metadata_json
-        }])
+        if write_metadata(table, [doc_id], [metadata_dict]) == 0:
+            return {"success": False, "error": f"Document {doc_id} not found"}
         
         return {"success": True, "id": doc_id}
     
@@ -60,9 +50,117 @@ def update_metadata(doc_id, metadata_dict):
         return {"success": False, "error": str(e)}
 
 
+def update_metadata_group(requests):
+    """update_metadata de varias peticiones en un solo merge-insert (group commit del worker).
+
+    Como update_metadata, cada petición reemplaza la metadata completa; con
+    el mismo id repetido gana la última.
+    """
+    latest = {request["doc_id"]: request["metadata"] for request in requests}
+    table = open_table()
+    ensure_scalar_index(table, "id")
+    where = "id IN (" + ", ".join(sql_quote(i) for i in latest) + ")"
+    found = set(scan(table, ["id"], where=where).column("id").to_pylist())
+    ids = [doc_id for doc_id in latest if doc_id in found]
+    if ids:
+        write_metadata(table, ids, [latest[doc_id] for doc_id in ids])
+    return [{"success": True, "id": r["doc_id"]} if r["doc_id"] in found
+            else {"success": False, "error": f"Document {r['doc_id']} not found"}
+            for r in requests]
+
+
+def merge_patch(metadata, patch):
+    """Aplica un patch parcial: las claves con valor null se eliminan"""
+    merged = dict(metadata)
+    for key, value in patch.items():
+        if value is None:
+            merged.pop(key, None)
+        else:
+            merged[key] = value
+    return merged
+
+
+def update_metadata_bulk(updates):
+    """Aplica muchos patches de metadata en una sola transacción merge-insert.
+
+    updates: lista de {"id": ..., "metadata": {patch}}. Cada patch se mezcla
+    con la metadata actual (no la reemplaza). Retorna el resultado por id.
+    """
+    results = {}
+    patches = {}
+    for index, update in enumerate(updates):
+        doc_id = update.get("id") if isinstance(update, dict) else None
+        patch = update.get("metadata") if isinstance(update, dict) else None
+        if not doc_id or not isinstance(patch, dict):
+            # Entradas inválidas se reportan por posición
+            results[f"#{index}"] = {"success": False, "error": "Entry needs id and metadata object"}
+            continue
+        # Varios patches al mismo id se aplican en orden
+        patches.setdefault(doc_id, []).append(patch)
+
+    if not patches:
+        return {"success": not results, "updated": 0, "results": results}
+
+    try:
+        table = open_table()
+        ensure_scalar_index(table, "id")
+
+        # Metadata actual solo de los ids afectados (sin textos ni vectores)
+        current = {}
+        ids = list(patches)
+        for first in range(0, len(ids), 1000):
+            where = "id IN (" + ", ".join(sql_quote(i) for i in ids[first:first + 1000]) + ")"
+            for row in scan(table, ["id", "metadata"], where=where).to_pylist():
+                current[row["id"]] = json.loads(row["metadata"]) if row["metadata"] else {}
+
+        merged_ids, merged = [], []
+        for doc_id, doc_patches in patches.items():
+            if doc_id not in current:
+                results[doc_id] = {"success": False, "error": f"Document {doc_id} not found"}
+                continue
+            metadata = current[doc_id]
+            for patch in doc_patches:
+                metadata = merge_patch(metadata, patch)
+            merged_ids.append(doc_id)
+            merged.append(metadata)
+
+        if merged_ids:
+            # Un solo commit para todos los documentos
+            write_metadata(table, merged_ids, merged)
+            for doc_id in merged_ids:
+                results[doc_id] = {"success": True}
+
+        return {"success": True, "updated": len(merged_ids), "results": results}
+
+    except Exception as e:
+        return {"success": False, "error": str(e), "results": results}
+
+
 if __name__ == "__main__":
+    mark_imports()
+    if len(sys.argv) >= 3 and sys.argv[1] == "--bulk":
+        # lancedb_update_metadata.py --bulk <updates.json|->
+        # updates.json: [{"id": "...", "metadata": {...patch...}}, ...]
+        try:
+            if sys.argv[2] == "-":
+                updates = json.load(sys.stdin)
+            else:
+                with open(sys.argv[2], 'r', encoding='utf-8') as f:
+                    updates = json.load(f)
+            if not isinstance(updates, list):
+                raise ValueError("expected a JSON list")
+        except (OSError, ValueError) as e:
+            print(json.dumps({"success": False, "error": f"Invalid updates: {e}"}))
+            sys.exit(1)
+
+        result = lancedb_client.try_call("update_metadata_bulk", updates=updates)
+        if result is None:
+            result = update_metadata_bulk(updates)
+        print(dumps(result, ensure_ascii=False))
+        sys.exit(0)
+    
     if len(sys.argv) < 3:
-        print(json.dumps({"success": False, "error": "Usage: lancedb_update_metadata.py <doc_id> <metadata_json>"}))
+        print(json.dumps({"success": False, "error": "Usage: lancedb_update_metadata.py <doc_id> <metadata_json> | --bulk <updates.json|->"}))
         sys.exit(1)
     
     doc_id = sys.argv[1]
@@ -74,5 +172,7 @@ if __name__ == "__main__":
         print(json.dumps({"success": False, "error": "Invalid JSON metadata"}))
         sys.exit(1)
     
-    result = update_metadata(doc_id, metadata_dict)
-    print(json.dumps(result))
\ No newline at end of file
+    result = lancedb_client.try_call("update_metadata", doc_id=doc_id, metadata=metadata_dict)
+    if result is None:
+        result = update_metadata(doc_id, metadata_dict)
+    print(dumps(result))
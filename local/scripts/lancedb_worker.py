@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Worker residente de LanceDB.
+#
+# Mantiene cargados el modelo de embeddings y la conexión a LanceDB y atiende
+# las operaciones de los scripts lancedb_*.py con un protocolo JSON-lines:
+#
+#   -> {"id": 1, "op": "search", "args": {"query": "factura", "limit": 5}}
+#   <- {"id": 1, "result": [...]}
+#
+# Uso:
+#   python lancedb_worker.py --stdio              (stdin/stdout, un proceso hijo;
+#                                                 {"op": "shutdown"} lo detiene)
+#   python lancedb_worker.py --port 8765          (socket en 127.0.0.1)
+#
+# Con el worker en modo socket, exportar LANCEDB_WORKER_ADDR=127.0.0.1:8765
+# hace que los scripts CLI le deleguen el trabajo en vez de cargar el modelo.
+# add, delete y update_metadata de todos los clientes se confirman en grupo
+# (un commit por tabla cada pocos ms, ver write_queue.py).
+
+import sys
+import inspect
+import json
+import socketserver
+import threading
+
+from lancedb_common import setup_stdio, silence_warnings, get_model, get_db
+import profiling
+
+setup_stdio()
+silence_warnings()
+
+from lancedb_add import add_document, add_bulk, add_document_group
+from lancedb_search import search_documents, search_hybrid, similar_documents
+from lancedb_list import list_documents
+from lancedb_delete import delete_document, delete_document_group
+from lancedb_update_metadata import update_metadata, update_metadata_bulk, update_metadata_group
+from lancedb_stats import get_stats
+from lancedb_maintenance import optimize
+from write_queue import WriteQueue
+
+DEFAULT_HOST = "127.0.0.1"
+
+# Operación -> (función, argumentos permitidos)
+OPERATIONS = {
+    "add": (add_document, ("doc_id", "text", "metadata", "dedup")),
+    "add_bulk": (add_bulk, ("source", "batch_size", "write_batch_size", "dedup")),
+    "search": (search_documents, ("query", "limit", "mode", "nprobes", "refine_factor", "where",
+                                  "full_text")),
+    "search_hybrid": (search_hybrid, ("query", "limit", "vector_weight", "text_weight", "where",
+                                      "nprobes", "refine_factor", "full_text")),
+    "similar": (similar_documents, ("doc_id", "limit", "where", "nprobes", "refine_factor", "full_text")),
+    "list": (list_documents, ("offset", "limit", "fields", "snippet_length", "where")),
+    "delete": (delete_document, ("doc_id",)),
+    "update_metadata": (lambda doc_id, metadata: update_metadata(doc_id, metadata),
+                        ("doc_id", "metadata")),
+    "update_metadata_bulk": (update_metadata_bulk, ("updates",)),
+    "stats": (lambda: dict(get_stats(), write_queue=writes.stats()), ()),
+    "optimize": (optimize, ("rebuild", "index_type", "min_rows", "keep_days")),
+    "ping": (lambda: {"success": True}, ()),
+}
+
+# LanceDB y el modelo se comparten entre conexiones: una operación a la vez
+_lock = threading.Lock()
+
+# Mutaciones pequeñas de muchos clientes: pasan por la cola de escritura y se
+# confirman en grupo (ver write_queue). Las demás operaciones toman _lock.
+writes = WriteQueue({
+    "add": (OPERATIONS["add"][0], add_document_group),
+    "delete": (OPERATIONS["delete"][0], delete_document_group),
+    "update_metadata": (OPERATIONS["update_metadata"][0], update_metadata_group),
+}, _lock)
+
+
+def handle_request(request):
+    """Ejecuta una petición del protocolo y retorna la respuesta"""
+    if not isinstance(request, dict):
+        return {"id": None, "error": "Invalid request: expected a JSON object"}
+
+    req_id = request.get("id")
+    op = request.get("op")
+    args = request.get("args") or {}
+
+    if op not in OPERATIONS:
+        return {"id": req_id, "error": f"Unknown operation: {op}"}
+    func, allowed = OPERATIONS[op]
+    if not isinstance(args, dict) or set(args) - set(allowed):
+        return {"id": req_id, "error": f"Invalid arguments for {op}, allowed: {list(allowed)}"}
+
+    if op in writes.handlers:
+        # Sin _lock: el escritor lo toma al confirmar el grupo
+        try:
+            inspect.signature(func).bind(**args)
+        except TypeError as e:
+            return {"id": req_id, "error": f"Invalid arguments for {op}: {e}"}
+        try:
+            return {"id": req_id, "result": writes.submit(op, args)}
+        except Exception as e:
+            return {"id": req_id, "error": str(e)}
+
+    with _lock:
+        profiling.reset()
+        try:
+            result = func(**args)
+        except TypeError as e:
+            # Faltan argumentos obligatorios
+            return {"id": req_id, "error": f"Invalid arguments for {op}: {e}"}
+        response = {"id": req_id, "result": result}
+        if profiling.PROFILE_ENABLED:
+            # Etapas de esta petición; el cliente las agrega a su bloque timings
+            response["timings"] = profiling.report()
+    return response
+
+
+def decode_line(line):
+    """Decodifica una línea del protocolo (None si no es JSON válido)"""
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+
+def respond(request):
+    """Construye la respuesta para una petición ya decodificada"""
+    if request is None:
+        return {"id": None, "error": "Invalid JSON"}
+    return handle_request(request)
+
+
+def encode_response(response):
+    """Serializa una respuesta como línea JSON"""
+    return json.dumps(response, ensure_ascii=False) + "\n"
+
+
+def warm_up():
+    """Carga el modelo y la conexión antes de aceptar peticiones"""
+    get_model().encode("warm up")
+    get_db()
+
+
+def serve_stdio():
+    """Atiende peticiones línea a línea por stdin/stdout"""
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        request = decode_line(line)
+        if isinstance(request, dict) and request.get("op") == "shutdown":
+            break
+        sys.stdout.write(encode_response(respond(request)))
+        sys.stdout.flush()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for raw in self.rfile:
+            if not raw.strip():
+                continue
+            request = decode_line(raw.decode('utf-8'))
+            self.wfile.write(encode_response(respond(request)).encode('utf-8'))
+            self.wfile.flush()
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+def serve_socket(port, host=DEFAULT_HOST):
+    """Atiende peticiones JSON-lines en un socket TCP local"""
+    with _Server((host, port), _Handler) as server:
+        print(json.dumps({"ready": True, "addr": f"{host}:{port}"}), file=sys.stderr, flush=True)
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+
+    if args[:1] in (["--stdio"], ["--port"]):
+        try:
+            warm_up()
+        except Exception as e:
+            # Configuración inválida (p.ej. EMBEDDING_DIM) o modelo que no carga
+            print(json.dumps({"error": str(e)}), flush=True)
+            sys.exit(1)
+
+    if args[:1] == ["--stdio"]:
+        serve_stdio()
+    elif args[:1] == ["--port"] and len(args) > 1:
+        try:
+            serve_socket(int(args[1]))
+        except KeyboardInterrupt:
+            pass
+    else:
+        print(json.dumps({"error": "Usage: lancedb_worker.py --stdio | --port <port>"}))
+        sys.exit(1)
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Detección de documentos casi idénticos antes de calcular embeddings.
+#
+# Cada documento se resume en una firma MinHash de NUM_PERM valores sobre
+# shingles de SHINGLE_WORDS palabras. La firma se parte en LSH_BANDS bandas y
+# el hash de cada banda se guarda en la columna "bands" de la tabla de firmas
+# (SIGNATURES_TABLE_NAME) con un índice LABEL_LIST: los candidatos son los
+# documentos que comparten al menos una banda, y la similitud de Jaccard se
+# estima comparando las firmas completas.
+#
+# Modos (INGEST_DEDUP o el argumento dedup de lancedb_add):
+#   off  - no se calcula nada (por defecto)
+#   flag - se agrega igual y se marca metadata["near_duplicate_of"]
+#   skip - no se agrega (ni se codifica) el documento
+# Solo se detectan duplicados de documentos agregados con el modo flag o skip.
+
+import hashlib
+import os
+import re
+import zlib
+
+from lancedb_common import SIGNATURES_TABLE_NAME, open_table, sql_quote, ensure_scalar_index
+from embedding_cache import normalize_text
+
+DEDUP_MODES = ("off", "flag", "skip")
+DEDUP_MODE = os.environ.get("INGEST_DEDUP", "off")
+DEDUP_THRESHOLD = float(os.environ.get("INGEST_DEDUP_THRESHOLD", "0.9"))
+
+NUM_PERM = 128
+LSH_BANDS = 32  # 4 valores por banda: candidato desde Jaccard ~0.4
+SHINGLE_WORDS = 5
+SHINGLE_BLOCK = 8192
+
+_MERSENNE = (1 << 61) - 1
+_permutations = None
+
+
+def signatures_schema():
+    """Schema Arrow de la tabla de firmas"""
+    import pyarrow as pa
+    return pa.schema([
+        pa.field("id", pa.string()),
+        pa.field("signature", pa.list_(pa.uint32(), NUM_PERM)),
+        pa.field("bands", pa.list_(pa.int64()))
+    ])
+
+
+def open_signatures_table(create=False):
+    """Abre (o crea) la tabla de firmas"""
+    return open_table(create=create, name=SIGNATURES_TABLE_NAME, schema=signatures_schema())
+
+
+def _perms():
+    """Coeficientes (a, b) fijos de las NUM_PERM funciones hash"""
+    global _permutations
+    if _permutations is None:
+        import numpy as np
+        rng = np.random.RandomState(1)
+        _permutations = (rng.randint(1, 1 << 31, NUM_PERM).astype(np.uint64),
+                         rng.randint(0, 1 << 31, NUM_PERM).astype(np.uint64))
+    return _permutations
+
+
+def shingles(text):
+    """Hashes crc32 de los n-gramas de palabras del texto normalizado"""
+    import numpy as np
+
+    words = re.findall(r"\w+", normalize_text(text).lower())
+    size = min(SHINGLE_WORDS, len(words)) or 1
+    grams = {" ".join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+def minhash(text):
+    """Firma MinHash (uint32[NUM_PERM]) de un texto"""
+    import numpy as np
+
+    a, b = _perms()
+    values = shingles(text)
+    signature = np.full(NUM_PERM, np.iinfo(np.uint32).max, dtype=np.uint64)
+    # Por bloques: la matriz shingles x permutaciones no crece con el documento
+    for first in range(0, len(values), SHINGLE_BLOCK):
+        block = values[first:first + SHINGLE_BLOCK, None]
+        hashed = ((block * a + b) % _MERSENNE) & np.uint64(0xFFFFFFFF)
+        signature = np.minimum(signature, hashed.min(axis=0))
+    return signature.astype(np.uint32)
+
+
+def lsh_bands(signature):
+    """Hash int64 de cada banda de la firma (incluye el número de banda)"""
+    rows = NUM_PERM // LSH_BANDS
+    keys = []
+    for band in range(LSH_BANDS):
+        data = band.to_bytes(2, "little") + signature[band * rows:(band + 1) * rows].tobytes()
+        keys.append(int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little", signed=True))
+    return keys
+
+
+def similarity(a, b):
+    """Jaccard estimada: fracción de valores iguales entre dos firmas"""
+    return float((a == b).mean())
+
+
+class DuplicateDetector:
+    """Busca casi-duplicados en la tabla y dentro del lote en curso.
+
+    check() no escribe nada; las firmas de los documentos aceptados se
+    acumulan con add() y se guardan con un solo merge-insert en flush().
+    """
+
+    def __init__(self, threshold=DEDUP_THRESHOLD):
+        self.threshold = threshold
+        self.pending = {}
+        self.table = None
+        try:
+            self.table = open_signatures_table()
+        except Exception:
+            pass  # todavía no hay firmas guardadas
+
+    def check(self, doc_id, text):
+        """Retorna (firma, bandas, {"id", "similarity"} del duplicado o None)"""
+        import numpy as np
+
+        signature = minhash(text)
+        bands = lsh_bands(signature)
+        best = None
+
+        candidates = [(other_id, sig) for other_id, (sig, other_bands) in self.pending.items()
+                      if other_id != doc_id and not set(bands).isdisjoint(other_bands)]
+        if self.table is not None:
+            where = f"array_has_any(bands, [{', '.join(map(str, bands))}]) AND id != {sql_quote(doc_id)}"
+            rows = self.table.search().where(where).select(["id", "signature"]).limit(None).to_list()
+            candidates.extend((r["id"], np.asarray(r["signature"], dtype=np.uint32)) for r in rows)
+
+        for other_id, other in candidates:
+            score = similarity(signature, other)
+            if score >= self.threshold and (best is None or score > best["similarity"]):
+                best = {"id": other_id, "similarity": round(score, 4)}
+        return signature, bands, best
+
+    def add(self, doc_id, signature, bands):
+        self.pending[doc_id] = (signature, bands)
+
+    def flush(self):
+        """Guarda (upsert por id) las firmas acumuladas"""
+        import pyarrow as pa
+
+        if not self.pending:
+            return
+        data = pa.table({
+            "id": list(self.pending),
+            "signature": [sig.tolist() for sig, _ in self.pending.values()],
+            "bands": [bands for _, bands in self.pending.values()]
+        }, schema=signatures_schema())
+        if self.table is None:
+            self.table = open_signatures_table(create=True)
+        (self.table.merge_insert("id")
+         .when_matched_update_all()
+         .when_not_matched_insert_all()
+         .execute(data))
+        ensure_scalar_index(self.table, "id")
+        ensure_scalar_index(self.table, "bands", "LABEL_LIST")
+        self.pending.clear()
+
+
+def delete_signatures(doc_ids):
+    """Elimina las firmas de uno o varios documentos (si existe la tabla)"""
+    try:
+        table = open_signatures_table()
+    except Exception:
+        return
+    if isinstance(doc_ids, str):
+        doc_ids = [doc_ids]
+    if doc_ids:
+        table.delete("id IN (" + ", ".join(sql_quote(i) for i in doc_ids) + ")")
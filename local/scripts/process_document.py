@@ -3,63 +3,456 @@
 import sys
 import io
 
+from profiling import stage, dumps, finish, mark_imports
+
 # Forzar UTF-8 en stdout/stderr para Windows
 if sys.platform == 'win32':
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
     sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
 
+import codecs
 import json
 import os
+import signal
+import threading
 import warnings
 from pathlib import Path
 
 # Silenciar warnings
 warnings.filterwarnings('ignore')
 
-# Importar librerías de procesamiento
-try:
-    from PyPDF2 import PdfReader
-    import docx
-    import markdown
-except ImportError as e:
-    print(json.dumps({"error": f"Missing dependency: {e}", "success": False}))
-    sys.exit(1)
+
+def _extractor(module):
+    """Importa la librería de un formato solo cuando llega un archivo de ese tipo.
+
+    Un TXT no paga PyPDF2 ni python-docx; si falta la dependencia el error
+    sale en el resultado de ese archivo. Siempre pasa por import_module: en
+    --batch otro hilo puede tener el módulo en sys.modules a medio importar, y
+    import_module espera a que termine (ya importado, es una consulta).
+    """
+    import contextlib
+    import importlib
+    first = module not in sys.modules
+    try:
+        with stage(f"import_{module.lower()}") if first else contextlib.nullcontext():
+            return importlib.import_module(module)
+    except ImportError as e:
+        raise RuntimeError(f"Missing dependency: {e}")
+
+
+# Extracción de PDF en paralelo: a partir de PDF_PARALLEL_MIN_PAGES páginas se
+# reparten rangos de páginas entre procesos y se reensamblan en orden
+PDF_PARALLEL_MIN_PAGES = 16
+PDF_WORKERS = int(os.environ.get("PDF_WORKERS", "0")) or os.cpu_count() or 1
+# Segundos máximos por página (0 = sin límite); una página patológica queda vacía.
+# Con SIGALRM (POSIX, hilo principal) el límite es por página; si no, el
+# proceso padre da a cada rango de páginas page_timeout por página más
+# PDF_POOL_GRACE_S y un rango que se pasa queda vacío entero
+PDF_PAGE_TIMEOUT = float(os.environ.get("PDF_PAGE_TIMEOUT", "30"))
+PDF_POOL_GRACE_S = 5.0
+# Máximo de páginas a extraer (0 = todas)
+PDF_MAX_PAGES = int(os.environ.get("PDF_MAX_PAGES", "0"))
+
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.docx', '.doc', '.md', '.txt')
+
+# Modo streaming (--stream): el texto sale en registros NDJSON de hasta
+# STREAM_CHUNK_CHARS caracteres; TXT, MD y DOCX se leen por bloques, así la
+# memoria no crece con el tamaño del archivo
+STREAM_CHUNK_CHARS = int(os.environ.get("STREAM_CHUNK_CHARS", str(1 << 20)))
+# Un registro se corta en el último espacio de sus STREAM_MAX_CARRY caracteres finales
+STREAM_MAX_CARRY = 4096
+
+# Detección de encoding: BOM, si no UTF-8 si la muestra es válida, si no cp1252
+ENCODING_SAMPLE_BYTES = 64 * 1024
+FALLBACK_ENCODING = "cp1252"
+# UTF-32 antes que UTF-16: el BOM de UTF-32 LE empieza con el de UTF-16 LE
+_BOMS = ((b"\xff\xfe\x00\x00", "utf-32"), (b"\x00\x00\xfe\xff", "utf-32"),
+         (b"\xef\xbb\xbf", "utf-8-sig"), (b"\xff\xfe", "utf-16"), (b"\xfe\xff", "utf-16"))
+
+# Modo batch: procesos para PDF/DOCX (CPU) e hilos para TXT/MD (lectura)
+HEAVY_EXTENSIONS = ('.pdf', '.docx', '.doc')
+BATCH_WORKERS = int(os.environ.get("PROCESS_WORKERS", "0")) or os.cpu_count() or 1
+BATCH_IO_THREADS = 8
+
+
+class PageTimeout(Exception):
+    pass
 
 
-def extract_text_from_pdf(filepath):
-    """Extrae texto de PDF"""
-    reader = PdfReader(filepath)
-    text = []
-    for page in reader.pages:
-        text.append(page.extract_text())
-    return "\n".join(text)
+def _raise_page_timeout(signum, frame):
+    raise PageTimeout()
+
+
+def _extract_pdf_pages(filepath, first, last, page_timeout=PDF_PAGE_TIMEOUT):
+    """Extrae las páginas [first, last) de un PDF.
+
+    Retorna (textos, páginas que superaron page_timeout). El timeout de cada
+    página usa SIGALRM, así que solo se aplica en el hilo principal de
+    sistemas POSIX; en los demás casos lo cubre el plazo por rango de
+    _run_page_ranges.
+    """
+    reader = _extractor("PyPDF2").PdfReader(filepath)
+    use_alarm = (page_timeout and hasattr(signal, "SIGALRM")
+                 and threading.current_thread() is threading.main_thread())
+    if use_alarm:
+        previous = signal.signal(signal.SIGALRM, _raise_page_timeout)
+
+    texts, timed_out = [], []
+    try:
+        for number in range(first, last):
+            try:
+                if use_alarm:
+                    signal.setitimer(signal.ITIMER_REAL, page_timeout)
+                texts.append(reader.pages[number].extract_text() or "")
+            except PageTimeout:
+                texts.append("")
+                timed_out.append(number + 1)
+            finally:
+                if use_alarm:
+                    signal.setitimer(signal.ITIMER_REAL, 0)
+    finally:
+        if use_alarm:
+            signal.signal(signal.SIGALRM, previous)
+    return texts, timed_out
+
+
+def _page_ranges(pages, shards):
+    """Divide [0, pages) en shards rangos contiguos de tamaño parecido"""
+    size = -(-pages // shards)
+    return [(first, min(first + size, pages)) for first in range(0, pages, size)]
+
+
+def _alarm_available():
+    return hasattr(signal, "SIGALRM") and threading.current_thread() is threading.main_thread()
+
+
+def _run_page_ranges(filepath, ranges, page_timeout):
+    """Extrae cada rango de páginas en su propio proceso, con un plazo por rango.
+
+    El plazo (page_timeout por página del rango más PDF_POOL_GRACE_S) se
+    controla desde este proceso con future.result(timeout=...), así vale
+    también sin SIGALRM (Windows) o desde un hilo. Un rango que se pasa queda
+    vacío entero (sus páginas van a timed_out) y se terminan los procesos.
+    Retorna None si no se pueden usar procesos.
+    """
+    import time
+    from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+    try:
+        pool = ProcessPoolExecutor(max_workers=len(ranges))
+        started = time.monotonic()
+        futures = [pool.submit(_extract_pdf_pages, filepath, first, last, page_timeout)
+                   for first, last in ranges]
+    except (OSError, RuntimeError):
+        return None
+
+    results, hung = [], False
+    try:
+        for (first, last), future in zip(ranges, futures):
+            timeout = None
+            if page_timeout:
+                deadline = started + page_timeout * (last - first) + PDF_POOL_GRACE_S
+                timeout = max(0.0, deadline - time.monotonic())
+            try:
+                results.append(future.result(timeout=timeout))
+            except TimeoutError:
+                hung = True
+                results.append(([""] * (last - first), list(range(first + 1, last + 1))))
+    except (OSError, RuntimeError):
+        results = None  # pool roto (BrokenProcessPool): en serie
+    finally:
+        if hung:
+            # shutdown() no detiene una tarea en curso: terminar sus procesos
+            for process in list((getattr(pool, "_processes", None) or {}).values()):
+                process.terminate()
+        pool.shutdown(wait=not hung, cancel_futures=True)
+    return results
+
+
+def extract_pdf_pages(filepath, max_pages=PDF_MAX_PAGES, page_timeout=PDF_PAGE_TIMEOUT,
+                      workers=PDF_WORKERS):
+    """Extrae el texto de cada página de un PDF.
+
+    Retorna {"pages": [texto por página], "total_pages", "timed_out_pages"}.
+    Los PDF largos se reparten por rangos de páginas entre un pool de
+    procesos; si el pool no se puede usar se extrae en serie. Sin SIGALRM y
+    con page_timeout, un PDF corto se extrae en un proceso aparte para poder
+    cortarlo por plazo.
+    """
+    total = len(_extractor("PyPDF2").PdfReader(filepath).pages)
+    count = min(total, max_pages) if max_pages else total
+
+    shards = min(workers, max(1, count // (PDF_PARALLEL_MIN_PAGES // 2)))
+    results = None
+    if count >= PDF_PARALLEL_MIN_PAGES and shards > 1:
+        results = _run_page_ranges(filepath, _page_ranges(count, shards), page_timeout)
+    elif count and page_timeout and not _alarm_available():
+        results = _run_page_ranges(filepath, [(0, count)], page_timeout)
+    if results is None:
+        results = [_extract_pdf_pages(filepath, 0, count, page_timeout)]
+
+    pages, timed_out = [], []
+    for texts, slow in results:
+        pages.extend(texts)
+        timed_out.extend(slow)
+    return {"pages": pages, "total_pages": total, "timed_out_pages": timed_out}
+
+
+def extract_text_from_pdf(filepath, max_pages=PDF_MAX_PAGES, workers=PDF_WORKERS):
+    """Extrae texto de PDF.
+
+    Retorna (texto, info) donde info tiene el número de páginas y el offset
+    (en caracteres) donde empieza cada página dentro del texto.
+    """
+    extracted = extract_pdf_pages(filepath, max_pages, workers=workers)
+    offsets, position = [], 0
+    for text in extracted["pages"]:
+        offsets.append(position)
+        position += len(text) + 1  # separador "\n"
+    info = {
+        "pages": extracted["total_pages"],
+        "pages_extracted": len(extracted["pages"]),
+        "page_offsets": offsets,
+        "timed_out_pages": extracted["timed_out_pages"]
+    }
+    return "\n".join(extracted["pages"]), info
 
 
 def extract_text_from_docx(filepath):
     """Extrae texto de DOCX"""
-    doc = docx.Document(filepath)
+    doc = _extractor("docx").Document(filepath)
     return "\n".join([para.text for para in doc.paragraphs])
 
 
+def detect_encoding(filepath, sample_bytes=ENCODING_SAMPLE_BYTES):
+    """Encoding de un archivo de texto a partir de sus primeros bytes.
+
+    BOM si lo tiene; UTF-16 sin BOM si la muestra tiene bytes nulos; UTF-8
+    si la muestra es UTF-8 válido; si no, cp1252 (exportaciones de Windows).
+    Los bytes inválidos que aparezcan más adelante se reemplazan por U+FFFD.
+    """
+    with open(filepath, "rb") as f:
+        sample = f.read(sample_bytes)
+    for bom, encoding in _BOMS:
+        if sample.startswith(bom):
+            return encoding
+    if b"\x00" in sample:
+        # ASCII en UTF-16: el byte nulo va detrás (LE) o delante (BE)
+        return "utf-16-le" if sample[1::2].count(0) >= sample[0::2].count(0) else "utf-16-be"
+    try:
+        # Una muestra truncada puede cortar un carácter multibyte al final
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=len(sample) < sample_bytes)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return FALLBACK_ENCODING
+
+
+def _open_text(filepath, encoding=None):
+    return open(filepath, 'r', encoding=encoding or detect_encoding(filepath), errors='replace')
+
+
+def _markdown_to_text(md_content, converter=None):
+    """Convierte markdown a texto plano (quita formato y tags HTML)"""
+    import re
+    if converter is None:
+        html = _extractor("markdown").markdown(md_content)
+    else:
+        html = converter.reset().convert(md_content)
+    return re.sub('<[^<]+?>', '', html)
+
+
 def extract_text_from_md(filepath):
     """Extrae texto de Markdown"""
-    with open(filepath, 'r', encoding='utf-8') as f:
+    with _open_text(filepath) as f:
         md_content = f.read()
-    # Convertir markdown a texto plano (quita formato)
-    html = markdown.markdown(md_content)
-    # Quitar tags HTML básico
-    import re
-    text = re.sub('<[^<]+?>', '', html)
-    return text
+    return _markdown_to_text(md_content)
 
 
 def extract_text_from_txt(filepath):
     """Extrae texto de TXT"""
-    with open(filepath, 'r', encoding='utf-8') as f:
+    with _open_text(filepath) as f:
         return f.read()
 
 
-def process_document(filepath):
+def _last_space(text, max_carry=STREAM_MAX_CARRY):
+    """Posición tras el último espacio entre los max_carry caracteres finales (o len)"""
+    for position in range(len(text) - 1, max(-1, len(text) - 1 - max_carry), -1):
+        if text[position].isspace():
+            return position + 1
+    return len(text)
+
+
+def _rechunk(pieces, chunk_chars):
+    """Agrupa trozos de texto en bloques de ~chunk_chars cortados en un espacio"""
+    buffer, size = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= chunk_chars:
+            block = "".join(buffer)
+            cut = _last_space(block)
+            yield block[:cut]
+            buffer, size = [block[cut:]], len(block) - cut
+    rest = "".join(buffer)
+    if rest:
+        yield rest
+
+
+def _read_blocks(f, chunk_chars):
+    while True:
+        block = f.read(chunk_chars)
+        if not block:
+            return
+        yield block
+
+
+def _markdown_blocks(filepath, encoding, chunk_chars):
+    """Texto plano de un Markdown, convirtiendo por bloques de párrafos completos.
+
+    Cada bloque se corta en la última línea en blanco que no quede dentro de
+    un bloque de código ``` y se convierte por separado.
+    """
+    converter = _extractor("markdown").Markdown()
+    carry = ""
+    first = True
+    with _open_text(filepath, encoding) as f:
+        for block in _read_blocks(f, chunk_chars):
+            block = carry + block
+            cut = block.rfind("\n\n")
+            cut = cut + 2 if cut >= 0 else block.rfind("\n") + 1 or len(block)
+            if block.count("```", 0, cut) % 2:
+                # Bloque de código abierto: se corta antes de la línea de apertura
+                cut = block.rfind("\n", 0, block.rfind("```", 0, cut)) + 1 or len(block)
+            carry = block[cut:]
+            text = _markdown_to_text(block[:cut], converter)
+            if text:
+                yield text if first else "\n" + text
+                first = False
+        if carry:
+            text = _markdown_to_text(carry, converter)
+            yield text if first else "\n" + text
+
+
+# Texto de los elementos de un run (como python-docx: Run.text)
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_RUN_TEXT = {_W + "tab": "\t", _W + "ptab": "\t", _W + "cr": "\n", _W + "noBreakHyphen": "-"}
+
+
+def _run_text(run):
+    parts = []
+    for element in run:
+        if element.tag == _W + "t":
+            parts.append(element.text or "")
+        elif element.tag == _W + "br":
+            # Saltos de página o columna no son texto
+            parts.append("\n" if element.get(_W + "type", "textWrapping") == "textWrapping" else "")
+        else:
+            parts.append(_RUN_TEXT.get(element.tag, ""))
+    return "".join(parts)
+
+
+def _docx_paragraphs(filepath):
+    """Párrafos del cuerpo de un DOCX leyendo word/document.xml en streaming.
+
+    Mismo texto que python-docx (Document.paragraphs) sin cargar el XML
+    entero: cada elemento del cuerpo se descarta al terminar de leerlo.
+    """
+    import zipfile
+    import xml.etree.ElementTree as ET
+
+    first = True
+    depth = 0
+    body = None
+    with zipfile.ZipFile(filepath) as archive, archive.open("word/document.xml") as xml:
+        for event, element in ET.iterparse(xml, events=("start", "end")):
+            if event == "start":
+                depth += 1
+                if depth == 2 and element.tag == _W + "body":
+                    body = element
+                continue
+            depth -= 1
+            if depth != 2 or body is None:
+                continue
+            # Elemento de primer nivel del cuerpo (párrafo, tabla, sectPr...)
+            if element.tag == _W + "p":
+                runs = []
+                for child in element:
+                    if child.tag == _W + "r":
+                        runs.append(_run_text(child))
+                    elif child.tag == _W + "hyperlink":
+                        runs.extend(_run_text(r) for r in child.findall(_W + "r"))
+                text = "".join(runs)
+                yield text if first else "\n" + text
+                first = False
+            body.remove(element)
+
+
+def stream_document(filepath, chunk_chars=STREAM_CHUNK_CHARS, max_pages=PDF_MAX_PAGES):
+    """Extrae un documento como registros NDJSON de texto y un resumen final.
+
+    Genera {"type": "chunk", "index", "start", "text"} con bloques de hasta
+    ~chunk_chars caracteres (cortados en un espacio; start es el offset en
+    caracteres) y termina con {"type": "summary", ..., "success"}. Palabras
+    y caracteres se cuentan por bloque. TXT, MD y DOCX se leen por bloques;
+    los PDF ya se extraen página a página, pero las páginas se juntan antes
+    de emitirlas.
+    """
+    path = Path(filepath)
+    file_ext = path.suffix.lower()
+    summary = {"type": "summary", "filename": path.name, "filepath": str(path.absolute()),
+               "extension": file_ext}
+    if not path.exists():
+        yield {**summary, "error": "File not found", "success": False}
+        return
+
+    chunks = words = chars = replaced = 0
+    try:
+        encoding, info = None, {}
+        if file_ext == '.pdf':
+            extracted = extract_pdf_pages(filepath, max_pages)
+            info = {"pages": extracted["total_pages"], "pages_extracted": len(extracted["pages"]),
+                    "timed_out_pages": extracted["timed_out_pages"]}
+            pieces = (page if i == 0 else "\n" + page for i, page in enumerate(extracted["pages"]))
+        elif file_ext in ['.docx', '.doc']:
+            pieces = _docx_paragraphs(filepath)
+        elif file_ext == '.md':
+            encoding = detect_encoding(filepath)
+            pieces = _markdown_blocks(filepath, encoding, chunk_chars)
+        elif file_ext == '.txt':
+            encoding = detect_encoding(filepath)
+            f = _open_text(filepath, encoding)
+            pieces = _read_blocks(f, chunk_chars)
+        else:
+            yield {**summary, "error": f"Unsupported file type: {file_ext}", "success": False}
+            return
+
+        ends_in_word = False
+        try:
+            for text in _rechunk(pieces, chunk_chars):
+                block_words = len(text.split())
+                # Una palabra partida entre dos bloques cuenta una sola vez
+                if ends_in_word and not text[0].isspace():
+                    block_words -= 1
+                ends_in_word = not text[-1].isspace()
+                yield {"type": "chunk", "index": chunks, "start": chars, "text": text}
+                chunks += 1
+                words += block_words
+                chars += len(text)
+                if encoding:
+                    replaced += text.count("\ufffd")
+        finally:
+            if file_ext == '.txt':
+                f.close()
+
+        yield {**summary, "encoding": encoding, "word_count": words, "char_count": chars,
+               "chunks": chunks, "replaced_chars": replaced, **info, "success": True}
+
+    except Exception as e:
+        yield {**summary, "error": str(e), "chunks": chunks, "success": False}
+
+
+def process_document(filepath, max_pages=PDF_MAX_PAGES, pdf_workers=PDF_WORKERS):
     """Procesa un documento y retorna JSON con metadata"""
     path = Path(filepath)
     
@@ -68,9 +461,10 @@ def process_document(filepath):
     
     file_ext = path.suffix.lower()
     
+    pdf_info = {}
     try:
         if file_ext == '.pdf':
-            text = extract_text_from_pdf(filepath)
+            text, pdf_info = extract_text_from_pdf(filepath, max_pages, pdf_workers)
         elif file_ext in ['.docx', '.doc']:
             text = extract_text_from_docx(filepath)
         elif file_ext == '.md':
@@ -91,6 +485,7 @@ def process_document(filepath):
             "text": text,
             "word_count": word_count,
             "char_count": char_count,
+            **pdf_info,  # PDF: pages, pages_extracted, page_offsets, timed_out_pages
             "success": True
         }
     
@@ -98,11 +493,109 @@ def process_document(filepath):
         return {"error": str(e), "success": False}
 
 
+def expand_paths(patterns):
+    """Archivos soportados a partir de rutas, directorios o globs (sin repetir)"""
+    import glob
+
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            found = sorted(str(p) for p in Path(pattern).rglob('*')
+                           if p.is_file() and p.suffix.lower() in SUPPORTED_EXTENSIONS)
+        elif glob.has_magic(pattern):
+            found = sorted(p for p in glob.glob(pattern, recursive=True)
+                           if os.path.isfile(p) and Path(p).suffix.lower() in SUPPORTED_EXTENSIONS)
+        else:
+            found = [pattern]  # los errores (no existe, tipo no soportado) salen en el resultado
+        paths.extend(found)
+    return list(dict.fromkeys(paths))
+
+
+def _process_in_worker(filepath, max_pages):
+    # Dentro del pool cada PDF se extrae en serie: el paralelismo ya es por archivo
+    result = process_document(filepath, max_pages, pdf_workers=1)
+    result.setdefault("filepath", str(Path(filepath).absolute()))
+    return result
+
+
+def process_documents(paths, workers=BATCH_WORKERS, max_pages=PDF_MAX_PAGES):
+    """Procesa muchos archivos en paralelo y genera cada resultado al terminar.
+
+    PDF y DOCX (CPU) van a un pool de procesos de hasta `workers` procesos,
+    los más grandes primero; TXT y MD (casi solo lectura) a un pool de hilos.
+    Los resultados salen en orden de finalización, no de entrada.
+    """
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+    def size(p):
+        try:
+            return os.path.getsize(p)
+        except OSError:
+            return 0
+
+    heavy = sorted((p for p in paths if Path(p).suffix.lower() in HEAVY_EXTENSIONS), key=size, reverse=True)
+    light = [p for p in paths if Path(p).suffix.lower() not in HEAVY_EXTENSIONS]
+
+    with ThreadPoolExecutor(max_workers=max(1, min(BATCH_IO_THREADS, len(light)))) as threads:
+        futures = {threads.submit(_process_in_worker, p, max_pages): p for p in light}
+        pool = None
+        if heavy:
+            # Con un solo archivo pesado no compensa arrancar procesos
+            processes = min(workers, len(heavy))
+            pool = ProcessPoolExecutor(max_workers=processes) if processes > 1 else threads
+            futures.update({pool.submit(_process_in_worker, p, max_pages): p for p in heavy})
+        try:
+            for future in as_completed(futures):
+                try:
+                    yield future.result()
+                except Exception as e:
+                    yield {"filepath": str(Path(futures[future]).absolute()), "error": str(e),
+                           "success": False}
+        finally:
+            if pool is not None and pool is not threads:
+                pool.shutdown(cancel_futures=True)
+
+
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print(json.dumps({"error": "Usage: process_document.py <filepath>", "success": False}))
+    mark_imports()
+    value_options = ("--max-pages", "--workers", "--chunk-chars")
+    args = [a for i, a in enumerate(sys.argv[1:], 1)
+            if not a.startswith("--") and sys.argv[i - 1] not in value_options]
+    if not args:
+        print(json.dumps({"error": "Usage: process_document.py <filepath> [--max-pages N] | "
+                                   "<filepath> --stream [--chunk-chars N] | "
+                                   "--batch <path|dir|glob>... [--workers N] [--max-pages N]",
+                          "success": False}))
         sys.exit(1)
     
-    filepath = sys.argv[1]
-    result = process_document(filepath)
-    print(json.dumps(result, ensure_ascii=False))
\ No newline at end of file
+    max_pages = PDF_MAX_PAGES
+    if "--max-pages" in sys.argv:
+        max_pages = int(sys.argv[sys.argv.index("--max-pages") + 1])
+    
+    if "--batch" in sys.argv:
+        # Un JSON por línea a medida que termina cada archivo
+        workers = BATCH_WORKERS
+        if "--workers" in sys.argv:
+            workers = int(sys.argv[sys.argv.index("--workers") + 1])
+        for result in process_documents(expand_paths(args), workers, max_pages):
+            sys.stdout.write(json.dumps(result, ensure_ascii=False) + "\n")
+            sys.stdout.flush()
+        finish()
+        sys.exit(0)
+    
+    if "--stream" in sys.argv:
+        # Registros de texto en NDJSON y un resumen al final
+        chunk_chars = STREAM_CHUNK_CHARS
+        if "--chunk-chars" in sys.argv:
+            chunk_chars = int(sys.argv[sys.argv.index("--chunk-chars") + 1])
+        with stage("extract"):
+            for record in stream_document(args[0], max(1, chunk_chars), max_pages):
+                sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+        sys.stdout.flush()
+        finish()
+        sys.exit(0)
+    
+    filepath = args[0]
+    with stage("extract"):
+        result = process_document(filepath, max_pages)
+    print(dumps(result, ensure_ascii=False))
\ No newline at end of file
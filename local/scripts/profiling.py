@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Perfilado opcional de los scripts locales.
+#
+# Se activa con LOCAL_PROFILE=1 o con el flag --profile en cualquier script.
+# Cada etapa instrumentada (imports, carga del modelo, conexión, encode,
+# scans, escritura, serialización...) acumula milisegundos, llamadas y la
+# variación de memoria residente, y el JSON de salida lleva un bloque
+# "timings". Las salidas que son listas (search, list) no pueden llevar claves
+# extra sin romper al backend Go: su bloque se escribe en stderr.
+#
+# Con LOCAL_PROFILE_DIR además se guarda un volcado de cProfile por ejecución
+# (ver con: python -m pstats <archivo>.prof).
+#
+# Solo usa la biblioteca estándar: importarlo no cuesta nada.
+
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+PROFILE_ENABLED = os.environ.get("LOCAL_PROFILE", "0") not in ("", "0") or "--profile" in sys.argv
+PROFILE_DIR = os.environ.get("LOCAL_PROFILE_DIR")
+
+# El flag no debe llegar al parseo de argumentos de los scripts
+while "--profile" in sys.argv:
+    sys.argv.remove("--profile")
+
+_started = time.perf_counter()
+_stages = {}
+_profiler = None
+
+if PROFILE_ENABLED and PROFILE_DIR:
+    import cProfile
+    _profiler = cProfile.Profile()
+    _profiler.enable()
+
+
+def _rss_mb():
+    """Memoria residente actual en MB (pico si no hay /proc)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    except ImportError:
+        return 0.0
+
+
+def _record(name, ms, rss_delta):
+    entry = _stages.setdefault(name, {"ms": 0.0, "calls": 0, "rss_delta_mb": 0.0})
+    entry["ms"] += ms
+    entry["calls"] += 1
+    entry["rss_delta_mb"] += rss_delta
+
+
+@contextmanager
+def stage(name):
+    """Mide una etapa (no hace nada si el perfilado está desactivado)"""
+    if not PROFILE_ENABLED:
+        yield
+        return
+    rss = _rss_mb()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(name, (time.perf_counter() - started) * 1000, _rss_mb() - rss)
+
+
+def mark_imports():
+    """Registra como etapa "imports" el tiempo desde que se importó este módulo"""
+    if PROFILE_ENABLED and "imports" not in _stages:
+        _record("imports", (time.perf_counter() - _started) * 1000, 0.0)
+
+
+def merge(prefix, timings):
+    """Agrega las etapas medidas en otro proceso (p.ej. el worker) con un prefijo"""
+    if PROFILE_ENABLED and timings:
+        for name, s in timings.get("stages", {}).items():
+            _record(f"{prefix}{name}", s["ms"], s.get("rss_delta_mb", 0.0))
+
+
+def reset():
+    """Empieza una medición nueva (el worker mide cada petición por separado)"""
+    global _started
+    _stages.clear()
+    _started = time.perf_counter()
+
+
+def report():
+    """Bloque timings: total, etapas y memoria"""
+    stages = {name: {"ms": round(s["ms"], 2), "calls": s["calls"],
+                     "rss_delta_mb": round(s["rss_delta_mb"], 1)}
+              for name, s in _stages.items()}
+    return {
+        "total_ms": round((time.perf_counter() - _started) * 1000, 2),
+        "stages": stages,
+        "rss_mb": round(_rss_mb(), 1)
+    }
+
+
+def _dump_profile():
+    """Guarda el volcado de cProfile (una sola vez) y retorna su ruta"""
+    global _profiler
+    if _profiler is None:
+        return None
+    _profiler.disable()
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    script = os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0]
+    path = os.path.join(PROFILE_DIR, f"{script}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.prof")
+    _profiler.dump_stats(path)
+    _profiler = None
+    return path
+
+
+def _final_report():
+    timings = report()
+    profile_path = _dump_profile()
+    if profile_path:
+        timings["profile"] = profile_path
+    return timings
+
+
+def finish():
+    """Salidas en streaming (NDJSON): el bloque timings va a stderr al terminar"""
+    if PROFILE_ENABLED:
+        print(json.dumps({"timings": _final_report()}), file=sys.stderr, flush=True)
+
+
+def dumps(result, **kwargs):
+    """json.dumps del resultado, con el bloque timings si el perfilado está activo"""
+    if not PROFILE_ENABLED:
+        return json.dumps(result, **kwargs)
+
+    with stage("serialize"):
+        text = json.dumps(result, **kwargs)
+    if isinstance(result, dict):
+        return json.dumps(dict(result, timings=_final_report()), **kwargs)
+    finish()
+    return text
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Cachés en memoria del camino de búsqueda (útiles sobre todo en el worker).
+#
+# Nivel 1: LRU texto de la consulta -> vector, delante de encode_cached (que
+# consulta SQLite y el memmap en cada llamada).
+# Nivel 2: LRU de resultados con clave (hash del vector, limit, filtro y
+# demás opciones). Guarda la versión de las tablas con la que se calcularon:
+# cuando LanceDB cambia de versión (add, delete, update) se vacía.
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from embedding_cache import normalize_text
+
+QUERY_CACHE_SIZE = int(os.environ.get("SEARCH_QUERY_CACHE_SIZE", "1024"))
+RESULT_CACHE_SIZE = int(os.environ.get("SEARCH_RESULT_CACHE_SIZE", "256"))
+
+
+class LRUCache:
+    """Diccionario LRU acotado con contadores de hits/misses"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else None
+        }
+
+
+class ResultCache(LRUCache):
+    """LRU de resultados válida para una versión concreta de las tablas"""
+
+    def __init__(self, max_entries):
+        super().__init__(max_entries)
+        self.versions = None
+        self.invalidations = 0
+
+    def check_versions(self, versions):
+        """Vacía la caché si las tablas cambiaron desde el último acceso"""
+        if versions != self.versions:
+            if self.versions is not None and self.entries:
+                self.invalidations += 1
+            self.clear()
+            self.versions = versions
+
+    def stats(self):
+        return dict(super().stats(), versions=self.versions, invalidations=self.invalidations)
+
+
+query_vectors = LRUCache(QUERY_CACHE_SIZE)
+results = ResultCache(RESULT_CACHE_SIZE)
+
+
+def query_vector(query):
+    """Vector (lista de floats) de una consulta, pasando por la LRU"""
+    key = normalize_text(query)
+    vector = query_vectors.get(key)
+    if vector is None:
+        from embedding_cache import encode_cached
+        vector = encode_cached([query])[0].tolist()
+        query_vectors.put(key, vector)
+    return vector
+
+
+def result_key(vector, *options):
+    """Clave de resultados: hash del vector más las opciones de la búsqueda"""
+    digest = hashlib.sha1(repr(vector).encode("ascii")).hexdigest()
+    return (digest,) + tuple(options)
+
+
+def stats():
+    """Métricas de ambos niveles"""
+    return {"query_vectors": query_vectors.stats(), "results": results.stats()}
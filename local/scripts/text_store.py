@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Almacén comprimido del texto completo de los documentos.
+#
+# La tabla de documentos guarda solo un snippet (TEXT_SNIPPET_CHARS) y el
+# sha256 del texto; el cuerpo completo vive aquí, un bloque comprimido por
+# documento (zstd si está instalado zstandard, si no zlib) en archivos de
+# segmento de solo-añadir que se leen con mmap. El índice id -> (segmento,
+# offset, longitud, codec) está en SQLite, que también serializa a los
+# escritores de varios procesos. Reemplazar o borrar un documento deja su
+# bloque viejo como basura; compact() reescribe los segmentos cuando la
+# basura supera la mitad.
+#
+# Los documentos agregados antes del almacén siguen con el texto completo en
+# la tabla: hydrate() usa ese texto cuando el id no está aquí.
+
+import hashlib
+import mmap
+import os
+import sqlite3
+import threading
+import zlib
+
+TEXT_STORE_DIR = os.environ.get("TEXT_STORE_DIR", "./data/text_store")
+TEXT_SNIPPET_CHARS = 500
+SEGMENT_MAX_BYTES = 256 * 1024 * 1024
+ZSTD_LEVEL = 3
+COMPACT_GARBAGE_RATIO = 0.5
+
+_store = None
+
+
+def text_hash(text):
+    """sha256 hex del texto (columna text_hash de la tabla)"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def snippet(text):
+    """Lo que queda del texto en la tabla de documentos"""
+    return (text or "")[:TEXT_SNIPPET_CHARS]
+
+
+def _zstd():
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        return None
+
+
+def compress(text):
+    """Retorna (codec, bloque comprimido)"""
+    data = text.encode("utf-8")
+    zstd = _zstd()
+    if zstd is not None:
+        return "zstd", zstd.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return "zlib", zlib.compress(data, 6)
+
+
+def decompress(codec, block):
+    if codec == "zlib":
+        return zlib.decompress(block).decode("utf-8")
+    zstd = _zstd()
+    if zstd is None:
+        raise RuntimeError("Missing dependency: zstandard (needed to read this text store)")
+    return zstd.ZstdDecompressor().decompress(block).decode("utf-8")
+
+
+class TextStore:
+    """Bloques comprimidos direccionados por id de documento"""
+
+    def __init__(self, path=TEXT_STORE_DIR):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self._maps = {}
+        self._maps_lock = threading.Lock()
+        # Una conexión por proceso: los hilos del worker no pueden mezclar transacciones
+        self._db_lock = threading.RLock()
+
+        self.db = sqlite3.connect(os.path.join(path, "index.sqlite"), timeout=30,
+                                  isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS texts ("
+                        "id TEXT PRIMARY KEY, segment INTEGER, offset INTEGER, length INTEGER, "
+                        "codec TEXT, size INTEGER, hash TEXT)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER)")
+        self.db.execute("INSERT OR IGNORE INTO counters VALUES ('garbage_bytes', 0)")
+
+    def _segment_path(self, segment):
+        return os.path.join(self.path, f"texts_{segment:05d}.bin")
+
+    def _last_segment(self):
+        row = self.db.execute("SELECT MAX(segment) FROM texts").fetchone()
+        segments = [int(name[6:11]) for name in os.listdir(self.path)
+                    if name.startswith("texts_") and name.endswith(".bin")]
+        return max([row[0] or 0] + segments) or 1
+
+    def _map(self, segment, end):
+        """mmap de un segmento que cubra hasta el byte end (se rehace si el archivo creció)"""
+        with self._maps_lock:
+            mapped = self._maps.get(segment)
+            if mapped is None or len(mapped) < end:
+                if mapped is not None:
+                    mapped.close()
+                with open(self._segment_path(segment), "rb") as f:
+                    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._maps[segment] = mapped
+            return mapped
+
+    def _close_maps(self):
+        with self._maps_lock:
+            for mapped in self._maps.values():
+                mapped.close()
+            self._maps.clear()
+
+    def _garbage(self, ids):
+        """Suma a la basura los bloques actuales de esos ids"""
+        freed = 0
+        for first in range(0, len(ids), 500):
+            batch = ids[first:first + 500]
+            marks = ",".join("?" * len(batch))
+            freed += self.db.execute(f"SELECT COALESCE(SUM(length), 0) FROM texts WHERE id IN ({marks})",
+                                     batch).fetchone()[0]
+        if freed:
+            self.db.execute("UPDATE counters SET value = value + ? WHERE name = 'garbage_bytes'", (freed,))
+
+    def put_many(self, items):
+        """Guarda (o reemplaza) textos: items es una lista de (id, texto).
+
+        Los bloques se escriben y sincronizan a disco antes de confirmar el
+        índice, así un id del índice siempre apunta a datos completos.
+        """
+        items = list(dict(items).items())
+        if not items:
+            return
+        blocks = [(doc_id, text) + compress(text) for doc_id, text in items]
+
+        with self._db_lock:
+            self._append(blocks)
+
+    def _append(self, blocks):
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            segment = self._last_segment()
+            path = self._segment_path(segment)
+            if os.path.exists(path) and os.path.getsize(path) >= SEGMENT_MAX_BYTES:
+                segment += 1
+                path = self._segment_path(segment)
+            rows = []
+            with open(path, "ab") as f:
+                offset = f.tell()
+                for doc_id, text, codec, block in blocks:
+                    f.write(block)
+                    rows.append((doc_id, segment, offset, len(block), codec, len(text), text_hash(text)))
+                    offset += len(block)
+                f.flush()
+                os.fsync(f.fileno())
+            self._garbage([r[0] for r in rows])
+            self.db.executemany("INSERT OR REPLACE INTO texts VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self.db.execute("COMMIT")
+        except Exception:
+            self.db.execute("ROLLBACK")
+            raise
+
+    def get_many(self, ids):
+        """Retorna {id: texto} de los ids que están en el almacén"""
+        ids = list(dict.fromkeys(ids))
+        rows = []
+        with self._db_lock:
+            for first in range(0, len(ids), 500):
+                batch = ids[first:first + 500]
+                marks = ",".join("?" * len(batch))
+                rows.extend(self.db.execute(
+                    f"SELECT id, segment, offset, length, codec FROM texts WHERE id IN ({marks})", batch))
+
+        texts = {}
+        for doc_id, segment, offset, length, codec in rows:
+            mapped = self._map(segment, offset + length)
+            texts[doc_id] = decompress(codec, mapped[offset:offset + length])
+        return texts
+
+    def delete_many(self, ids):
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            return
+        with self._db_lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                self._garbage(ids)
+                for first in range(0, len(ids), 500):
+                    batch = ids[first:first + 500]
+                    marks = ",".join("?" * len(batch))
+                    self.db.execute(f"DELETE FROM texts WHERE id IN ({marks})", batch)
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+
+    def compact(self, force=False):
+        """Reescribe los bloques vivos en segmentos nuevos si hay mucha basura"""
+        with self._db_lock:
+            return self._compact(force)
+
+    def _compact(self, force):
+        stats = self.stats()
+        if not stats["garbage_bytes"] or (not force and stats["garbage_ratio"] < COMPACT_GARBAGE_RATIO):
+            return {"compacted": False, **stats}
+
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            old = sorted({int(n[6:11]) for n in os.listdir(self.path)
+                          if n.startswith("texts_") and n.endswith(".bin")})
+            segment = (old[-1] if old else 0) + 1
+            f = open(self._segment_path(segment), "wb")
+            moved = []
+            try:
+                rows = self.db.execute("SELECT id, segment, offset, length FROM texts "
+                                       "ORDER BY segment, offset").fetchall()
+                for doc_id, src, offset, length in rows:
+                    if f.tell() >= SEGMENT_MAX_BYTES:
+                        f.flush()
+                        os.fsync(f.fileno())
+                        f.close()
+                        segment += 1
+                        f = open(self._segment_path(segment), "wb")
+                    mapped = self._map(src, offset + length)
+                    moved.append((segment, f.tell(), doc_id))
+                    f.write(mapped[offset:offset + length])
+                f.flush()
+                os.fsync(f.fileno())
+            finally:
+                f.close()
+            self.db.executemany("UPDATE texts SET segment = ?, offset = ? WHERE id = ?", moved)
+            self.db.execute("UPDATE counters SET value = 0 WHERE name = 'garbage_bytes'")
+            self.db.execute("COMMIT")
+        except Exception:
+            self.db.execute("ROLLBACK")
+            raise
+
+        self._close_maps()
+        for number in old:
+            try:
+                os.remove(self._segment_path(number))
+            except OSError:
+                pass  # Windows: otro proceso todavía lo tiene mapeado
+        return {"compacted": True, **self.stats()}
+
+    def stats(self):
+        """Documentos, tamaño original y comprimido, y basura"""
+        with self._db_lock:
+            documents, size, stored = self.db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(length), 0) FROM texts").fetchone()
+            garbage = self.db.execute("SELECT value FROM counters WHERE name = 'garbage_bytes'").fetchone()[0]
+        on_disk = sum(os.path.getsize(os.path.join(self.path, n)) for n in os.listdir(self.path)
+                      if n.startswith("texts_") and n.endswith(".bin"))
+        return {
+            "documents": documents,
+            "text_chars": size,
+            "compressed_bytes": stored,
+            "segments_bytes": on_disk,
+            "garbage_bytes": garbage,
+            "garbage_ratio": round(garbage / on_disk, 4) if on_disk else 0.0,
+            "codec": "zstd" if _zstd() is not None else "zlib"
+        }
+
+
+def get_store():
+    """Retorna el almacén del proceso (se abre una sola vez)"""
+    global _store
+    if _store is None:
+        _store = TextStore()
+    return _store
+
+
+def hydrate(ids, inline=None):
+    """Texto completo de cada id: del almacén o, si no está, el de la tabla.
+
+    inline: {id: texto de la columna text}, o una función que lo retorna para
+    los ids que faltan, para documentos anteriores al almacén (su columna
+    todavía tiene el texto completo).
+    """
+    texts = get_store().get_many(ids) if ids else {}
+    missing = [doc_id for doc_id in ids if doc_id not in texts]
+    if missing and callable(inline):
+        inline = inline(missing)
+    inline = inline or {}
+    return {doc_id: texts[doc_id] if doc_id in texts else (inline.get(doc_id) or "") for doc_id in ids}
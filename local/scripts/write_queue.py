@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Cola de escritura del worker: un único escritor con group commit.
+#
+# Cada cliente (un proceso lancedb_add.py, lancedb_delete.py...) que habla con
+# el worker hacía su propio commit diminuto: bajo una ráfaga de subidas eso
+# produce conflictos, reintentos y miles de fragmentos. Aquí las mutaciones
+# de todas las conexiones entran en una sola cola; un hilo escritor las
+# agrupa hasta WRITE_GROUP_MAX_OPS operaciones o WRITE_GROUP_WAIT_MS
+# milisegundos desde la primera, y ejecuta cada tramo consecutivo de la misma
+# operación con una sola función de grupo (un commit por tabla). El orden
+# entre operaciones se respeta. Cada petición recibe su propio resultado, y
+# solo cuando el commit de su grupo ya terminó.
+#
+# Si la función de grupo falla, las operaciones del tramo se reintentan una a
+# una: un documento problemático no hace fallar al resto del grupo. El grupo
+# pudo haber escrito parte de su trabajo antes de fallar, así que las
+# funciones individuales deben ser idempotentes: add reemplaza los chunks que
+# ya tenga el id (aunque el documento no llegara a la tabla) y el texto, la
+# firma y los vecinos del grafo se sobrescriben por id; delete se puede
+# repetir, y update_metadata reemplaza la metadata completa del documento
+# (no aplica un patch), así que volver a escribirla deja el mismo valor.
+
+import os
+import queue
+import threading
+import time
+
+GROUP_MAX_OPS = int(os.environ.get("WRITE_GROUP_MAX_OPS", "64"))
+GROUP_WAIT_MS = float(os.environ.get("WRITE_GROUP_WAIT_MS", "5"))
+
+
+class _PendingWrite:
+    def __init__(self, op, args):
+        self.op = op
+        self.args = args
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class WriteQueue:
+    """Serializa las mutaciones y las confirma por grupos.
+
+    handlers: {op: (función individual, función de grupo)}. La función de
+    grupo recibe la lista de argumentos de cada petición y retorna un
+    resultado por petición. lock: el que protege LanceDB y el modelo en el
+    worker (las lecturas lo toman entre grupo y grupo).
+    """
+
+    def __init__(self, handlers, lock, max_ops=GROUP_MAX_OPS, wait_ms=GROUP_WAIT_MS):
+        self.handlers = handlers
+        self.lock = lock
+        self.max_ops = max(1, max_ops)
+        self.wait_s = max(0.0, wait_ms) / 1000
+        self.queue = queue.Queue()
+        self.groups = 0
+        self.ops = 0
+        self.max_group = 0
+        self.fallbacks = 0
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, op, args):
+        """Encola una mutación y espera a que su grupo esté confirmado"""
+        self._ensure_thread()
+        pending = _PendingWrite(op, args)
+        self.queue.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _ensure_thread(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="write-queue", daemon=True)
+                self._thread.start()
+
+    def _next_group(self):
+        """Bloquea hasta la primera operación y junta las que lleguen hasta el plazo"""
+        group = [self.queue.get()]
+        deadline = time.monotonic() + self.wait_s
+        while len(group) < self.max_ops:
+            try:
+                remaining = deadline - time.monotonic()
+                group.append(self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return group
+
+    def _run(self):
+        while True:
+            group = self._next_group()
+            try:
+                with self.lock:
+                    # Tramos consecutivos de la misma operación (respeta el orden)
+                    start = 0
+                    while start < len(group):
+                        end = start
+                        while end < len(group) and group[end].op == group[start].op:
+                            end += 1
+                        self._commit(group[start:end])
+                        start = end
+                self.groups += 1
+                self.ops += len(group)
+                self.max_group = max(self.max_group, len(group))
+            finally:
+                for pending in group:
+                    pending.done.set()
+
+    def _commit(self, run):
+        single, grouped = self.handlers[run[0].op]
+        try:
+            if len(run) == 1:
+                run[0].result = single(**run[0].args)
+                return
+            results = grouped([p.args for p in run])
+            for pending, result in zip(run, results):
+                pending.result = result
+            return
+        except Exception as e:
+            if len(run) == 1:
+                run[0].error = e
+                return
+        # El grupo falló: una a una, cada petición con su propio resultado
+        self.fallbacks += 1
+        for pending in run:
+            try:
+                pending.result = single(**pending.args)
+            except Exception as e:
+                pending.error = e
+
+    def stats(self):
+        return {
+            "groups": self.groups,
+            "ops": self.ops,
+            "avg_group": round(self.ops / self.groups, 2) if self.groups else None,
+            "max_group": self.max_group,
+            "fallbacks": self.fallbacks,
+            "queued": self.queue.qsize(),
+            "max_ops": self.max_ops,
+            "wait_ms": self.wait_s * 1000
+        }
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# Fixtures de los tests de los scripts locales.
+#
+# Cada test corre contra una base LanceDB, un almacén de textos y una caché
+# de embeddings en un directorio temporal (bench_ingest.use_db), con el
+# encoder determinista de bench_pipeline en vez de all-MiniLM: sin red ni
+# modelo descargado. Correr desde local/: python -m pytest -q tests
+
+import os
+import sys
+
+import pytest
+
+SCRIPTS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts")
+sys.path.insert(0, SCRIPTS)
+# Sin worker: las funciones se llaman en el proceso del test
+os.environ["LANCEDB_WORKER_ADDR"] = ""
+
+import lancedb_common
+import search_cache
+from bench_ingest import use_db
+from bench_pipeline import HashingModel
+
+
+@pytest.fixture(autouse=True)
+def isolated(tmp_path, monkeypatch):
+    """Directorio de trabajo y datos temporales, y el encoder de hashing"""
+    monkeypatch.chdir(tmp_path)
+    use_db(str(tmp_path / "data"))
+    monkeypatch.setattr(lancedb_common, "_model", HashingModel())
+    search_cache.query_vectors.clear()
+    search_cache.results.clear()
+    search_cache.results.versions = None
+    yield tmp_path
+    lancedb_common._db = None
+
+
+def words(*names, repeat=40):
+    """Texto de prueba: las palabras repetidas (un solo chunk con repeat bajo)"""
+    return " ".join(names * repeat)
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+# Ingesta masiva: add_documents y add_bulk desde manifest o directorio (user-003)
+
+import json
+
+from conftest import words
+from lancedb_add import add_documents, add_bulk, add_document
+from lancedb_common import open_table, scan
+from text_store import hydrate
+
+
+def doc_ids():
+    return sorted(scan(open_table(), ["id"]).column("id").to_pylist())
+
+
+def test_bulk_commits_per_batch_and_reports_progress():
+    entries = [{"id": f"d{i}", "text": words(f"tema{i}", "comun"), "metadata": {"n": i}} for i in range(7)]
+    progress = []
+    result = add_documents(entries, write_batch_size=3, progress=progress.append)
+    assert result["success"] and result["added"] == 7 and result["chunks"] == 7
+    assert [p["added"] for p in progress] == [3, 6, 7]
+    assert doc_ids() == [f"d{i}" for i in range(7)]
+
+
+def test_bulk_matches_single_adds():
+    text = words("contrato", "alquiler", "fianza")
+    add_documents([{"id": "bulk", "text": text}])
+    add_document("single", text)
+    rows = {r["id"]: r["vector"] for r in scan(open_table(), ["id", "vector"]).to_pylist()}
+    assert rows["bulk"] == rows["single"]
+    assert hydrate(["bulk", "single"]) == {"bulk": text, "single": text}
+
+
+def test_bulk_manifest_reports_bad_lines(tmp_path):
+    (tmp_path / "nota.txt").write_text(words("nota", "archivo"), encoding="utf-8")
+    manifest = tmp_path / "manifest.ndjson"
+    manifest.write_text("\n".join([
+        json.dumps({"id": "a", "text": words("uno"), "metadata": {"category": "X"}}),
+        "no es json",
+        json.dumps({"id": "sin_texto"}),
+        json.dumps({"id": "f", "path": str(tmp_path / "nota.txt")}),
+        ""
+    ]), encoding="utf-8")
+
+    result = add_bulk(str(manifest))
+    assert result["success"] and result["added"] == 2
+    assert sorted(f["id"] for f in result["failed"]) == ["line 2", "sin_texto"]
+    assert doc_ids() == ["a", "f"]
+
+
+def test_bulk_last_entry_wins_within_batch():
+    result = add_documents([{"id": "x", "text": words("viejo")}, {"id": "x", "text": words("nuevo")}])
+    assert result["success"]
+    assert doc_ids() == ["x"]
+    assert hydrate(["x"])["x"] == words("nuevo")
+
+
+def test_bulk_source_not_found():
+    assert add_bulk("no_existe")["success"] is False
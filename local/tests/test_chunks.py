@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+# Troceado por tokens y agregación de hits de chunks por documento (user-002)
+
+import pytest
+
+from conftest import words
+from lancedb_add import add_document
+from lancedb_chunks import (chunk_text, aggregate_hits, open_chunks_table, CHUNK_TOKENS, CHUNK_OVERLAP,
+                            SEARCH_OVERFETCH)
+from lancedb_common import scan
+from lancedb_search import search_documents
+
+
+def hit(doc_id, distance, start=0, text="t"):
+    return {"doc_id": doc_id, "_distance": distance, "text": text, "start": start, "end": start + len(text)}
+
+
+def test_chunks_cover_text_with_overlap():
+    text = " ".join(f"w{i}" for i in range(500))
+    chunks = chunk_text(text)
+    assert len(chunks) > 1
+    spans = [(c["start"], c["end"]) for c in chunks]
+    assert spans[0][0] == 0 and spans[-1][1] == len(text)
+    for (_, end), (start, _) in zip(spans, spans[1:]):
+        assert start < end  # ventanas solapadas
+    assert all(len(c["text"].split()) <= CHUNK_TOKENS for c in chunks)
+    assert len(chunks[0]["text"].split()) == CHUNK_TOKENS
+    assert chunks[1]["text"].split()[:CHUNK_OVERLAP] == chunks[0]["text"].split()[-CHUNK_OVERLAP:]
+
+
+def test_aggregate_max_keeps_best_passage():
+    hits = [hit("a", 0.8, 0, "lejos"), hit("a", 0.2, 50, "cerca"), hit("b", 0.4)]
+    ranked = aggregate_hits(hits, 5)
+    assert [d["id"] for d in ranked] == ["a", "b"]
+    assert ranked[0]["passage"] == "cerca"
+    assert ranked[0]["passage_start"] == 50
+    assert ranked[0]["score"] == 1.0 - 0.2 / 2
+
+
+def test_aggregate_sum_rewards_many_chunks():
+    hits = [hit("a", 0.3), hit("b", 0.4), hit("b", 0.4), hit("b", 0.4)]
+    assert [d["id"] for d in aggregate_hits(hits, 5, "max")] == ["a", "b"]
+    assert [d["id"] for d in aggregate_hits(hits, 5, "sum")] == ["b", "a"]
+    assert len(aggregate_hits(hits, 1, "sum")) == 1
+
+
+def test_search_returns_best_passage_of_long_document():
+    filler = " ".join(f"relleno{i}" for i in range(600))
+    text = filler + " " + words("tortilla", "patata", "cebolla", repeat=30)
+    assert add_document("receta", text)["chunks"] > 1
+    add_document("otro", words("banco", "factura", "pago"))
+
+    results = search_documents("tortilla patata cebolla", limit=2)
+    assert results[0]["id"] == "receta"
+    start, end = results[0]["passage_start"], results[0]["passage_end"]
+    assert "tortilla" in text[start:end]
+    assert results[0]["text"] == text[start:end]
+
+    rows = scan(open_chunks_table(), ["doc_id"]).column("doc_id").to_pylist()
+    assert rows.count("otro") == 1
+
+
+def test_long_document_does_not_crowd_out_others():
+    # Cada chunk del documento largo está más cerca de la consulta que los cortos
+    long_text = " ".join(["factura luz agua"] * 3000)
+    assert add_document("long", long_text)["chunks"] > 5 * SEARCH_OVERFETCH
+    for i in range(10):
+        add_document(f"short{i}", words("factura", f"tema{i}", f"otro{i}", f"mas{i}"))
+
+    results = search_documents("factura luz agua", limit=5)
+    assert results[0]["id"] == "long"
+    assert len(results) == 5 and len({r["id"] for r in results}) == 5
+    assert len(search_documents("factura luz agua", limit=5, mode="sum")) == 5
+
+
+def test_unknown_aggregation_mode_is_an_error():
+    add_document("a", words("factura"))
+    assert "error" in search_documents("factura", limit=5, mode="avg")[0]
+    with pytest.raises(ValueError):
+        aggregate_hits([hit("a", 0.1)], 5, "avg")
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+# Errores del worker en los scripts CLI: siempre JSON en stdout (user-001)
+
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+
+import pytest
+
+import lancedb_client
+from conftest import SCRIPTS
+
+
+@pytest.fixture
+def fake_worker():
+    """Worker falso en un puerto libre; reply decide qué hace con cada petición"""
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen()
+    state = {"reply": "error"}
+
+    def serve():
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return
+            with conn, conn.makefile("rb") as f:
+                request = json.loads(f.readline())
+                if state["reply"] == "error":
+                    conn.sendall(json.dumps({"id": request["id"], "error": "disk full"}).encode() + b"\n")
+                elif state["reply"] == "garbage":
+                    conn.sendall(b"no es json\n")
+                elif state["reply"] == "slow":
+                    threading.Event().wait(3)
+                # "close": se cierra sin responder
+
+    threading.Thread(target=serve, daemon=True).start()
+    state["addr"] = "127.0.0.1:%d" % server.getsockname()[1]
+    yield state
+    server.close()
+
+
+def run_script(name, *args, addr):
+    env = dict(os.environ, LANCEDB_WORKER_ADDR=addr, LANCEDB_WORKER_TIMEOUT="1", PYTHONIOENCODING="utf-8")
+    completed = subprocess.run([sys.executable, os.path.join(SCRIPTS, name), *args],
+                               capture_output=True, text=True, timeout=60, env=env)
+    return json.loads(completed.stdout)
+
+
+@pytest.mark.parametrize("reply", ["error", "garbage", "slow", "close"])
+def test_try_call_returns_error_result(fake_worker, monkeypatch, reply):
+    fake_worker["reply"] = reply
+    monkeypatch.setattr(lancedb_client, "REQUEST_TIMEOUT", 0.5)
+    result = lancedb_client.try_call("delete", addr=fake_worker["addr"], doc_id="d0")
+    assert result["success"] is False and result["error"]
+    listed = lancedb_client.try_call("list", lambda e: [{"error": e}], addr=fake_worker["addr"])
+    assert list(listed[0]) == ["error"]
+
+
+def test_try_call_without_worker_returns_none():
+    with socket.socket() as free:
+        free.bind(("127.0.0.1", 0))
+        port = free.getsockname()[1]
+    assert lancedb_client.try_call("ping", addr=f"127.0.0.1:{port}") is None
+
+
+@pytest.mark.parametrize("script, args, shape", [
+    ("lancedb_delete.py", ["d0"], {"success": False, "error": "disk full"}),
+    ("lancedb_add.py", ["d0", "texto"], {"success": False, "error": "disk full"}),
+    ("lancedb_update_metadata.py", ["d0", "{}"], {"success": False, "error": "disk full"}),
+    ("lancedb_search.py", ["hola"], [{"error": "disk full"}]),
+    ("lancedb_search.py", ["hola", "--hybrid"], {"results": [], "error": "disk full"}),
+    ("lancedb_list.py", [], [{"error": "disk full"}]),
+    ("lancedb_stats.py", [], {"error": "disk full"}),
+])
+def test_cli_prints_json_on_worker_error(fake_worker, script, args, shape):
+    assert run_script(script, *args, addr=fake_worker["addr"]) == shape
+
+
+def test_cli_prints_json_on_worker_timeout(fake_worker):
+    fake_worker["reply"] = "slow"
+    result = run_script("lancedb_delete.py", "d0", addr=fake_worker["addr"])
+    assert result["success"] is False and "timed out" in result["error"]
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# Caché de embeddings en disco: expulsión LRU y lecturas consistentes (user-004)
+
+import multiprocessing
+
+import numpy as np
+
+import embedding_cache
+from embedding_cache import EmbeddingCache, encode_cached
+
+DIM = 8
+
+
+def vector(text):
+    """Vector fijo por texto, para detectar lecturas de un slot ajeno"""
+    seed = int.from_bytes(text.encode("utf-8")[-4:].rjust(4, b"\0"), "big")
+    return np.random.default_rng(seed).random(DIM, dtype=np.float32)
+
+
+def test_eviction_reuses_least_recently_used(tmp_path):
+    cache = EmbeddingCache(path=str(tmp_path / "cache"), dim=DIM, max_entries=3)
+    cache.put_many(["a", "b", "c"], [vector(t) for t in "abc"])
+    cache.get_many(["a"])  # "b" pasa a ser el menos usado
+    cache.put_many(["d"], [vector("d")])
+
+    found = dict(zip("abcd", cache.get_many(list("abcd"))))
+    assert found["b"] is None
+    for text in "acd":
+        assert np.array_equal(found[text], vector(text))
+    assert cache.stats()["entries"] == 3
+    assert cache.stats()["size_bytes"] == 3 * DIM * 4
+
+
+def test_key_ignores_whitespace_variations(tmp_path):
+    cache = EmbeddingCache(path=str(tmp_path / "cache"), dim=DIM)
+    cache.put_many(["hola   mundo\n"], [vector("x")])
+    assert np.array_equal(cache.get_many([" hola mundo"])[0], vector("x"))
+
+
+def _hammer(path, seed, queue):
+    cache = EmbeddingCache(path=path, dim=DIM, max_entries=20)
+    rng = np.random.default_rng(seed)
+    wrong = 0
+    for _ in range(150):
+        texts = [f"t{i}" for i in rng.integers(0, 200, 10)]
+        cache.put_many(texts, [vector(t) for t in texts])
+        for text, found in zip(texts, cache.get_many(texts)):
+            if found is not None and not np.array_equal(found, vector(text)):
+                wrong += 1
+    queue.put(wrong)
+
+
+def test_concurrent_eviction_never_returns_another_texts_vector(tmp_path):
+    path = str(tmp_path / "cache")
+    EmbeddingCache(path=path, dim=DIM, max_entries=20)
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    processes = [context.Process(target=_hammer, args=(path, seed, queue)) for seed in range(3)]
+    for process in processes:
+        process.start()
+    wrong = sum(queue.get(timeout=120) for _ in processes)
+    for process in processes:
+        process.join()
+    assert wrong == 0
+
+
+class CountingModel:
+    tokenizer = None
+
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts, **kwargs):
+        self.encoded.extend(texts)
+        return np.stack([np.resize(vector(t), embedding_cache.VECTOR_DIM) for t in texts])
+
+
+def test_encode_cached_only_encodes_misses():
+    model = CountingModel()
+    first = encode_cached(["uno", "dos", "uno"], model=model)
+    assert model.encoded == ["uno", "dos"]
+    second = encode_cached(["dos", "tres"], model=model)
+    assert model.encoded == ["uno", "dos", "tres"]
+    assert np.array_equal(first[1], second[0])
+    assert np.array_equal(first[0], first[2])
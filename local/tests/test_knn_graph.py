@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+# Grafo kNN precalculado y su mantenimiento incremental (user-025)
+
+import random
+
+from knn_graph import build_graph, graph_stats, open_neighbors_table, related
+from lancedb_add import add_document, add_documents
+from lancedb_common import scan
+from lancedb_delete import delete_documents
+from lancedb_search import similar_documents
+
+VOCABULARY = "factura banco cliente pago viaje receta cocina salud medico hotel contrato alquiler".split()
+
+
+def text(seed):
+    rng = random.Random(seed)
+    return " ".join(rng.choice(VOCABULARY) for _ in range(60))
+
+
+def corpus(count=12):
+    add_documents([{"id": f"d{i}", "text": text(i), "metadata": {"category": "AB"[i % 2]}}
+                   for i in range(count)])
+
+
+def graph():
+    rows = scan(open_neighbors_table(), ["id", "neighbors", "distances"]).to_pylist()
+    return {r["id"]: [round(d, 4) for d in r["distances"]] for r in rows}
+
+
+def test_build_graph_needs_two_documents():
+    add_document("solo", text(0))
+    assert build_graph(3)["success"] is False
+    assert graph_stats() is None
+
+
+def test_incremental_updates_match_a_rebuild():
+    corpus()
+    result = build_graph(4)
+    assert result["success"] and (result["documents"], result["k"]) == (12, 4)
+
+    add_document("nuevo", text(100))
+    add_document("d5", text(200))  # reemplazo: nuevo vector
+    delete_documents(["d7", "d9"])
+    incremental = graph()
+    assert not {"d7", "d9"} & set(incremental)
+    assert not any({"d7", "d9"} & {n for n, _ in related(i)} for i in incremental)
+
+    build_graph(4)
+    assert incremental == graph()
+
+
+def test_similar_uses_graph_with_same_results():
+    corpus()
+    by_search = similar_documents("d3", limit=3)
+    build_graph(5)
+    by_graph = similar_documents("d3", limit=3)
+    assert [r["id"] for r in by_graph] == [r["id"] for r in by_search]
+    for graph_row, search_row in zip(by_graph, by_search):
+        assert abs(graph_row["distance"] - search_row["distance"]) < 1e-3
+    assert "d3" not in [r["id"] for r in by_graph]
+
+
+def test_similar_with_filter_and_missing_document():
+    corpus()
+    build_graph(5)
+    filtered = similar_documents("d3", limit=3, where="category = 'A'")
+    assert filtered and all(r["metadata"]["category"] == "A" for r in filtered)
+    # Más vecinos de los que guarda el grafo: búsqueda por vector
+    assert len(similar_documents("d3", limit=8)) == 8
+    assert similar_documents("no_existe") == [{"error": "Document not found"}]
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+# Listado paginado de documentos (user-011)
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import SCRIPTS, words
+from lancedb_add import add_documents
+from lancedb_list import list_documents
+
+
+@pytest.fixture
+def docs():
+    add_documents([{"id": f"d{i}", "text": words(f"tema{i}"), "metadata": {"n": i}} for i in range(5)])
+
+
+def test_pages_cover_the_table(docs):
+    pages = [list_documents(offset, 2, fields=["id"]) for offset in (0, 2, 4)]
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert sorted(doc["id"] for page in pages for doc in page) == [f"d{i}" for i in range(5)]
+    assert len(list_documents()) == 5
+
+
+@pytest.mark.parametrize("limit", [0, -1])
+def test_non_positive_limit_is_an_error(docs, limit):
+    result = list_documents(limit=limit)
+    assert len(result) == 1 and "limit" in result[0]["error"]
+
+
+def test_cli_rejects_zero_limit(tmp_path):
+    completed = subprocess.run([sys.executable, os.path.join(SCRIPTS, "lancedb_list.py"), "--limit", "0"],
+                               cwd=tmp_path, capture_output=True, text=True, timeout=60,
+                               env=dict(os.environ, LANCEDB_WORKER_ADDR=""))
+    assert completed.returncode == 1
+    assert "limit" in json.loads(completed.stdout)[0]["error"]
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# Mantenimiento: compactación de todas las tablas, también las auxiliares
+
+from conftest import words
+from knn_graph import build_graph, open_neighbors_table
+from lancedb_add import add_document
+from lancedb_maintenance import optimize, status
+from near_duplicates import open_signatures_table
+
+
+def fragments(table):
+    return table.stats()["fragment_stats"]["num_fragments"]
+
+
+def test_optimize_compacts_signature_and_graph_tables():
+    add_document("a", words("factura", "luz"), dedup="flag")
+    add_document("b", words("receta", "tortilla"), dedup="flag")
+    build_graph(1)
+    for i in range(4):
+        add_document(f"n{i}", words(f"tema{i}", "contrato"), dedup="flag")
+    assert fragments(open_signatures_table()) > 1 and fragments(open_neighbors_table()) > 1
+
+    result = optimize()
+    assert result["success"], result
+    assert set(result["tables"]) == {"documents", "chunks", "signatures", "neighbors"}
+    for name in ("signatures", "neighbors"):
+        assert result["tables"][name]["actions"] == ["optimize"]
+        table = result["tables"][name]
+        assert table["after"]["fragments"] < table["before"]["fragments"]
+    assert open_signatures_table().count_rows() == 6
+    assert open_neighbors_table().count_rows() == 6
+
+
+def test_status_without_auxiliary_tables():
+    add_document("a", words("factura"))
+    assert set(status()["tables"]) == {"documents", "chunks"}
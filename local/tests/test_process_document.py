@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+# Extracción de texto de process_document: lotes, PDF por páginas y streaming
+
+import json
+import os
+import subprocess
+import sys
+
+import process_document
+from conftest import SCRIPTS
+
+
+def run_script(*args, cwd):
+    """Corre process_document.py en un intérprete nuevo (sin módulos ya importados)"""
+    completed = subprocess.run([sys.executable, os.path.join(SCRIPTS, "process_document.py"), *args],
+                               cwd=cwd, capture_output=True, text=True, timeout=120,
+                               env=dict(os.environ, PYTHONIOENCODING="utf-8"))
+    return [json.loads(line) for line in completed.stdout.splitlines() if line.strip()]
+
+
+def make_docx(path, paragraphs):
+    import docx
+
+    document = docx.Document()
+    for paragraph in paragraphs:
+        document.add_paragraph(paragraph)
+    document.save(str(path))
+
+
+def test_batch_imports_each_extractor_once_across_threads(tmp_path):
+    folder = tmp_path / "lote"
+    folder.mkdir()
+    for i in range(12):
+        (folder / f"nota{i}.md").write_text(f"# Nota {i}\n\nTexto **importante** {i}.\n", encoding="utf-8")
+    for i in range(2):
+        make_docx(folder / f"informe{i}.docx", [f"Informe {i}", "Segundo párrafo"])
+
+    # --workers 1: los DOCX también van al pool de hilos
+    results = run_script("--batch", str(folder), "--workers", "1", cwd=tmp_path)
+    assert len(results) == 14
+    assert [r.get("error") for r in results if not r["success"]] == []
+    texts = {r["filename"]: r["text"] for r in results}
+    assert texts["nota3.md"] == "Nota 3\nTexto importante 3."
+    assert texts["informe1.docx"] == "Informe 1\nSegundo párrafo"
+
+
+def make_pdf(path, pages):
+    """PDF mínimo de una línea de texto por página (sin dependencias)"""
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(pages))
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>"]
+    font = 3 + 2 * pages
+    for i in range(pages):
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 {font} 0 R >> >> /Contents {4 + 2 * i} 0 R >>")
+        stream = f"BT /F1 12 Tf 72 720 Td (Pagina {i + 1} texto de prueba) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    data, offsets = b"%PDF-1.4\n", []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(data))
+        data += f"{number} 0 obj\n{body}\nendobj\n".encode()
+    xref = len(data)
+    data += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    data += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    data += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_parallel_pdf_extraction_matches_serial(tmp_path, monkeypatch):
+    path = make_pdf(tmp_path / "largo.pdf", 40)
+    ranges = []
+    real = process_document._run_page_ranges
+
+    def spy(filepath, page_ranges, page_timeout):
+        ranges.append(page_ranges)
+        return real(filepath, page_ranges, page_timeout)
+
+    monkeypatch.setattr(process_document, "_run_page_ranges", spy)
+    serial_text, serial_info = process_document.extract_text_from_pdf(path, workers=1)
+    assert ranges == []
+    parallel_text, parallel_info = process_document.extract_text_from_pdf(path, workers=4)
+    assert len(ranges) == 1 and len(ranges[0]) > 1
+
+    assert parallel_text == serial_text
+    assert parallel_info == serial_info
+    assert serial_info["pages"] == serial_info["pages_extracted"] == 40
+    offsets = serial_info["page_offsets"]
+    assert serial_text[offsets[9]:].startswith("Pagina 10 ")
+    assert serial_info["timed_out_pages"] == []
+
+
+def test_max_pages_is_respected(tmp_path):
+    path = make_pdf(tmp_path / "largo.pdf", 40)
+    for workers in (1, 4):
+        extracted = process_document.extract_pdf_pages(path, max_pages=20, workers=workers)
+        assert extracted["total_pages"] == 40 and len(extracted["pages"]) == 20
+        assert extracted["pages"][-1].startswith("Pagina 20 ")
+    result = process_document.process_document(path, max_pages=5)
+    assert result["pages"] == 40 and result["pages_extracted"] == 5
+    assert len(result["page_offsets"]) == 5 and "Pagina 6 " not in result["text"]
+
+
+def mixed_folder(tmp_path):
+    folder = tmp_path / "mixto"
+    folder.mkdir()
+    for i in range(3):
+        (folder / f"nota{i}.txt").write_text(f"nota {i} " * 10, encoding="utf-8")
+    (folder / "leeme.md").write_text("# Leeme\n\nHola *mundo*.\n", encoding="utf-8")
+    make_docx(folder / "informe.docx", ["Informe anual"])
+    make_pdf(folder / "corto.pdf", 2)
+    make_pdf(folder / "largo.pdf", 6)
+    (folder / "roto.pdf").write_bytes(b"%PDF-1.4 esto no es un pdf")
+    return folder
+
+
+def test_batch_splits_threads_and_processes(tmp_path, monkeypatch):
+    import concurrent.futures
+
+    folder = mixed_folder(tmp_path)
+    in_processes = []
+
+    class SpyPool(concurrent.futures.ProcessPoolExecutor):
+        def submit(self, fn, *args, **kwargs):
+            in_processes.append(os.path.basename(args[0]))
+            return super().submit(fn, *args, **kwargs)
+
+    monkeypatch.setattr(concurrent.futures, "ProcessPoolExecutor", SpyPool)
+    paths = process_document.expand_paths([str(folder)])
+    results = list(process_document.process_documents(paths, workers=2))
+
+    # PDF y DOCX a procesos, los más grandes primero; TXT y MD en hilos
+    sizes = [os.path.getsize(folder / name) for name in in_processes]
+    assert sizes == sorted(sizes, reverse=True)
+    assert sorted(in_processes) == ["corto.pdf", "informe.docx", "largo.pdf", "roto.pdf"]
+    by_name = {os.path.basename(r["filepath"]): r for r in results}
+    assert sorted(by_name) == sorted(os.path.basename(p) for p in paths)
+    assert by_name["largo.pdf"]["pages"] == 6 and by_name["informe.docx"]["text"] == "Informe anual"
+    assert by_name["nota1.txt"]["word_count"] == 20
+
+
+def test_batch_reports_errors_per_file(tmp_path):
+    folder = mixed_folder(tmp_path)
+    (folder / "datos.csv").write_text("a,b", encoding="utf-8")
+    paths = process_document.expand_paths([str(folder)]) + [str(folder / "datos.csv"),
+                                                            str(folder / "no_existe.txt")]
+    for workers in (1, 2):
+        results = {os.path.basename(r["filepath"]): r for r in process_document.process_documents(paths, workers)}
+        assert len(results) == len(paths) == 10
+        failed = {name: r["error"] for name, r in results.items() if not r["success"]}
+        assert sorted(failed) == ["datos.csv", "no_existe.txt", "roto.pdf"]
+        assert failed["no_existe.txt"] == "File not found"
+        assert "Unsupported" in failed["datos.csv"]
+
+
+def streamed(path, chunk_chars, **kwargs):
+    records = list(process_document.stream_document(str(path), chunk_chars, **kwargs))
+    chunks, summary = records[:-1], records[-1]
+    assert summary["type"] == "summary" and all(r["type"] == "chunk" for r in chunks)
+    assert [r["index"] for r in chunks] == list(range(len(chunks)))
+    position = 0
+    for record in chunks:
+        assert record["start"] == position
+        position += len(record["text"])
+    return "".join(r["text"] for r in chunks), summary
+
+
+def stream_inputs(tmp_path):
+    lines = [f"Línea {i}: año, señal y €uro con palabras_largas_{i}" for i in range(300)]
+    (tmp_path / "utf8.txt").write_text("\n".join(lines), encoding="utf-8")
+    (tmp_path / "ansi.txt").write_bytes("\r\n".join(lines).encode("cp1252"))
+    (tmp_path / "bom.txt").write_text("\n".join(lines), encoding="utf-16")
+    markdown = []
+    for i in range(40):
+        markdown += [f"## Sección {i}", "", f"Párrafo con **negrita** y `código` {i}.", ""]
+        if i % 10 == 0:
+            markdown += ["```", "def f():", "", "    return 1", "```", ""]
+    (tmp_path / "notas.md").write_text("\n".join(markdown), encoding="utf-8")
+    make_docx(tmp_path / "informe.docx", [f"Párrafo {i} del informe" for i in range(200)] + ["", "fin"])
+    make_pdf(tmp_path / "paginas.pdf", 12)
+    return ["utf8.txt", "ansi.txt", "bom.txt", "notas.md", "informe.docx", "paginas.pdf"]
+
+
+def test_streamed_text_matches_whole_document(tmp_path):
+    for name in stream_inputs(tmp_path):
+        whole = process_document.process_document(str(tmp_path / name))
+        assert whole["success"], name
+        for chunk_chars in (64, 1000, 1 << 20):
+            text, summary = streamed(tmp_path / name, chunk_chars)
+            assert summary["success"], (name, summary)
+            assert text == whole["text"], (name, chunk_chars)
+            assert summary["char_count"] == whole["char_count"]
+            assert summary["word_count"] == whole["word_count"], (name, chunk_chars)
+
+
+def test_streamed_pdf_respects_max_pages(tmp_path):
+    path = make_pdf(tmp_path / "paginas.pdf", 12)
+    text, summary = streamed(path, 50, max_pages=3)
+    assert text == process_document.process_document(path, max_pages=3)["text"]
+    assert (summary["pages"], summary["pages_extracted"]) == (12, 3)
+
+
+def test_stream_errors_end_with_a_summary(tmp_path):
+    (tmp_path / "datos.csv").write_text("a,b", encoding="utf-8")
+    for name in ("no_existe.txt", "datos.csv"):
+        records = list(process_document.stream_document(str(tmp_path / name)))
+        assert len(records) == 1 and records[0]["success"] is False
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+# Cachés de la búsqueda: LRU de vectores de consulta y resultados por versión (user-012)
+
+import search_cache
+from conftest import words
+from lancedb_add import add_document
+from lancedb_delete import delete_document
+from lancedb_search import search_documents
+from search_cache import LRUCache
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats()["hits"] == 3 and cache.stats()["misses"] == 1
+
+
+def test_repeated_query_is_served_from_caches(monkeypatch):
+    add_document("a", words("factura", "luz"))
+    first = search_documents("factura luz", limit=3)
+
+    def no_encode(*args, **kwargs):
+        raise AssertionError("the query should not be encoded again")
+
+    monkeypatch.setattr("embedding_cache.encode_cached", no_encode)
+    assert search_documents("  factura   luz ", limit=3) == first
+    assert search_cache.results.stats()["hits"] == 1
+
+
+def test_results_are_invalidated_when_tables_change():
+    add_document("a", words("factura", "luz"))
+    assert [r["id"] for r in search_documents("factura", limit=5)] == ["a"]
+
+    add_document("b", words("factura", "agua"))
+    assert sorted(r["id"] for r in search_documents("factura", limit=5)) == ["a", "b"]
+
+    delete_document("a")
+    assert [r["id"] for r in search_documents("factura", limit=5)] == ["b"]
+    assert search_cache.results.stats()["invalidations"] == 2
+
+
+def test_options_are_part_of_the_result_key():
+    add_document("a", words("factura", "luz"), {"category": "Hogar"})
+    add_document("b", words("factura", "agua"), {"category": "Oficina"})
+    assert len(search_documents("factura", limit=5)) == 2
+    filtered = search_documents("factura", limit=5, where="category = 'Oficina'")
+    assert [r["id"] for r in filtered] == ["b"]
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# Sincronización incremental de carpetas con manifest (user-015)
+
+import json
+import os
+
+import lancedb_sync
+from conftest import words
+from lancedb_common import open_table, scan
+from lancedb_sync import sync
+
+
+def write(folder, name, text):
+    path = folder / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+    return path
+
+
+def documents():
+    rows = scan(open_table(), ["id", "metadata"]).to_pylist()
+    return {r["id"]: json.loads(r["metadata"]).get("path") for r in rows}
+
+
+def test_sync_applies_only_the_delta(tmp_path):
+    folder, manifest = tmp_path / "docs", str(tmp_path / "m.json")
+    write(folder, "a.txt", words("alfa"))
+    write(folder, "b.txt", words("beta"))
+    write(folder, "sub/c.md", words("gamma"))
+    first = sync(folder, manifest)
+    assert first["success"] and sorted(first["new"]) == ["a.txt", "b.txt", "sub/c.md"]
+    ids = {path: doc_id for doc_id, path in documents().items()}
+
+    write(folder, "a.txt", words("alfa", "cambiado"))
+    os.rename(folder / "b.txt", folder / "sub" / "b2.txt")
+    os.remove(folder / "sub" / "c.md")
+    write(folder, "d.txt", words("delta"))
+    second = sync(folder, manifest)
+    assert second["changed"] == ["a.txt"] and second["new"] == ["d.txt"]
+    assert second["moved"] == [{"from": "b.txt", "to": "sub/b2.txt"}]
+    assert second["deleted"] == ["sub/c.md"]
+
+    after = {path: doc_id for doc_id, path in documents().items()}
+    assert sorted(after) == ["a.txt", "d.txt", "sub/b2.txt"]
+    assert after["a.txt"] == ids["a.txt"]  # modificado: mismo id
+    assert after["sub/b2.txt"] == ids["b.txt"]  # movido: mismo documento
+
+    third = sync(folder, manifest)
+    assert third["unchanged"] == 3 and not (third["new"] or third["changed"] or third["moved"])
+
+
+def test_rerun_after_failed_add_does_not_duplicate(tmp_path, monkeypatch):
+    folder, manifest = tmp_path / "docs", str(tmp_path / "m.json")
+    for i in range(4):
+        write(folder, f"f{i}.txt", words(f"archivo{i}"))
+
+    real = lancedb_sync.add_documents
+
+    def fails_halfway(entries, *args, **kwargs):
+        real(entries[:2], *args, **kwargs)
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(lancedb_sync, "add_documents", fails_halfway)
+    assert sync(folder, manifest)["success"] is False
+    assert not os.path.exists(manifest)
+    assert len(documents()) == 2
+
+    monkeypatch.setattr(lancedb_sync, "add_documents", real)
+    assert sync(folder, manifest)["success"]
+    ids = scan(open_table(), ["id"]).column("id").to_pylist()
+    assert len(ids) == len(set(ids)) == 4
+
+
+def test_failed_move_patch_is_not_recorded(tmp_path, monkeypatch):
+    folder, manifest = tmp_path / "docs", str(tmp_path / "m.json")
+    write(folder, "a.txt", words("alfa"))
+    sync(folder, manifest)
+    os.rename(folder / "a.txt", folder / "b.txt")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(lancedb_sync, "update_metadata_bulk",
+                      lambda patches: {"success": False, "error": "locked", "results": {}})
+        result = sync(folder, manifest)
+    assert result["success"] is False and result["error"] == "locked"
+
+    assert sync(folder, manifest)["moved"] == [{"from": "a.txt", "to": "b.txt"}]
+    assert list(documents().values()) == ["b.txt"]
+
+
+def test_move_of_a_missing_document_is_reindexed(tmp_path):
+    from lancedb_delete import delete_documents
+
+    folder, manifest = tmp_path / "docs", str(tmp_path / "m.json")
+    write(folder, "a.txt", words("alfa"))
+    sync(folder, manifest)
+    delete_documents(list(documents()))
+    os.rename(folder / "a.txt", folder / "b.txt")
+
+    assert sync(folder, manifest)["success"]
+    assert list(documents().values()) == ["b.txt"]
+
+
+def test_ids_are_stable_per_folder_and_path(tmp_path):
+    one = lancedb_sync.sync_doc_id(tmp_path / "x", "sub/a.txt")
+    assert one == lancedb_sync.sync_doc_id(tmp_path / "x", "sub/a.txt")
+    assert one.startswith("doc_sub_a_txt_")
+    assert one != lancedb_sync.sync_doc_id(tmp_path / "y", "sub/a.txt")
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+# Almacén comprimido de textos y aislamiento de los benchmarks (user-022)
+
+import os
+
+import pytest
+
+import bench_ingest
+import embedding_cache
+import text_store
+from bench_ingest import check_data_untouched, data_state, synthetic_docs
+from text_store import TextStore, hydrate, get_store
+
+
+def test_put_get_replace_and_delete(tmp_path):
+    store = TextStore(str(tmp_path / "store"))
+    store.put_many([("a", "uno " * 200), ("b", "ñandú €")])
+    store.put_many([("a", "otro texto")])
+    store.delete_many(["b"])
+    assert store.get_many(["a", "b", "c"]) == {"a": "otro texto"}
+    assert store.stats()["documents"] == 1
+    assert store.stats()["garbage_bytes"] > 0
+
+
+def test_compact_keeps_live_texts_and_resets_garbage(tmp_path):
+    store = TextStore(str(tmp_path / "store"))
+    texts = {f"d{i}": f"documento {i} " * 50 for i in range(20)}
+    store.put_many(texts.items())
+    store.delete_many([f"d{i}" for i in range(0, 20, 2)])
+    assert store.stats()["garbage_ratio"] > 0
+
+    result = store.compact(force=True)
+    assert result["compacted"] and result["garbage_bytes"] == 0
+    live = {doc_id: text for doc_id, text in texts.items() if int(doc_id[1:]) % 2}
+    assert store.get_many(list(texts)) == live
+    assert TextStore(str(tmp_path / "store")).get_many(list(live)) == live
+    assert result["segments_bytes"] == result["compressed_bytes"]
+
+
+def test_hydrate_falls_back_to_inline_text():
+    get_store().put_many([("nuevo", "texto completo")])
+    assert hydrate(["nuevo", "viejo"], {"viejo": "texto de la tabla"}) == {
+        "nuevo": "texto completo", "viejo": "texto de la tabla"}
+
+    asked = []
+    found = hydrate(["nuevo", "viejo"], lambda ids: asked.extend(ids) or {"viejo": "x"})
+    assert asked == ["viejo"] and found["viejo"] == "x"
+    assert hydrate(["nada"]) == {"nada": ""}
+
+
+def test_bench_leaves_real_data_untouched(tmp_path, monkeypatch):
+    workdir = tmp_path / "proyecto"
+    workdir.mkdir()
+    monkeypatch.chdir(workdir)
+    # DATA_DIRS son relativos (./data/...): la "instalación real" de este test
+    os.makedirs(bench_ingest.DATA_DIRS[0])
+    with open(os.path.join(bench_ingest.DATA_DIRS[0], "marca"), "w") as f:
+        f.write("no tocar")
+    # Como en un proceso nuevo: nada abierto todavía en ./data
+    monkeypatch.setattr(text_store, "_store", None)
+    monkeypatch.setattr(embedding_cache, "_cache", None)
+
+    before = data_state()
+    result = bench_ingest.run("bulk", synthetic_docs(5), 4, 2)
+    assert result["documents"] == 5 and result["fragments"]
+    check_data_untouched(before)
+    assert sorted(os.listdir(workdir / "data")) == ["lancedb"]
+
+
+def test_data_check_detects_writes(tmp_path, monkeypatch):
+    (tmp_path / "proyecto").mkdir()
+    monkeypatch.chdir(tmp_path / "proyecto")
+    os.makedirs(bench_ingest.DATA_DIRS[1], exist_ok=True)
+    before = data_state()
+    with open(os.path.join(bench_ingest.DATA_DIRS[1], "index.sqlite"), "w") as f:
+        f.write("x")
+    with pytest.raises(RuntimeError):
+        check_data_untouched(before)
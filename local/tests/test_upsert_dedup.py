@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+# Upsert idempotente por id y detección de casi-duplicados con MinHash (user-016)
+
+import json
+
+from conftest import words
+from lancedb_add import add_document, add_documents
+from lancedb_chunks import chunk_text, open_chunks_table
+from lancedb_common import open_table, scan
+from lancedb_delete import delete_document
+from near_duplicates import open_signatures_table
+from text_store import hydrate
+
+LONG = " ".join(f"clausula{i} del contrato de alquiler" for i in range(120))
+RECIPE = " ".join(f"paso{i} batir los huevos con patata" for i in range(60))
+
+
+def rows():
+    return {r["id"]: json.loads(r["metadata"])
+            for r in scan(open_table(), ["id", "metadata"]).to_pylist()}
+
+
+def chunk_counts():
+    doc_ids = scan(open_chunks_table(), ["doc_id"]).column("doc_id").to_pylist()
+    return {doc_id: doc_ids.count(doc_id) for doc_id in set(doc_ids)}
+
+
+def test_upsert_is_idempotent():
+    first = add_document("a", LONG, {"v": 1})
+    assert first["success"] and first["replaced"] is False and first["chunks"] > 1
+    again = add_document("a", LONG, {"v": 1})
+    assert again["replaced"] is True
+    assert rows() == {"a": {"v": 1}}
+    assert chunk_counts() == {"a": first["chunks"]}
+
+
+def test_upsert_replaces_text_metadata_and_chunks():
+    add_document("a", LONG, {"v": 1})
+    add_document("a", words("nuevo"), {"v": 2})
+    assert rows() == {"a": {"v": 2}}
+    assert chunk_counts() == {"a": 1}
+    assert hydrate(["a"])["a"] == words("nuevo")
+
+
+def test_bulk_upsert_of_existing_ids():
+    add_documents([{"id": "a", "text": LONG}, {"id": "b", "text": words("otro")}])
+    result = add_documents([{"id": "a", "text": words("corto")}])
+    assert result["replaced"] == 1
+    assert sorted(rows()) == ["a", "b"]
+    assert chunk_counts() == {"a": 1, "b": 1}
+
+
+def test_near_duplicate_is_flagged():
+    add_document("original", LONG, dedup="flag")
+    result = add_document("copia", LONG + " fin", dedup="flag")
+    assert result["near_duplicate_of"]["id"] == "original"
+    assert rows()["copia"]["near_duplicate_of"] == "original"
+
+    different = add_document("otro", words("receta", "tortilla"), dedup="flag")
+    assert "near_duplicate_of" not in different
+
+
+def test_near_duplicate_is_skipped_in_bulk():
+    add_document("original", LONG, dedup="skip")
+    result = add_documents([{"id": "copia", "text": LONG + " fin"},
+                            {"id": "otro", "text": RECIPE},
+                            {"id": "copia_lote", "text": RECIPE + " fin"}], dedup="skip")
+    assert result["added"] == 1
+    assert [d["id"] for d in result["near_duplicates"]] == ["copia", "copia_lote"]
+    assert all(d["skipped"] for d in result["near_duplicates"])
+    assert sorted(rows()) == ["original", "otro"]
+
+
+def test_readding_same_id_is_not_its_own_duplicate():
+    add_document("a", LONG, dedup="skip")
+    result = add_document("a", LONG, dedup="skip")
+    assert result["success"] and not result.get("skipped")
+
+
+def test_delete_removes_signature():
+    add_document("original", LONG, dedup="skip")
+    delete_document("original")
+    assert open_signatures_table().count_rows() == 0
+    assert not add_document("copia", LONG, dedup="skip").get("skipped")
+
+
+def test_unknown_dedup_mode():
+    assert add_document("a", "texto", dedup="maybe")["success"] is False
+    assert add_documents([], dedup="maybe")["success"] is False
+
+
+def test_replaced_document_is_searchable_in_every_version():
+    add_documents([{"id": "a", "text": LONG}, {"id": "b", "text": words("otro")}])
+    chunks = open_chunks_table()
+    before = chunks.version
+    add_document("a", words("nuevo"))
+    add_documents([{"id": "a", "text": LONG}, {"id": "c", "text": words("tercero")}])
+
+    chunks = open_chunks_table()
+    latest = chunks.version
+    for version in range(before, latest + 1):
+        chunks.checkout(version)
+        assert chunks.count_rows("doc_id = 'a'") > 0, f"version {version} without chunks of a"
+    chunks.checkout_latest()
+    assert chunk_counts() == {"a": len(chunk_text(LONG)), "b": 1, "c": 1}
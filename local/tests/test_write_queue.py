@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+# Cola de escritura con group commit y su reintento una a una (user-021)
+
+import threading
+
+import lancedb_add
+from conftest import words
+from lancedb_add import add_document, add_document_group
+from lancedb_chunks import open_chunks_table
+from lancedb_common import open_table, scan
+from lancedb_delete import delete_document, delete_document_group
+from write_queue import WriteQueue
+
+
+def submit_all(writes, calls):
+    """Envía (op, args) desde un hilo cada una; retorna resultado o excepción"""
+    outcomes = [None] * len(calls)
+
+    def run(index, op, args):
+        try:
+            outcomes[index] = writes.submit(op, args)
+        except Exception as e:
+            outcomes[index] = e
+
+    threads = [threading.Thread(target=run, args=(i, op, args)) for i, (op, args) in enumerate(calls)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=60)
+    return outcomes
+
+
+def adds_queue():
+    return WriteQueue({"add": (add_document, add_document_group),
+                       "delete": (delete_document, delete_document_group)},
+                      threading.Lock(), wait_ms=200)
+
+
+def doc_ids():
+    return sorted(scan(open_table(), ["id"]).column("id").to_pylist())
+
+
+def chunk_doc_ids():
+    return sorted(scan(open_chunks_table(), ["doc_id"]).column("doc_id").to_pylist())
+
+
+def test_concurrent_adds_are_grouped():
+    writes = adds_queue()
+    outcomes = submit_all(writes, [("add", {"doc_id": f"d{i}", "text": words(f"tema{i}")}) for i in range(6)])
+    assert all(o["success"] for o in outcomes)
+    assert writes.stats()["groups"] < 6 and writes.stats()["max_group"] > 1
+    assert doc_ids() == chunk_doc_ids() == [f"d{i}" for i in range(6)]
+
+
+def test_order_is_kept_within_a_group():
+    writes = adds_queue()
+    writes.submit("add", {"doc_id": "a", "text": words("uno")})
+    writes.lock.acquire()  # el siguiente grupo junta las tres operaciones
+    threads = []
+    for op, args in [("add", {"doc_id": "b", "text": words("dos")}),
+                     ("delete", {"doc_id": "a"}),
+                     ("add", {"doc_id": "a", "text": words("tres")})]:
+        threads.append(threading.Thread(target=writes.submit, args=(op, args)))
+        threads[-1].start()
+        threads[-1].join(timeout=0.05)
+    writes.lock.release()
+    for thread in threads:
+        thread.join(timeout=60)
+    assert doc_ids() == ["a", "b"]
+
+
+def test_failed_group_is_retried_one_by_one_without_duplicates(monkeypatch):
+    real = lancedb_add._upsert
+    calls = []
+
+    def fails_first_time(table, data, existing):
+        calls.append(data.num_rows)
+        if len(calls) == 1:
+            # El grupo ya escribió los chunks; la tabla de documentos falla
+            raise OSError("commit conflict")
+        real(table, data, existing)
+
+    monkeypatch.setattr(lancedb_add, "_upsert", fails_first_time)
+    writes = adds_queue()
+    outcomes = submit_all(writes, [("add", {"doc_id": f"d{i}", "text": words(f"tema{i}")}) for i in range(4)])
+
+    assert all(o["success"] for o in outcomes)
+    assert writes.stats()["fallbacks"] >= 1
+    assert doc_ids() == chunk_doc_ids() == [f"d{i}" for i in range(4)]
+
+
+def test_each_request_gets_its_own_error():
+    def single(doc_id):
+        if doc_id == "malo":
+            raise ValueError("documento malo")
+        return {"id": doc_id}
+
+    def grouped(requests):
+        raise RuntimeError("grupo fallido")
+
+    writes = WriteQueue({"op": (single, grouped)}, threading.Lock(), wait_ms=200)
+    outcomes = submit_all(writes, [("op", {"doc_id": i}) for i in ("a", "malo", "b")])
+    assert outcomes[0] == {"id": "a"} and outcomes[2] == {"id": "b"}
+    assert isinstance(outcomes[1], ValueError)
+    assert writes.stats()["fallbacks"] == 1
+
+
+def test_worker_reports_write_errors(monkeypatch):
+    import lancedb_worker
+
+    def broken(op, args):
+        raise RuntimeError("cola detenida")
+
+    monkeypatch.setattr(lancedb_worker.writes, "submit", broken)
+    response = lancedb_worker.handle_request({"id": 7, "op": "delete", "args": {"doc_id": "a"}})
+    assert response == {"id": 7, "error": "cola detenida"}